@@ -0,0 +1,242 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .ledger import record_receipt_allocations
+from .models import Invoice, InvoiceItem, PaymentAllocation
+
+
+ZERO = Decimal('0')
+
+
+def get_payable_component(item, is_insurance_payment):
+    '''
+    Portion of an InvoiceItem the current payer is responsible for:
+    - insurance payment -> actual_total (insurance-covered component)
+    - patient payment on a cash item -> actual_total
+    - patient payment on an insurance item -> co-pay (item_amount - actual_total)
+    '''
+    cash_component, insurance_component = item.get_payable_components()
+    return Decimal(insurance_component if is_insurance_payment else cash_component)
+
+
+def get_outstanding_items(invoices, insurance_id=None):
+    '''
+    Candidate InvoiceItems for an allocation, oldest first. What has already
+    been applied comes from the materialized amount_allocated_* columns, so
+    this is a single query with no join onto PaymentAllocation.
+    '''
+    items = InvoiceItem.objects.filter(invoice__in=invoices)
+    if insurance_id:
+        items = items.filter(payment_mode__insurance_id=insurance_id)
+    return items.select_related('payment_mode').order_by('item_created_at', 'id')
+
+
+ALLOCATION_FIELDS = ['amount_allocated_cash', 'amount_allocated_insurance', 'outstanding']
+
+
+def recompute_allocation_totals(items):
+    '''
+    Set the allocation columns on `items` in memory from their PaymentAllocation
+    rows (one grouped query) and return the items whose stored values changed.
+    `items` should have payment_mode selected.
+    '''
+    totals = {
+        row['invoice_item_id']: row
+        for row in PaymentAllocation.objects.filter(
+            invoice_item_id__in=[item.id for item in items]
+        ).values('invoice_item_id').annotate(
+            cash=Sum('amount_applied', filter=Q(receipt__insurance__isnull=True)),
+            insurance=Sum('amount_applied', filter=Q(receipt__insurance__isnull=False)),
+        )
+    }
+
+    changed = []
+    for item in items:
+        before = [getattr(item, field) for field in ALLOCATION_FIELDS]
+        row = totals.get(item.id, {})
+        item.amount_allocated_cash = row.get('cash') or ZERO
+        item.amount_allocated_insurance = row.get('insurance') or ZERO
+        item.outstanding = item.calculate_outstanding()
+        if before != [getattr(item, field) for field in ALLOCATION_FIELDS]:
+            changed.append(item)
+    return changed
+
+
+def refresh_allocation_totals(item_ids):
+    '''
+    Recompute amount_allocated_cash / amount_allocated_insurance / outstanding
+    for the given InvoiceItems from their PaymentAllocation rows, then roll the
+    totals up onto the parent invoices. Set-based: one grouped read of the
+    allocations, one bulk_update of the items and one UPDATE of the invoices.
+    Call inside the transaction that created or deleted the allocations.
+    '''
+    item_ids = set(item_ids)
+    if not item_ids:
+        return
+
+    items = list(InvoiceItem.objects.filter(id__in=item_ids).select_related('payment_mode'))
+    changed = recompute_allocation_totals(items)
+    if changed:
+        InvoiceItem.objects.bulk_update(changed, ALLOCATION_FIELDS)
+
+    rollup_invoice_allocation_totals({item.invoice_id for item in items})
+
+
+def rollup_invoice_allocation_totals(invoice_ids):
+    '''Copy the per-item allocation columns up onto Invoice in one UPDATE.'''
+    def item_sum(field):
+        return Coalesce(
+            Subquery(
+                InvoiceItem.objects.filter(invoice=OuterRef('pk'))
+                .values('invoice').annotate(total=Sum(field)).values('total')
+            ),
+            Value(ZERO),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+
+    Invoice.objects.filter(id__in=invoice_ids).update(
+        amount_allocated_cash=item_sum('amount_allocated_cash'),
+        amount_allocated_insurance=item_sum('amount_allocated_insurance'),
+        outstanding=item_sum('outstanding'),
+    )
+
+
+def plan_payment_allocation(invoices, amount, insurance_id=None):
+    '''
+    Compute how `amount` is spread over the outstanding items of `invoices`
+    without writing anything.
+
+    Returns a dict with:
+    - allocations: list of (InvoiceItem, Decimal amount) pairs, oldest item first
+    - invoices: {invoice_id: {'invoice', 'applied', 'cash_paid', 'status'}}
+      for every invoice that receives part of the payment
+    - unallocated: the part of `amount` that could not be applied
+    '''
+    invoices = sorted(invoices, key=lambda inv: inv.id)
+    is_insurance_payment = bool(insurance_id)
+    remaining = Decimal(amount)
+
+    allocations = []
+    per_invoice_applied = {}
+    per_invoice_allocated = {}
+
+    for item in get_outstanding_items(invoices, insurance_id):
+        if remaining <= 0:
+            break
+
+        already_applied = item.amount_allocated_insurance if is_insurance_payment else item.amount_allocated_cash
+        outstanding = max(ZERO, get_payable_component(item, is_insurance_payment) - already_applied)
+        if outstanding <= 0:
+            continue
+
+        apply_now = min(remaining, outstanding)
+        allocations.append((item, apply_now))
+        remaining -= apply_now
+        per_invoice_applied[item.invoice_id] = per_invoice_applied.get(item.invoice_id, ZERO) + apply_now
+        per_invoice_allocated[item.invoice_id] = per_invoice_allocated.get(item.invoice_id, ZERO) + apply_now
+
+    # Fallback only for patient cash receipts when no allocatable items exist.
+    # For insurance receipts, allocation must remain tied to insurance items.
+    if not is_insurance_payment:
+        for inv in invoices:
+            if remaining <= 0:
+                break
+            if per_invoice_applied.get(inv.id, ZERO) > 0:
+                continue
+            outstanding_cash = max(ZERO, (inv.total_cash or ZERO) - (inv.cash_paid or ZERO))
+            if outstanding_cash > 0:
+                apply_now = min(remaining, outstanding_cash)
+                per_invoice_applied[inv.id] = apply_now
+                remaining -= apply_now
+
+    planned_invoices = {}
+    for inv in invoices:
+        applied = per_invoice_applied.get(inv.id, ZERO)
+        if applied <= 0:
+            continue
+
+        cash_paid = inv.cash_paid or ZERO
+        if not is_insurance_payment:
+            cash_paid += applied
+
+        # Status is driven by all allocations across the invoice's items,
+        # including the ones planned here.
+        total_allocated = (
+            (inv.amount_allocated_cash or ZERO)
+            + (inv.amount_allocated_insurance or ZERO)
+            + per_invoice_allocated.get(inv.id, ZERO)
+        )
+        planned_invoices[inv.id] = {
+            'invoice': inv,
+            'applied': applied,
+            'cash_paid': cash_paid,
+            'status': 'paid' if total_allocated >= (inv.invoice_amount or ZERO) else 'pending',
+        }
+
+    return {
+        'allocations': allocations,
+        'invoices': planned_invoices,
+        'unallocated': remaining,
+    }
+
+
+def apply_payment_allocation(receipt, plan, is_insurance_payment=False):
+    '''
+    Persist a plan from plan_payment_allocation() against `receipt`:
+    one bulk_create for the allocations and one bulk_update for the invoices.
+    Must be called inside a transaction.
+    '''
+    PaymentAllocation.objects.bulk_create([
+        PaymentAllocation(receipt=receipt, invoice_item=item, amount_applied=amount_applied)
+        for item, amount_applied in plan['allocations']
+    ])
+    # bulk_create() bypasses the PaymentAllocation signals
+    refresh_allocation_totals(item.id for item, _ in plan['allocations'])
+    record_receipt_allocations(receipt, sum((amount for _, amount in plan['allocations']), ZERO))
+
+    update_fields = ['status', 'invoice_updated_at']
+    # Only increment cash_paid for patient/cash payments
+    if not is_insurance_payment:
+        update_fields.append('cash_paid')
+
+    now = timezone.now()
+    changed = []
+    for entry in plan['invoices'].values():
+        inv = entry['invoice']
+        inv.status = entry['status']
+        inv.cash_paid = entry['cash_paid']
+        # bulk_update() skips auto_now, so stamp it explicitly
+        inv.invoice_updated_at = now
+        changed.append(inv)
+
+    if changed:
+        Invoice.objects.bulk_update(changed, update_fields)
+    return changed
+
+
+def serialize_allocation_plan(plan):
+    '''Plain representation of a plan, used for dry-run responses.'''
+    return {
+        'allocations': [
+            {
+                'invoice_item': item.id,
+                'invoice_id': item.invoice_id,
+                'amount_applied': amount_applied,
+            }
+            for item, amount_applied in plan['allocations']
+        ],
+        'invoices': [
+            {
+                'id': inv_id,
+                'invoice_number': entry['invoice'].invoice_number,
+                'applied': entry['applied'],
+                'cash_paid': entry['cash_paid'],
+                'status': entry['status'],
+            }
+            for inv_id, entry in plan['invoices'].items()
+        ],
+        'unallocated': plan['unallocated'],
+    }
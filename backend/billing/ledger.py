@@ -0,0 +1,312 @@
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Concat, NullIf, TruncDate
+from django.utils import timezone
+
+from .models import AccountBalanceSnapshot, PaymentAllocation, PaymentReceipt, SubAccount
+
+
+ZERO = Decimal('0')
+
+TRANSACTION_COLUMNS = [
+    'row_id', 'kind', 'tx_date', 'invoice_number', 'customer', 'tag', 'sub_account_label', 'amount',
+]
+
+
+def get_receipt_date(receipt):
+    '''The date a receipt counts towards: payment_date, else the local creation date.'''
+    return receipt.payment_date or timezone.localdate(receipt.created_at)
+
+
+def _snapshot_key(sub_account_id, payment_mode_id):
+    '''
+    Which snapshot a receipt's money goes to: its sub account, or for
+    receipts without one, its payment mode (or neither, the 'Main Account').
+    '''
+    if sub_account_id:
+        return {'sub_account_id': sub_account_id}
+    return {'sub_account_id': None, 'payment_mode_id': payment_mode_id}
+
+
+def record_account_movement(sub_account_id, date, debited=ZERO, credited=ZERO, payment_mode_id=None):
+    '''
+    Add (or with negative amounts, remove) money moved through a sub account on
+    `date` to its daily AccountBalanceSnapshot; see _snapshot_key() for
+    receipts without a sub account. Uses an atomic F() increment so
+    concurrent receipts on the same day don't lose updates.
+    '''
+    if not debited and not credited:
+        return
+
+    key = _snapshot_key(sub_account_id, payment_mode_id)
+    increments = {
+        'total_debited': F('total_debited') + debited,
+        'total_credited': F('total_credited') + credited,
+    }
+    snapshot = AccountBalanceSnapshot.objects.filter(date=date, **key)
+    if snapshot.update(**increments):
+        return
+
+    try:
+        with transaction.atomic():
+            AccountBalanceSnapshot.objects.create(
+                date=date,
+                total_debited=debited,
+                total_credited=credited,
+                **key,
+            )
+    except IntegrityError:
+        # Another transaction created today's row first
+        snapshot.update(**increments)
+
+
+def record_receipt_allocations(receipt, amount):
+    '''Money received through a PaymentReceipt's allocations.'''
+    record_account_movement(
+        receipt.sub_account_id, get_receipt_date(receipt), debited=amount, payment_mode_id=receipt.payment_mode_id,
+    )
+
+
+def record_supplier_receipt_allocations(receipt, amount):
+    '''Money paid out through a SupplierPaymentReceipt's allocations.'''
+    record_account_movement(
+        receipt.sub_account_id, get_receipt_date(receipt), credited=amount, payment_mode_id=receipt.payment_mode_id,
+    )
+
+
+def adjust_sub_account_balance(sub_account_id, delta):
+    '''Atomically move a SubAccount's cached current_balance by `delta`.'''
+    if not sub_account_id or not delta:
+        return
+    SubAccount.objects.filter(pk=sub_account_id).update(current_balance=F('current_balance') + delta)
+
+
+def rebuild_sub_account_balances():
+    '''
+    Recompute every SubAccount.current_balance as opening balance plus
+    receipts minus supplier receipts, in a single UPDATE.
+    '''
+    from inventory.models import SupplierPaymentReceipt
+
+    def receipts_total(model):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(sub_account=OuterRef('pk'))
+                .values('sub_account').annotate(total=Sum('total_amount')).values('total')
+            ),
+            Value(ZERO),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+
+    return SubAccount.objects.update(
+        current_balance=F('opening_bal') + receipts_total(PaymentReceipt) - receipts_total(SupplierPaymentReceipt)
+    )
+
+
+def get_account_totals(start_date=None, end_date=None):
+    '''
+    Per (main account, sub account) and per main account debit/credit totals
+    for the period, summed from the daily snapshots. Receipts without a sub
+    account are labelled the way get_transactions() labels them: payment
+    mode name, else 'Main Account'.
+
+    Returns (totals, sub_account_totals) in the shape AccountingSummaryView
+    has always returned; totals ends with a 'TOTAL' summary row.
+    '''
+    snapshots = AccountBalanceSnapshot.objects.all()
+    if start_date:
+        snapshots = snapshots.filter(date__gte=start_date)
+    if end_date:
+        snapshots = snapshots.filter(date__lte=end_date)
+
+    tag, sub_account_label = _account_labels()
+    rows = snapshots.values(
+        tag=tag, sub_account_label=sub_account_label,
+    ).annotate(
+        total_debited=Sum('total_debited'),
+        total_credited=Sum('total_credited'),
+    ).order_by('tag', 'sub_account_label')
+
+    sub_account_totals = []
+    totals_dict = OrderedDict()
+    for row in rows:
+        debited = row['total_debited'] or ZERO
+        credited = row['total_credited'] or ZERO
+        if not debited and not credited:
+            continue
+
+        main_account = row['tag']
+        sub_account_totals.append({
+            'main_account': main_account,
+            'sub_account': row['sub_account_label'],
+            'total_debited': debited,
+            'total_credited': credited,
+            'net_balance': debited - credited,
+        })
+
+        tag_totals = totals_dict.setdefault(main_account, {
+            'tag': main_account,
+            'total_debited': ZERO,
+            'total_credited': ZERO,
+            'net_balance': ZERO,
+        })
+        tag_totals['total_debited'] += debited
+        tag_totals['total_credited'] += credited
+        tag_totals['net_balance'] += debited - credited
+
+    totals = list(totals_dict.values())
+    if totals:
+        totals.append({
+            'tag': 'TOTAL',
+            'total_debited': sum(t['total_debited'] for t in totals),
+            'total_credited': sum(t['total_credited'] for t in totals),
+            'net_balance': sum(t['net_balance'] for t in totals),
+            'is_summary': True,
+        })
+
+    return totals, sub_account_totals
+
+
+def _account_labels(receipt_path=None):
+    '''
+    Main account tag and sub account label for a receipt (or, without
+    `receipt_path`, a snapshot), preferring the configured sub account, then
+    the payment mode name.
+    '''
+    def field(name):
+        return f'{receipt_path}__{name}' if receipt_path else name
+
+    tag = Case(
+        When(**{field('sub_account__main_account__isnull'): False},
+             then=F(field('sub_account__main_account__name'))),
+        When(**{field('payment_mode__payment_mode__isnull'): False},
+             then=F(field('payment_mode__payment_mode'))),
+        default=Value('Main Account'),
+        output_field=CharField(),
+    )
+    sub_account_label = Coalesce(
+        F(field('sub_account__name')),
+        F(field('payment_mode__payment_mode')),
+        tag,
+        output_field=CharField(),
+    )
+    return tag, sub_account_label
+
+
+def _date_filter(start_date=None, end_date=None):
+    date_filter = Q()
+    if start_date:
+        date_filter &= Q(tx_date__gte=start_date)
+    if end_date:
+        date_filter &= Q(tx_date__lte=end_date)
+    return date_filter
+
+
+def get_transactions(start_date=None, end_date=None, main_account=None, sub_account=None):
+    '''
+    Drill-down of individual received/paid allocations as one UNION ALL
+    values queryset, newest first. Filtering and ordering happen in the
+    database so callers can paginate it.
+    '''
+    from inventory.models import SupplierPaymentAllocation
+
+    tag, sub_account_label = _account_labels('receipt')
+    received = PaymentAllocation.objects.annotate(
+        row_id=F('id'),
+        kind=Value('received', output_field=CharField()),
+        tx_date=Coalesce('receipt__payment_date', TruncDate('receipt__created_at')),
+        invoice_number=Coalesce(F('invoice_item__invoice__invoice_number'), Value('N/A')),
+        customer=Case(
+            When(receipt__patient__isnull=False, then=Concat(
+                'receipt__patient__first_name', Value(' '), 'receipt__patient__second_name'
+            )),
+            When(receipt__insurance__isnull=False, then=F('receipt__insurance__name')),
+            default=Value('Unknown'),
+            output_field=CharField(),
+        ),
+        tag=tag,
+        sub_account_label=sub_account_label,
+        amount=F('amount_applied'),
+    )
+
+    tag, sub_account_label = _account_labels('receipt')
+    paid = SupplierPaymentAllocation.objects.annotate(
+        row_id=F('id'),
+        kind=Value('paid', output_field=CharField()),
+        tx_date=Coalesce('receipt__payment_date', TruncDate('receipt__created_at')),
+        invoice_number=Coalesce(F('supplier_invoice__invoice_no'), Value('N/A')),
+        customer=Coalesce(
+            NullIf(F('receipt__supplier__official_name'), Value('')),
+            F('receipt__supplier__common_name'),
+            Value('Unknown Supplier'),
+            output_field=CharField(),
+        ),
+        tag=tag,
+        sub_account_label=sub_account_label,
+        amount=F('amount_applied'),
+    )
+
+    filters = _date_filter(start_date, end_date)
+    if main_account:
+        filters &= Q(tag=main_account)
+    if sub_account:
+        filters &= Q(sub_account_label=sub_account)
+
+    return received.filter(filters).values(*TRANSACTION_COLUMNS).union(
+        paid.filter(filters).values(*TRANSACTION_COLUMNS), all=True
+    ).order_by('-tx_date', 'kind', '-row_id')
+
+
+def to_transaction_row(row):
+    '''Shape a get_transactions() row the way the dashboard expects.'''
+    is_received = row['kind'] == 'received'
+    return {
+        'id': row['row_id'] if is_received else f"sp-{row['row_id']}",
+        'date': row['tx_date'],
+        'invoice_number': row['invoice_number'],
+        'customer': row['customer'],
+        'tag': row['tag'],
+        'sub_account': row['sub_account_label'],
+        'action': 'Received' if is_received else 'Paid to Supplier',
+        'amount': row['amount'],
+    }
+
+
+def rebuild_account_snapshots():
+    '''
+    Recreate every AccountBalanceSnapshot from the raw allocations with two
+    grouped queries. Returns the number of snapshot rows written.
+    '''
+    from inventory.models import SupplierPaymentAllocation
+
+    def daily_totals(queryset):
+        return queryset.annotate(
+            day=Coalesce('receipt__payment_date', TruncDate('receipt__created_at')),
+        ).values('receipt__sub_account_id', 'receipt__payment_mode_id', 'day').annotate(total=Sum('amount_applied'))
+
+    def snapshot_key(row):
+        key = _snapshot_key(row['receipt__sub_account_id'], row['receipt__payment_mode_id'])
+        return key['sub_account_id'], key.get('payment_mode_id'), row['day']
+
+    snapshots = {}
+    for row in daily_totals(PaymentAllocation.objects.all()):
+        snapshots.setdefault(snapshot_key(row), [ZERO, ZERO])[0] += row['total'] or ZERO
+    for row in daily_totals(SupplierPaymentAllocation.objects.all()):
+        snapshots.setdefault(snapshot_key(row), [ZERO, ZERO])[1] += row['total'] or ZERO
+
+    with transaction.atomic():
+        AccountBalanceSnapshot.objects.all().delete()
+        AccountBalanceSnapshot.objects.bulk_create([
+            AccountBalanceSnapshot(
+                sub_account_id=sub_account_id,
+                payment_mode_id=payment_mode_id,
+                date=day,
+                total_debited=debited,
+                total_credited=credited,
+            )
+            for (sub_account_id, payment_mode_id, day), (debited, credited) in snapshots.items()
+        ], batch_size=1000)
+    return len(snapshots)
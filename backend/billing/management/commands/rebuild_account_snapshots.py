@@ -0,0 +1,23 @@
+"""
+Management command to rebuild the daily AccountBalanceSnapshot rows used by the
+accounting summary from the raw PaymentAllocation / SupplierPaymentAllocation rows,
+and the cached SubAccount.current_balance from the payment receipts.
+
+Usage:
+    python manage.py rebuild_account_snapshots
+"""
+
+from django.core.management.base import BaseCommand
+
+from billing.ledger import rebuild_account_snapshots, rebuild_sub_account_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily account balance snapshots and cached sub account balances'
+
+    def handle(self, *args, **options):
+        count = rebuild_account_snapshots()
+        accounts = rebuild_sub_account_balances()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {count} account balance snapshots and {accounts} sub account balances.'
+        ))
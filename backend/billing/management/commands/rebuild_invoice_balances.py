@@ -0,0 +1,94 @@
+"""
+Management command to rebuild and verify the materialized allocation columns
+(amount_allocated_cash, amount_allocated_insurance, outstanding) on InvoiceItem
+and Invoice against the raw PaymentAllocation rows.
+
+Usage:
+    python manage.py rebuild_invoice_balances
+    python manage.py rebuild_invoice_balances --check
+    python manage.py rebuild_invoice_balances --batch-size 500
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from billing.allocation import (
+    ALLOCATION_FIELDS,
+    recompute_allocation_totals,
+    rollup_invoice_allocation_totals,
+)
+from billing.models import Invoice, InvoiceItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild and verify invoice/invoice item allocation balances from PaymentAllocation rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only verify; report mismatches without writing and exit non-zero if any are found',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of invoice items processed per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        batch_size = options['batch_size']
+
+        item_mismatches = 0
+        item_ids = list(InvoiceItem.objects.order_by('id').values_list('id', flat=True))
+
+        for start in range(0, len(item_ids), batch_size):
+            batch_ids = item_ids[start:start + batch_size]
+            with transaction.atomic():
+                items = list(
+                    InvoiceItem.objects.filter(id__in=batch_ids).select_related('payment_mode')
+                )
+                changed = recompute_allocation_totals(items)
+                item_mismatches += len(changed)
+
+                if check_only:
+                    for item in changed:
+                        self.stdout.write(f'InvoiceItem #{item.id} (invoice #{item.invoice_id}) is out of sync')
+                    continue
+
+                if changed:
+                    InvoiceItem.objects.bulk_update(changed, ALLOCATION_FIELDS)
+                rollup_invoice_allocation_totals({item.invoice_id for item in items})
+
+        invoice_mismatches = self.verify_invoice_rollups()
+
+        if check_only:
+            if item_mismatches or invoice_mismatches:
+                raise CommandError(
+                    f'{item_mismatches} invoice items and {invoice_mismatches} invoices are out of sync. '
+                    f'Run without --check to rebuild.'
+                )
+            self.stdout.write(self.style.SUCCESS('All invoice balances match their allocations.'))
+            return
+
+        if invoice_mismatches:
+            raise CommandError(f'{invoice_mismatches} invoices still out of sync after rebuild.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt balances for {len(item_ids)} invoice items ({item_mismatches} corrected).'
+        ))
+
+    def verify_invoice_rollups(self):
+        """Compare Invoice roll-up columns with the sum of their items in one grouped query."""
+        mismatches = 0
+        rollups = Invoice.objects.annotate(
+            **{f'items_{field}': Sum(f'invoice_items__{field}') for field in ALLOCATION_FIELDS}
+        ).values('id', *ALLOCATION_FIELDS, *[f'items_{field}' for field in ALLOCATION_FIELDS])
+
+        for row in rollups.iterator():
+            if any((row[f'items_{field}'] or 0) != row[field] for field in ALLOCATION_FIELDS):
+                mismatches += 1
+                self.stdout.write(f'Invoice #{row["id"]} roll-up is out of sync')
+        return mismatches
@@ -0,0 +1,120 @@
+# Generated by Django 5.0.10 on 2026-10-17 09:12
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_allocation_balances(apps, schema_editor):
+    '''
+    Populate the new columns from existing PaymentAllocation rows. Mirrors
+    InvoiceItem.calculate_outstanding(); afterwards
+    `python manage.py rebuild_invoice_balances --check` can be used to verify.
+    '''
+    InvoiceItem = apps.get_model('billing', 'InvoiceItem')
+    Invoice = apps.get_model('billing', 'Invoice')
+    PaymentAllocation = apps.get_model('billing', 'PaymentAllocation')
+    zero = Decimal('0')
+
+    totals = {
+        row['invoice_item_id']: row
+        for row in PaymentAllocation.objects.values('invoice_item_id').annotate(
+            cash=Sum('amount_applied', filter=Q(receipt__insurance__isnull=True)),
+            insurance=Sum('amount_applied', filter=Q(receipt__insurance__isnull=False)),
+        )
+    }
+
+    batch = []
+    for item in InvoiceItem.objects.select_related('payment_mode').iterator(chunk_size=1000):
+        row = totals.get(item.id, {})
+        item.amount_allocated_cash = row.get('cash') or zero
+        item.amount_allocated_insurance = row.get('insurance') or zero
+
+        if item.payment_mode and item.payment_mode.payment_category == 'insurance':
+            cash_component = (item.item_amount or zero) - (item.actual_total or zero)
+            insurance_component = item.actual_total or zero
+        else:
+            cash_component = item.actual_total or zero
+            insurance_component = zero
+        item.outstanding = (
+            max(zero, cash_component - item.amount_allocated_cash)
+            + max(zero, insurance_component - item.amount_allocated_insurance)
+        )
+        batch.append(item)
+
+        if len(batch) >= 1000:
+            InvoiceItem.objects.bulk_update(
+                batch, ['amount_allocated_cash', 'amount_allocated_insurance', 'outstanding']
+            )
+            batch = []
+    if batch:
+        InvoiceItem.objects.bulk_update(
+            batch, ['amount_allocated_cash', 'amount_allocated_insurance', 'outstanding']
+        )
+
+    def item_sum(field):
+        return Coalesce(
+            Subquery(
+                InvoiceItem.objects.filter(invoice=OuterRef('pk'))
+                .values('invoice').annotate(total=Sum(field)).values('total')
+            ),
+            Value(zero),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+
+    Invoice.objects.update(
+        amount_allocated_cash=item_sum('amount_allocated_cash'),
+        amount_allocated_insurance=item_sum('amount_allocated_insurance'),
+        outstanding=item_sum('outstanding'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0012_paymentreceipt_sub_account_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_allocated_cash',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_allocated_insurance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='outstanding',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='amount_allocated_cash',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='amount_allocated_insurance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='outstanding',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['outstanding'], name='billing_inv_outstan_ed312f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoiceitem',
+            index=models.Index(fields=['outstanding'], name='billing_inv_outstan_a68a4f_idx'),
+        ),
+        migrations.RunPython(backfill_allocation_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.10 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_account_snapshots(apps, schema_editor):
+    '''
+    Build the daily snapshots from existing allocations. Mirrors
+    billing.ledger.rebuild_account_snapshots().
+    '''
+    AccountBalanceSnapshot = apps.get_model('billing', 'AccountBalanceSnapshot')
+    PaymentAllocation = apps.get_model('billing', 'PaymentAllocation')
+    SupplierPaymentAllocation = apps.get_model('inventory', 'SupplierPaymentAllocation')
+    zero = Decimal('0')
+
+    def daily_totals(queryset):
+        return queryset.annotate(
+            day=Coalesce('receipt__payment_date', TruncDate('receipt__created_at')),
+        ).values('receipt__sub_account_id', 'receipt__payment_mode_id', 'day').annotate(total=Sum('amount_applied'))
+
+    def snapshot_key(row):
+        # Receipts without a sub account are kept per payment mode
+        sub_account_id = row['receipt__sub_account_id']
+        payment_mode_id = None if sub_account_id else row['receipt__payment_mode_id']
+        return sub_account_id, payment_mode_id, row['day']
+
+    snapshots = {}
+    for row in daily_totals(PaymentAllocation.objects.all()):
+        snapshots.setdefault(snapshot_key(row), [zero, zero])[0] += row['total'] or zero
+    for row in daily_totals(SupplierPaymentAllocation.objects.all()):
+        snapshots.setdefault(snapshot_key(row), [zero, zero])[1] += row['total'] or zero
+
+    AccountBalanceSnapshot.objects.bulk_create([
+        AccountBalanceSnapshot(
+            sub_account_id=sub_account_id,
+            payment_mode_id=payment_mode_id,
+            date=day,
+            total_debited=debited,
+            total_credited=credited,
+        )
+        for (sub_account_id, payment_mode_id, day), (debited, credited) in snapshots.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0013_invoice_allocation_balances'),
+        ('inventory', '0012_merge_20260317_0106'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_debited', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_credited', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('payment_mode', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='billing.paymentmode')),
+                ('sub_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='billing.subaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='billing_acc_date_f363dd_idx')],
+                'constraints': [
+                    models.UniqueConstraint(condition=models.Q(('sub_account__isnull', False)), fields=('sub_account', 'date'), name='unique_sub_account_snapshot_date'),
+                    models.UniqueConstraint(condition=models.Q(('payment_mode__isnull', False), ('sub_account__isnull', True)), fields=('payment_mode', 'date'), name='unique_payment_mode_snapshot_date'),
+                    models.UniqueConstraint(condition=models.Q(('payment_mode__isnull', True), ('sub_account__isnull', True)), fields=('date',), name='unique_unassigned_snapshot_date'),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_account_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.10 on 2026-10-17 12:25
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_current_balance(apps, schema_editor):
+    '''Mirrors billing.ledger.rebuild_sub_account_balances().'''
+    SubAccount = apps.get_model('billing', 'SubAccount')
+    PaymentReceipt = apps.get_model('billing', 'PaymentReceipt')
+    SupplierPaymentReceipt = apps.get_model('inventory', 'SupplierPaymentReceipt')
+
+    def receipts_total(model):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(sub_account=OuterRef('pk'))
+                .values('sub_account').annotate(total=Sum('total_amount')).values('total')
+            ),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=15, decimal_places=2),
+        )
+
+    SubAccount.objects.update(
+        current_balance=F('opening_bal') + receipts_total(PaymentReceipt) - receipts_total(SupplierPaymentReceipt)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0014_accountbalancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subaccount',
+            name='current_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.RunPython(backfill_current_balance, migrations.RunPython.noop),
+    ]
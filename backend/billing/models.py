@@ -1,8 +1,12 @@
+from decimal import Decimal
+
 from django.db import models, transaction
-from django.db.models import Sum
+from django.db.models import Sum, Q
 from django.apps import apps
 from django.utils import timezone
 
+from company.sequences import max_suffix, next_number
+
 
 
 def invoice_file_path(instance, filename):
@@ -68,19 +72,32 @@ class Invoice(models.Model):
     # TODO: Signal to update  cash_paid once InvoicePayments is updated
     cash_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0, null=True, blank=True)
 
+    # Roll-ups of the InvoiceItem allocation columns below, kept in sync
+    # by billing.allocation.refresh_allocation_totals()
+    amount_allocated_cash = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    amount_allocated_insurance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Fields derived from the invoice items by calculate_invoice_totals()
+    TOTAL_FIELDS = ['invoice_amount', 'total_cash', 'amount_allocated_cash', 'amount_allocated_insurance', 'outstanding']
+
+    @staticmethod
+    def item_total_aggregates():
+        """InvoiceItem aggregates for each of TOTAL_FIELDS, for one conditional-aggregate query."""
+        return {
+            'invoice_amount': Sum('actual_total'),
+            # total amount with Payment Mode "Cash"
+            'total_cash': Sum('actual_total', filter=Q(payment_mode__payment_category='cash')),
+            'amount_allocated_cash': Sum('amount_allocated_cash'),
+            'amount_allocated_insurance': Sum('amount_allocated_insurance'),
+            'outstanding': Sum('outstanding'),
+        }
+
     def calculate_invoice_totals(self):
         if self.pk:
-            # Calculate total invoice amount
-            self.invoice_amount = self.invoice_items.aggregate(
-                total_amount=Sum('actual_total')
-            )['total_amount'] or 0
-            
-            # Calculate total cash amount
-            self.total_cash = self.invoice_items.filter(
-                payment_mode__payment_category='cash'
-            ).aggregate(
-                total_cash=Sum('actual_total')
-            )['total_cash'] or 0
+            totals = self.invoice_items.aggregate(**self.item_total_aggregates())
+            for field in self.TOTAL_FIELDS:
+                setattr(self, field, totals[field] or 0)
 
     def generate_invoice_number(self):
         """Generates a unique invoice number.
@@ -92,31 +109,22 @@ class Invoice(models.Model):
         if not self.pk:
             prefix = "DDLI"
             current_year = timezone.now().year
-
-            with transaction.atomic():
-                last_invoice = Invoice.objects.filter(
-                    invoice_number__startswith=prefix
-                    ).order_by('-invoice_number').select_for_update().first()
-                    
-                if last_invoice:
-                    try:
-                        last_invoice_year = int(last_invoice.invoice_number.split('-')[1])
-                        if last_invoice_year == current_year:
-                            last_invoice_number = int(last_invoice.invoice_number[4:9])
-                            next_invoice_number = last_invoice_number + 1
-                        else:
-                            next_invoice_number = 1 
-                    except (IndexError, ValueError):
-                        next_invoice_number = 1
-                else:
-                    next_invoice_number = 1
-                
-                invoice_number = f"{prefix}{next_invoice_number:05d}-{current_year}"
-                return invoice_number
+            suffix = f"-{current_year}"
+
+            next_invoice_number = next_number('invoice', current_year, seed=lambda: max_suffix(
+                Invoice.objects.filter(
+                    invoice_number__startswith=prefix, invoice_number__endswith=suffix
+                ).values_list('invoice_number', flat=True).iterator(),
+                prefix, suffix,
+            ))
+            return f"{prefix}{next_invoice_number:05d}{suffix}"
         return None
 
     def save(self, *args, **kwargs):
-        self.calculate_invoice_totals()
+        # Partial saves (status, cash_paid, ...) don't write the totals, so
+        # don't pay for the aggregate query either
+        if kwargs.get('update_fields') is None:
+            self.calculate_invoice_totals()
 
         if not self.invoice_number:
             self.invoice_number = self.generate_invoice_number()
@@ -128,6 +136,7 @@ class Invoice(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['invoice_date']),
             models.Index(fields=['patient']),  # Also frequently queried
+            models.Index(fields=['outstanding']),
         ]
 
     def __str__(self):
@@ -166,6 +175,12 @@ class InvoiceItem(models.Model):
         'inventory.Department', on_delete=models.SET_NULL, null=True, blank=True, 
         help_text="Used for departmental revenue tracking (e.g. Lab, Pharmacy, Main)"
     )
+    # Denormalized from PaymentAllocation so billing reads don't re-aggregate
+    # allocations. Maintained by billing.allocation.refresh_allocation_totals();
+    # rebuild with `python manage.py rebuild_invoice_balances`.
+    amount_allocated_cash = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    amount_allocated_insurance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     @property
     def sale_price(self):
@@ -194,6 +209,24 @@ class InvoiceItem(models.Model):
             return 'cash'
         return 'unknown'
     
+    def get_payable_components(self):
+        """
+        Split of what is owed on this item as (cash_component, insurance_component):
+        - cash item -> (actual_total, 0)
+        - insurance item -> (item_amount - actual_total [co-pay], actual_total)
+        """
+        if self.payment_mode and self.payment_mode.payment_category == 'insurance':
+            return (self.item_amount or 0) - (self.actual_total or 0), self.actual_total or 0
+        return self.actual_total or 0, 0
+
+    def calculate_outstanding(self):
+        """Amount still owed on this item, from the stored allocation totals."""
+        cash_component, insurance_component = self.get_payable_components()
+        return (
+            max(0, cash_component - (self.amount_allocated_cash or 0))
+            + max(0, insurance_component - (self.amount_allocated_insurance or 0))
+        )
+
     def get_pricing_for_item(self):
         """
         Centralized pricing logic with explicit fallback chain.
@@ -259,6 +292,7 @@ class InvoiceItem(models.Model):
             models.Index(fields=['invoice']),  # Frequently queried
             models.Index(fields=['payment_mode']),  # Used in aggregations
             models.Index(fields=['item_created_at']),  # Used for ordering
+            models.Index(fields=['outstanding']),
         ]
 
     def __str__(self):
@@ -325,7 +359,7 @@ class MainAccount(models.Model):
 
     @property
     def total_balance(self):
-        # Dynamically calculate total balance from all sub-accounts
+        # Sum of the cached sub-account balances (uses prefetched subaccounts if present)
         return sum(sub.balance for sub in self.subaccounts.all())
 
 
@@ -339,6 +373,7 @@ class SubAccount(models.Model):
     max_bal = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     min_trans = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     max_trans = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    current_balance = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -347,11 +382,69 @@ class SubAccount(models.Model):
 
     @property
     def balance(self):
-        from django.db.models import Sum
-        received = self.receipts.aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        paid_out = self.supplier_receipts.aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        return self.opening_bal + received - paid_out
+        return self.current_balance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.current_balance = self.opening_bal
+            return super().save(*args, **kwargs)
+
+        # current_balance only moves through F() increments (see
+        # billing.ledger.adjust_sub_account_balance); never write back a
+        # possibly stale in-memory value, only the change in opening balance.
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'current_balance'
+            ]
+        previous_opening_bal = SubAccount.objects.filter(pk=self.pk).values_list('opening_bal', flat=True).first()
+        super().save(*args, **kwargs)
+
+        if previous_opening_bal is not None and previous_opening_bal != Decimal(str(self.opening_bal)):
+            from .ledger import adjust_sub_account_balance
+            adjust_sub_account_balance(self.pk, Decimal(str(self.opening_bal)) - previous_opening_bal)
+            self.refresh_from_db(fields=['current_balance'])
+
+
+class AccountBalanceSnapshot(models.Model):
+    """
+    Daily movement per SubAccount: money received (debited) from patient/insurer
+    allocations and paid out (credited) through supplier allocations. Receipts
+    without a sub account are kept per payment mode, with sub_account null
+    (and payment_mode null too when the receipt has neither).
+
+    Kept up to date incrementally by billing.ledger as allocations are written,
+    so the accounting summary sums a handful of rows instead of every allocation.
+    Rebuild with `python manage.py rebuild_account_snapshots`.
+    """
+    sub_account = models.ForeignKey(SubAccount, on_delete=models.CASCADE, null=True, blank=True, related_name='snapshots')
+    payment_mode = models.ForeignKey(PaymentMode, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    date = models.DateField()
+    total_debited = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_credited = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sub_account', 'date'],
+                condition=models.Q(sub_account__isnull=False),
+                name='unique_sub_account_snapshot_date',
+            ),
+            models.UniqueConstraint(
+                fields=['payment_mode', 'date'],
+                condition=models.Q(sub_account__isnull=True, payment_mode__isnull=False),
+                name='unique_payment_mode_snapshot_date',
+            ),
+            models.UniqueConstraint(
+                fields=['date'],
+                condition=models.Q(sub_account__isnull=True, payment_mode__isnull=True),
+                name='unique_unassigned_snapshot_date',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        account = self.sub_account_id or f"mode {self.payment_mode_id}"
+        return f"{account} - {self.date} - +{self.total_debited} / -{self.total_credited}"
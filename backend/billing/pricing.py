@@ -0,0 +1,137 @@
+'''
+Batch pricing and creation of InvoiceItems.
+
+InvoiceItem.save() prices one line at a time (get_pricing_for_item() plus the
+update_invoice_item_actual_total pre_save signal), and its post_save receivers
+re-aggregate the invoice after every line. create_invoice_items() instead
+resolves the prices of every line through a PriceMap (one Inventory and one
+InsuranceItemSalePrice query), inserts the lines with bulk_create() and
+recomputes the invoice totals once.
+'''
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import transaction
+
+from .models import InvoiceItem, PaymentMode
+from .utils import update_service_billed_status
+
+
+ZERO = Decimal('0')
+
+
+def get_default_payment_mode():
+    '''The payment mode InvoiceItemSerializer assigns when none is given.'''
+    return (
+        PaymentMode.objects.filter(is_default=True).first()
+        or PaymentMode.objects.filter(payment_category='cash').first()
+    )
+
+
+class PriceMap:
+    '''
+    Cash and insurance prices for a set of items, loaded up front so a
+    request can price any number of lines without further queries.
+    '''
+
+    def __init__(self, item_ids, insurance_ids=()):
+        Inventory = apps.get_model('inventory', 'Inventory')
+        InsuranceItemSalePrice = apps.get_model('inventory', 'InsuranceItemSalePrice')
+        item_ids = set(item_ids)
+        insurance_ids = {insurance_id for insurance_id in insurance_ids if insurance_id}
+
+        # Newest inventory row per item, as get_pricing_for_item() uses
+        self.cash_prices = {}
+        for item_id, sale_price in Inventory.objects.filter(
+            item_id__in=item_ids
+        ).order_by('item_id', '-id').values_list('item_id', 'sale_price'):
+            self.cash_prices.setdefault(item_id, sale_price)
+
+        self.insurance_prices = {}
+        if insurance_ids:
+            self.insurance_prices = {
+                (item_id, insurance_id): (sale_price, co_pay)
+                for item_id, insurance_id, sale_price, co_pay in InsuranceItemSalePrice.objects.filter(
+                    item_id__in=item_ids, insurance_company_id__in=insurance_ids
+                ).values_list('item_id', 'insurance_company_id', 'sale_price', 'co_pay')
+            }
+
+    def get_pricing(self, item_id, payment_mode):
+        '''
+        Same result as InvoiceItem.save() followed by the actual_total pre_save
+        signal: item_amount, actual_total (less any co-pay) and price_source.
+        '''
+        base_price = self.cash_prices.get(item_id)
+        if base_price is None:
+            base_price = ZERO
+
+        insurance_price = None
+        if payment_mode and payment_mode.insurance_id:
+            insurance_price = self.insurance_prices.get((item_id, payment_mode.insurance_id))
+
+        if payment_mode and payment_mode.payment_category == 'insurance' and payment_mode.insurance_id:
+            if insurance_price:
+                item_amount, price_source = insurance_price[0] or ZERO, 'insurance'
+            else:
+                item_amount, price_source = base_price, 'cash_fallback'
+        else:
+            item_amount, price_source = base_price, 'cash' if payment_mode else 'unknown'
+
+        co_pay = insurance_price[1] if insurance_price else ZERO
+        return {
+            'item_amount': item_amount,
+            'actual_total': item_amount - co_pay,
+            'price_source': price_source,
+        }
+
+
+def create_invoice_items(invoice, lines):
+    '''
+    Add `lines` (dicts with item, and optionally payment_mode, status and
+    source_tag, as model instances) to `invoice` in one transaction.
+
+    Returns a list of (InvoiceItem, price_source) pairs.
+    '''
+    if not lines:
+        return []
+
+    default_payment_mode = None
+    if any(not line.get('payment_mode') for line in lines):
+        default_payment_mode = get_default_payment_mode()
+
+    lines = [
+        dict(line, payment_mode=line.get('payment_mode') or default_payment_mode)
+        for line in lines
+    ]
+    price_map = PriceMap(
+        [line['item'].pk for line in lines],
+        [line['payment_mode'].insurance_id for line in lines if line['payment_mode']],
+    )
+
+    invoice_items = []
+    price_sources = []
+    for line in lines:
+        pricing = price_map.get_pricing(line['item'].pk, line['payment_mode'])
+        invoice_item = InvoiceItem(
+            invoice=invoice,
+            item=line['item'],
+            payment_mode=line['payment_mode'],
+            status=line.get('status') or 'pending',
+            source_tag=line.get('source_tag'),
+            item_amount=pricing['item_amount'],
+            actual_total=pricing['actual_total'],
+        )
+        invoice_item.outstanding = invoice_item.calculate_outstanding()
+        invoice_items.append(invoice_item)
+        price_sources.append(pricing['price_source'])
+
+    with transaction.atomic():
+        invoice_items = InvoiceItem.objects.bulk_create(invoice_items)
+        # bulk_create() sends no signals: roll the totals up once and mark
+        # any lines created as billed, as the post_save receivers would
+        invoice.save()
+        for invoice_item in invoice_items:
+            if invoice_item.status == 'billed' and invoice_item.item.category in ['Drug', 'Lab Test']:
+                update_service_billed_status(invoice_item)
+
+    return list(zip(invoice_items, price_sources))
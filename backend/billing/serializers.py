@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from easymed.serializers import SparseFieldsetMixin
 from django.core.exceptions import ValidationError
 from .models import (
     Invoice, InvoiceItem,
@@ -8,7 +9,7 @@ from .models import (
 )
 
 
-class InvoiceItemSerializer(serializers.ModelSerializer):
+class InvoiceItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = serializers.SerializerMethodField()
     item_name = serializers.SerializerMethodField()
     item_code = serializers.SerializerMethodField()
@@ -21,6 +22,7 @@ class InvoiceItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = InvoiceItem
         fields = '__all__'
+        read_only_fields = ['amount_allocated_cash', 'amount_allocated_insurance', 'outstanding']
 
     def get_category(self, obj):
         item = obj.item
@@ -95,7 +97,7 @@ class InvoiceItemSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({'detail': str(e)})
 
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     invoice_items = InvoiceItemSerializer(many=True, read_only=True)
     patient_name = serializers.SerializerMethodField()
     payment_receipts = serializers.SerializerMethodField()
@@ -122,8 +124,9 @@ class InvoiceSerializer(serializers.ModelSerializer):
         fields = ['id', 'invoice_number', 'invoice_date', 'patient',
                 'invoice_items', 'cash_paid', 'total_cash', 'patient_name',
                 'invoice_amount', 'status', 'invoice_description',
-                'invoice_file', 'invoice_created_at', 'invoice_updated_at', 'payment_receipts']
-        read_only_fields = ['invoice_number']
+                'invoice_file', 'invoice_created_at', 'invoice_updated_at', 'payment_receipts',
+                'amount_allocated_cash', 'amount_allocated_insurance', 'outstanding']
+        read_only_fields = ['invoice_number', 'amount_allocated_cash', 'amount_allocated_insurance', 'outstanding']
 
 
 class PaymentModeSerializer(serializers.ModelSerializer):
@@ -152,7 +155,7 @@ class PaymentAllocationSerializer(serializers.ModelSerializer):
         fields = ['invoice_item', 'invoice_id', 'invoice_number', 'amount_applied', 'applied_at']
 
 
-class PaymentReceiptSerializer(serializers.ModelSerializer):
+class PaymentReceiptSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     allocations = PaymentAllocationSerializer(many=True, read_only=True)
     insurance_name = serializers.SerializerMethodField()
     patient_name = serializers.SerializerMethodField()
@@ -208,6 +211,54 @@ class PaymentReceiptSerializer(serializers.ModelSerializer):
         return list(invoice_ids)
 
 
+class InvoiceItemLineSerializer(serializers.Serializer):
+    item = serializers.IntegerField()
+    payment_mode = serializers.IntegerField(required=False, allow_null=True)
+    source_tag = serializers.IntegerField(required=False, allow_null=True)
+    status = serializers.ChoiceField(choices=InvoiceItem.STATUS_CHOICES, required=False)
+
+
+class BulkInvoiceItemRequestSerializer(serializers.Serializer):
+    """
+    Lines for InvoiceViewset.bulk_items. The item, payment mode and
+    department ids of all lines are resolved with one query per model.
+    """
+    items = InvoiceItemLineSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, lines):
+        from inventory.models import Department, Item
+
+        related = {
+            'item': Item.objects.in_bulk({line['item'] for line in lines}),
+            'payment_mode': PaymentMode.objects.in_bulk(
+                {line['payment_mode'] for line in lines if line.get('payment_mode')}
+            ),
+            'source_tag': Department.objects.in_bulk(
+                {line['source_tag'] for line in lines if line.get('source_tag')}
+            ),
+        }
+
+        errors = []
+        resolved = []
+        for line in lines:
+            line = dict(line)
+            missing = {}
+            for field, objects in related.items():
+                pk = line.get(field)
+                if pk is None:
+                    continue
+                if pk not in objects:
+                    missing[field] = [f'Invalid pk "{pk}" - object does not exist.']
+                else:
+                    line[field] = objects[pk]
+            errors.append(missing)
+            resolved.append(line)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return resolved
+
+
 class AllocatePaymentRequestSerializer(serializers.Serializer):
     patient_id = serializers.IntegerField(required=False, allow_null=True)
     insurance_id = serializers.IntegerField(required=False, allow_null=True)
@@ -216,6 +267,7 @@ class AllocatePaymentRequestSerializer(serializers.Serializer):
     amount = serializers.DecimalField(max_digits=12, decimal_places=2)
     reference_number = serializers.CharField(max_length=100)
     payment_date = serializers.DateField(required=False, allow_null=True)
+    dry_run = serializers.BooleanField(required=False, default=False)
 
     def validate(self, data):
         # Ensure either patient_id or insurance_id is provided, but not both
@@ -243,6 +295,7 @@ class SubAccountSerializer(serializers.ModelSerializer):
     class Meta:
         model = SubAccount
         fields = '__all__'
+        read_only_fields = ['current_balance']
 
 
 class MainAccountSerializer(serializers.ModelSerializer):
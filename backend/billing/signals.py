@@ -1,59 +1,37 @@
+from decimal import Decimal
+
 from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
-from django.db.models import Sum
 
 from .utils import check_quantity_availability, update_service_billed_status
-from inventory.models import InsuranceItemSalePrice
-from .models import InvoiceItem, InvoicePayment
+from inventory.models import InsuranceItemSalePrice, SupplierPaymentAllocation, SupplierPaymentReceipt
+from .models import InvoiceItem, InvoicePayment, PaymentAllocation, PaymentReceipt
+from .allocation import refresh_allocation_totals
+from .totals import schedule_invoice_totals
+from .ledger import (
+    adjust_sub_account_balance,
+    record_receipt_allocations,
+    record_supplier_receipt_allocations,
+)
 
 
 @receiver(post_save, sender=InvoiceItem)
-def update_invoice_on_item_save(sender, instance, created, **kwargs):
+def update_invoice_on_item_save(sender, instance, created, using, **kwargs):
     """
-    Update the total_cash and invoice_amount fields in the Invoice model
-    when an InvoiceItem is created or updated.
+    Recompute the Invoice totals (invoice_amount, total_cash, ...) when an
+    InvoiceItem is created or updated, once per invoice when the
+    transaction commits (see billing.totals).
     """
-    if instance.invoice:
-        invoice = instance.invoice
-
-        # Recalculate total invoice amount
-        invoice.invoice_amount = invoice.invoice_items.aggregate(
-            total_amount=Sum('actual_total')
-        )['total_amount'] or 0
-
-        # Recalculate total_cash (sum of items with payment mode "Cash")
-        invoice.total_cash = invoice.invoice_items.filter(
-            payment_mode__payment_category='cash'
-        ).aggregate(
-            total_cash=Sum('actual_total')
-        )['total_cash'] or 0
-
-        invoice.save()
+    schedule_invoice_totals(instance.invoice_id, using=using)
 
 
 @receiver(post_delete, sender=InvoiceItem)
-def update_invoice_on_item_delete(sender, instance, **kwargs):
+def update_invoice_on_item_delete(sender, instance, using, **kwargs):
     """
-    Update the total_cash and invoice_amount fields in the Invoice model
-    when an InvoiceItem is deleted.
+    Recompute the Invoice totals when an InvoiceItem is deleted.
     """
-    if instance.invoice:
-        invoice = instance.invoice
-
-        # Recalculate totals after deletion
-        invoice.invoice_amount = invoice.invoice_items.aggregate(
-            total_amount=Sum('actual_total')
-        )['total_amount'] or 0
-
-        invoice.total_cash = invoice.invoice_items.filter(
-            payment_mode__payment_category='cash'
-        ).aggregate(
-            total_cash=Sum('actual_total')
-        )['total_cash'] or 0
-
-        invoice.save()
-
+    schedule_invoice_totals(instance.invoice_id, using=using)
 
 
 @receiver(post_save, sender=InvoiceItem)
@@ -121,6 +99,88 @@ def update_invoice_item_actual_total(sender, instance, **kwargs):
     calculate_actual_total(instance)
 
 
+# Must stay registered after update_invoice_item_actual_total so the
+# outstanding balance is derived from the final actual_total.
+@receiver(pre_save, sender=InvoiceItem)
+def update_invoice_item_outstanding(sender, instance, **kwargs):
+    instance.outstanding = instance.calculate_outstanding()
+
+
+@receiver([post_save, post_delete], sender=PaymentAllocation)
+def sync_allocation_totals(sender, instance, **kwargs):
+    '''
+    Keep the materialized allocation columns on InvoiceItem/Invoice in step
+    with single-row allocation writes and cascaded deletes. Bulk writers call
+    refresh_allocation_totals() themselves since bulk_create() sends no signals.
+    '''
+    refresh_allocation_totals([instance.invoice_item_id])
+
+
+@receiver(post_save, sender=PaymentAllocation)
+def debit_account_snapshot(sender, instance, created, **kwargs):
+    if created:
+        record_receipt_allocations(instance.receipt, instance.amount_applied)
+
+
+@receiver(post_delete, sender=PaymentAllocation)
+def reverse_account_snapshot_debit(sender, instance, **kwargs):
+    record_receipt_allocations(instance.receipt, -instance.amount_applied)
+
+
+@receiver(post_save, sender=SupplierPaymentAllocation)
+def credit_account_snapshot(sender, instance, created, **kwargs):
+    if created:
+        record_supplier_receipt_allocations(instance.receipt, instance.amount_applied)
+
+
+@receiver(post_delete, sender=SupplierPaymentAllocation)
+def reverse_account_snapshot_credit(sender, instance, **kwargs):
+    record_supplier_receipt_allocations(instance.receipt, -instance.amount_applied)
+
+
+def _remember_receipt_balance_entry(instance):
+    # (sub_account_id, total_amount) as currently stored, so post_save can
+    # move the balance by the difference when a receipt is edited.
+    instance._previous_balance_entry = None
+    if instance.pk:
+        instance._previous_balance_entry = type(instance).objects.filter(pk=instance.pk).values_list(
+            'sub_account_id', 'total_amount'
+        ).first()
+
+
+def _sync_receipt_balance(instance, sign):
+    previous = getattr(instance, '_previous_balance_entry', None)
+    if previous:
+        adjust_sub_account_balance(previous[0], -sign * previous[1])
+    adjust_sub_account_balance(instance.sub_account_id, sign * Decimal(str(instance.total_amount)))
+
+
+@receiver(pre_save, sender=PaymentReceipt)
+@receiver(pre_save, sender=SupplierPaymentReceipt)
+def remember_receipt_balance_entry(sender, instance, **kwargs):
+    _remember_receipt_balance_entry(instance)
+
+
+@receiver(post_save, sender=PaymentReceipt)
+def credit_sub_account_balance(sender, instance, **kwargs):
+    _sync_receipt_balance(instance, 1)
+
+
+@receiver(post_delete, sender=PaymentReceipt)
+def reverse_sub_account_credit(sender, instance, **kwargs):
+    adjust_sub_account_balance(instance.sub_account_id, -instance.total_amount)
+
+
+@receiver(post_save, sender=SupplierPaymentReceipt)
+def debit_sub_account_balance(sender, instance, **kwargs):
+    _sync_receipt_balance(instance, -1)
+
+
+@receiver(post_delete, sender=SupplierPaymentReceipt)
+def reverse_sub_account_debit(sender, instance, **kwargs):
+    adjust_sub_account_balance(instance.sub_account_id, instance.total_amount)
+
+
 # update Invoice.cash_paid when InvoicePayment is saved
 @receiver(post_save, sender=InvoicePayment)
 def update_invoice_cash_paid(sender, instance, created, **kwargs):
@@ -0,0 +1,132 @@
+import pytest
+from decimal import Decimal
+
+from django.urls import reverse
+
+from billing.allocation import plan_payment_allocation, apply_payment_allocation
+from billing.ledger import get_account_totals, rebuild_account_snapshots, rebuild_sub_account_balances
+from billing.models import (
+    AccountBalanceSnapshot, Invoice, InvoiceItem, MainAccount, PaymentMode, PaymentReceipt, SubAccount,
+)
+
+
+@pytest.fixture
+def cash_mode(db):
+    return PaymentMode.objects.create(payment_mode='Cash', payment_category='cash', is_default=True)
+
+
+@pytest.fixture
+def till(db):
+    main_account = MainAccount.objects.create(name='Cash')
+    return SubAccount.objects.create(main_account=main_account, name='Front Desk Till')
+
+
+@pytest.fixture
+def paid_receipt(patient, item, inventory, cash_mode, till, django_capture_on_commit_callbacks):
+    invoice = Invoice.objects.create(patient=patient)
+    with django_capture_on_commit_callbacks(execute=True):
+        InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+    invoice.refresh_from_db()
+
+    receipt = PaymentReceipt.objects.create(
+        patient=patient, sub_account=till, total_amount=Decimal('20.00'), reference_number='REF-1'
+    )
+    apply_payment_allocation(receipt, plan_payment_allocation([invoice], Decimal('20.00')))
+    return receipt
+
+
+@pytest.mark.django_db
+def test_allocations_update_daily_snapshot(paid_receipt, till):
+    snapshot = AccountBalanceSnapshot.objects.get(sub_account=till)
+    assert snapshot.total_debited == Decimal('20.00')
+    assert snapshot.total_credited == Decimal('0')
+
+    totals, sub_account_totals = get_account_totals()
+    assert sub_account_totals == [{
+        'main_account': 'Cash',
+        'sub_account': 'Front Desk Till',
+        'total_debited': Decimal('20.00'),
+        'total_credited': Decimal('0'),
+        'net_balance': Decimal('20.00'),
+    }]
+    assert totals[-1]['tag'] == 'TOTAL'
+
+    paid_receipt.delete()
+    snapshot.refresh_from_db()
+    assert snapshot.total_debited == Decimal('0')
+
+
+@pytest.mark.django_db
+def test_rebuild_matches_incremental_snapshots(paid_receipt, till):
+    before = list(AccountBalanceSnapshot.objects.values('sub_account', 'date', 'total_debited', 'total_credited'))
+    AccountBalanceSnapshot.objects.all().delete()
+
+    assert rebuild_account_snapshots() == 1
+    after = list(AccountBalanceSnapshot.objects.values('sub_account', 'date', 'total_debited', 'total_credited'))
+    assert after == before
+
+
+@pytest.mark.django_db
+def test_sub_account_balance_tracks_receipts(patient, till):
+    till.opening_bal = Decimal('100.00')
+    till.save()
+    till.refresh_from_db()
+    assert till.balance == Decimal('100.00')
+
+    receipt = PaymentReceipt.objects.create(
+        patient=patient, sub_account=till, total_amount=Decimal('30.00'), reference_number='REF-2'
+    )
+    till.refresh_from_db()
+    assert till.balance == Decimal('130.00')
+
+    # A save from a stale instance must not clobber the cached balance
+    till.current_balance = Decimal('0')
+    till.name = 'Main Till'
+    till.save()
+    till.refresh_from_db()
+    assert till.balance == Decimal('130.00')
+
+    receipt.delete()
+    till.refresh_from_db()
+    assert till.balance == Decimal('100.00')
+    assert rebuild_sub_account_balances() == 1
+    till.refresh_from_db()
+    assert till.balance == Decimal('100.00')
+
+
+@pytest.mark.django_db
+def test_receipts_without_sub_account_are_totalled(paid_receipt, patient, item, inventory, cash_mode):
+    invoice = Invoice.objects.create(patient=patient)
+    InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+    invoice.refresh_from_db()
+    receipt = PaymentReceipt.objects.create(
+        patient=patient, payment_mode=cash_mode, total_amount=Decimal('15.00'), reference_number='REF-3'
+    )
+    apply_payment_allocation(receipt, plan_payment_allocation([invoice], Decimal('15.00')))
+
+    snapshot = AccountBalanceSnapshot.objects.get(sub_account__isnull=True)
+    assert snapshot.payment_mode == cash_mode
+    assert snapshot.total_debited == Decimal('15.00')
+
+    totals, sub_account_totals = get_account_totals()
+    assert [(row['main_account'], row['sub_account'], row['total_debited']) for row in sub_account_totals] == [
+        ('Cash', 'Cash', Decimal('15.00')),
+        ('Cash', 'Front Desk Till', Decimal('20.00')),
+    ]
+    assert totals[-1]['total_debited'] == Decimal('35.00')
+
+    assert rebuild_account_snapshots() == 2
+    assert get_account_totals() == (totals, sub_account_totals)
+
+
+@pytest.mark.django_db
+def test_summary_embeds_transactions_only_on_request(paid_receipt, authenticated_doctor_client):
+    url = reverse('accounting-summary')
+
+    response = authenticated_doctor_client.get(url)
+    assert response.status_code == 200
+    assert 'transactions' not in response.data
+    assert response.data['totals'][-1]['total_debited'] == Decimal('20.00')
+
+    response = authenticated_doctor_client.get(url, {'include_transactions': 'true'})
+    assert len(response.data['transactions']) == 1
@@ -0,0 +1,65 @@
+import pytest
+from decimal import Decimal
+
+from billing.allocation import plan_payment_allocation, apply_payment_allocation
+from billing.models import Invoice, InvoiceItem, PaymentMode, PaymentReceipt
+from inventory.models import InsuranceItemSalePrice
+
+
+@pytest.fixture
+def insurance_mode(insurance_company):
+    return PaymentMode.objects.create(
+        payment_mode='Insurance', payment_category='insurance', insurance=insurance_company
+    )
+
+
+@pytest.fixture
+def insurance_invoices(patient, item, inventory, insurance_company, insurance_mode, django_capture_on_commit_callbacks):
+    InsuranceItemSalePrice.objects.update_or_create(
+        item=item, insurance_company=insurance_company,
+        defaults={'sale_price': Decimal('100.00'), 'co_pay': Decimal('20.00')},
+    )
+    invoices = []
+    for _ in range(3):
+        invoice = Invoice.objects.create(patient=patient)
+        with django_capture_on_commit_callbacks(execute=True):
+            InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=insurance_mode)
+        invoices.append(invoice)
+    return invoices
+
+
+@pytest.mark.django_db
+def test_insurance_invoices_totals_and_status_filter(authenticated_admin_client, insurance_company, insurance_invoices):
+    first = insurance_invoices[0]
+    receipt = PaymentReceipt.objects.create(
+        insurance=insurance_company, total_amount=Decimal('80.00'), reference_number='INS-1'
+    )
+    apply_payment_allocation(
+        receipt,
+        plan_payment_allocation([first], Decimal('80.00'), insurance_id=insurance_company.id),
+        is_insurance_payment=True,
+    )
+
+    url = f'/billing/invoices/insurance/{insurance_company.id}/'
+    rows = authenticated_admin_client.get(url).json()
+    assert len(rows) == 3
+    paid = [row for row in rows if row['id'] == first.id][0]
+    assert Decimal(paid['insurance_total']) == Decimal('80.00')
+    assert Decimal(paid['insurance_balance']) == Decimal('0.00')
+    assert paid['status'] == 'paid'
+
+    pending = authenticated_admin_client.get(url, {'status': 'pending'}).json()
+    assert {row['id'] for row in pending} == {inv.id for inv in insurance_invoices[1:]}
+
+
+@pytest.mark.django_db
+def test_insurance_invoices_keyset_pagination(authenticated_admin_client, insurance_company, insurance_invoices):
+    url = f'/billing/invoices/insurance/{insurance_company.id}/'
+
+    first_page = authenticated_admin_client.get(url, {'page_size': 2}).json()
+    assert len(first_page['results']) == 2
+    assert first_page['next']
+
+    second_page = authenticated_admin_client.get(first_page['next']).json()
+    seen = [row['id'] for row in first_page['results'] + second_page['results']]
+    assert sorted(seen) == sorted(inv.id for inv in insurance_invoices)
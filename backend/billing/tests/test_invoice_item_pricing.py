@@ -0,0 +1,77 @@
+import pytest
+from decimal import Decimal
+
+from billing.models import Invoice, InvoiceItem, PaymentMode
+from billing.pricing import PriceMap, create_invoice_items
+from inventory.models import InsuranceItemSalePrice
+
+
+@pytest.fixture
+def cash_mode(db):
+    return PaymentMode.objects.create(payment_mode='Cash', payment_category='cash', is_default=True)
+
+
+@pytest.fixture
+def insurance_mode(insurance_company):
+    return PaymentMode.objects.create(
+        payment_mode='Insurance', payment_category='insurance', insurance=insurance_company
+    )
+
+
+@pytest.fixture
+def insurance_price(item, insurance_company):
+    return InsuranceItemSalePrice.objects.create(
+        item=item, insurance_company=insurance_company,
+        sale_price=Decimal('50.00'), co_pay=Decimal('5.00'),
+    )
+
+
+@pytest.mark.django_db
+def test_price_map_matches_invoice_item_save(patient, item, inventory, cash_mode, insurance_mode, insurance_price):
+    invoice = Invoice.objects.create(patient=patient)
+    price_map = PriceMap([item.id], [insurance_mode.insurance_id])
+
+    for payment_mode in (cash_mode, insurance_mode):
+        saved = InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=payment_mode)
+        pricing = price_map.get_pricing(item.id, payment_mode)
+
+        assert pricing['item_amount'] == saved.item_amount
+        assert pricing['actual_total'] == saved.actual_total
+        assert pricing['price_source'] == saved.price_source
+
+
+@pytest.mark.django_db
+def test_create_invoice_items_prices_in_bulk_and_totals_once(
+    patient, item, inventory, cash_mode, insurance_mode, insurance_price, django_assert_max_num_queries
+):
+    invoice = Invoice.objects.create(patient=patient)
+    lines = [{'item': item, 'payment_mode': insurance_mode}] + [{'item': item}] * 10
+
+    with django_assert_max_num_queries(8):
+        created = create_invoice_items(invoice, lines)
+
+    assert len(created) == 11
+    assert [source for _, source in created] == ['insurance'] + ['cash'] * 10
+    assert created[1][0].payment_mode == cash_mode
+
+    invoice.refresh_from_db()
+    assert invoice.invoice_amount == Decimal('45.00') + 10 * Decimal('20.00')
+    assert invoice.total_cash == 10 * Decimal('20.00')
+    # co-pay plus insurance share on the insurance line, full price on cash lines
+    assert invoice.outstanding == Decimal('50.00') + 10 * Decimal('20.00')
+    assert InvoiceItem.objects.filter(invoice=invoice).count() == 11
+
+
+@pytest.mark.django_db
+def test_bulk_items_endpoint_rejects_unknown_items(authenticated_admin_client, patient, item, inventory, cash_mode):
+    invoice = Invoice.objects.create(patient=patient)
+
+    response = authenticated_admin_client.post(
+        f'/billing/invoices/{invoice.id}/items/bulk/',
+        {'items': [{'item': item.id}, {'item': 999999}]},
+        content_type='application/json',
+    )
+
+    assert response.status_code == 400
+    assert 'item' in response.json()['items'][1]
+    assert not InvoiceItem.objects.filter(invoice=invoice).exists()
@@ -0,0 +1,67 @@
+import pytest
+from decimal import Decimal
+from unittest import mock
+
+from django.db import transaction
+
+from billing import totals
+from billing.models import Invoice, InvoiceItem, PaymentMode
+
+
+@pytest.fixture
+def cash_mode(db):
+    return PaymentMode.objects.create(payment_mode='Cash', payment_category='cash', is_default=True)
+
+
+@pytest.mark.django_db
+def test_invoice_totals_are_recomputed_once_on_commit(
+    patient, item, inventory, cash_mode, django_capture_on_commit_callbacks
+):
+    invoice = Invoice.objects.create(patient=patient)
+
+    with mock.patch('billing.totals.recompute_invoice_totals', wraps=totals.recompute_invoice_totals) as recompute:
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            for _ in range(3):
+                InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+
+            invoice.refresh_from_db()
+            assert invoice.invoice_amount == Decimal('0')
+
+    # One batch per transaction, registered per item but recomputed once
+    assert len(set(callbacks)) == 1
+    recompute.assert_called_once()
+    invoice.refresh_from_db()
+    assert invoice.invoice_amount == Decimal('60.00')
+    assert invoice.total_cash == Decimal('60.00')
+    assert invoice.outstanding == Decimal('60.00')
+
+
+@pytest.mark.django_db
+def test_invoice_totals_follow_deleted_items(patient, item, inventory, cash_mode, django_capture_on_commit_callbacks):
+    invoice = Invoice.objects.create(patient=patient)
+    with django_capture_on_commit_callbacks(execute=True):
+        first = InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+        InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        first.delete()
+
+    invoice.refresh_from_db()
+    assert invoice.invoice_amount == Decimal('20.00')
+
+
+@pytest.mark.django_db
+def test_rolled_back_batch_does_not_swallow_later_changes(
+    patient, item, inventory, cash_mode, django_capture_on_commit_callbacks
+):
+    invoice = Invoice.objects.create(patient=patient)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+                raise RuntimeError
+        InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+
+    invoice.refresh_from_db()
+    assert invoice.invoice_amount == Decimal('20.00')
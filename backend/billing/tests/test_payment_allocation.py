@@ -0,0 +1,84 @@
+import pytest
+from decimal import Decimal
+
+from billing.allocation import plan_payment_allocation, apply_payment_allocation
+from billing.models import Invoice, InvoiceItem, PaymentMode, PaymentReceipt, PaymentAllocation
+
+
+@pytest.fixture
+def cash_mode(db):
+    return PaymentMode.objects.create(payment_mode='Cash', payment_category='cash', is_default=True)
+
+
+@pytest.fixture
+def cash_invoice(patient, item, inventory, cash_mode, django_capture_on_commit_callbacks):
+    invoice = Invoice.objects.create(patient=patient)
+    # Invoice totals are recomputed on commit (billing.totals)
+    with django_capture_on_commit_callbacks(execute=True):
+        InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+        InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+    invoice.refresh_from_db()
+    return invoice
+
+
+@pytest.mark.django_db
+def test_plan_splits_oldest_first_without_writing(cash_invoice, patient):
+    plan = plan_payment_allocation([cash_invoice], Decimal('30.00'))
+
+    amounts = [amount for _, amount in plan['allocations']]
+    assert amounts == [Decimal('20.00'), Decimal('10.00')]
+    assert plan['unallocated'] == Decimal('0')
+    assert plan['invoices'][cash_invoice.id]['status'] == 'pending'
+    assert PaymentAllocation.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_apply_writes_allocations_and_invoice_totals(cash_invoice, patient):
+    receipt = PaymentReceipt.objects.create(
+        patient=patient, total_amount=Decimal('50.00'), reference_number='REF-1'
+    )
+    plan = plan_payment_allocation([cash_invoice], Decimal('50.00'))
+    apply_payment_allocation(receipt, plan)
+
+    cash_invoice.refresh_from_db()
+    assert PaymentAllocation.objects.filter(receipt=receipt).count() == 2
+    assert cash_invoice.cash_paid == Decimal('40.00')
+    assert cash_invoice.status == 'paid'
+    assert plan['unallocated'] == Decimal('10.00')
+
+
+@pytest.mark.django_db
+def test_previous_allocations_reduce_outstanding(cash_invoice, patient):
+    first = PaymentReceipt.objects.create(
+        patient=patient, total_amount=Decimal('25.00'), reference_number='REF-1'
+    )
+    apply_payment_allocation(
+        first, plan_payment_allocation([cash_invoice], Decimal('25.00'))
+    )
+    cash_invoice.refresh_from_db()
+
+    plan = plan_payment_allocation([cash_invoice], Decimal('100.00'))
+
+    assert [amount for _, amount in plan['allocations']] == [Decimal('15.00')]
+    assert plan['invoices'][cash_invoice.id]['status'] == 'paid'
+
+
+@pytest.mark.django_db
+def test_allocation_columns_track_created_and_deleted_allocations(cash_invoice, patient):
+    receipt = PaymentReceipt.objects.create(
+        patient=patient, total_amount=Decimal('30.00'), reference_number='REF-1'
+    )
+    apply_payment_allocation(receipt, plan_payment_allocation([cash_invoice], Decimal('30.00')))
+
+    cash_invoice.refresh_from_db()
+    first, second = cash_invoice.invoice_items.order_by('id')
+    assert (first.amount_allocated_cash, first.outstanding) == (Decimal('20.00'), Decimal('0.00'))
+    assert (second.amount_allocated_cash, second.outstanding) == (Decimal('10.00'), Decimal('10.00'))
+    assert cash_invoice.amount_allocated_cash == Decimal('30.00')
+    assert cash_invoice.outstanding == Decimal('10.00')
+
+    receipt.delete()
+
+    cash_invoice.refresh_from_db()
+    assert cash_invoice.amount_allocated_cash == Decimal('0.00')
+    assert cash_invoice.outstanding == Decimal('40.00')
@@ -0,0 +1,96 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from billing.models import PaymentReceipt
+from reports import pdf
+
+
+@pytest.fixture
+def receipt(patient):
+    return PaymentReceipt.objects.create(
+        patient=patient, total_amount=Decimal('50.00'), reference_number='REF-PDF'
+    )
+
+
+@pytest.mark.django_db
+def test_receipt_pdf_is_served_from_cache(client, receipt):
+    url = f'/billing/download_payment_receipt_pdf/{receipt.id}/'
+
+    with mock.patch('reports.pdf.render_pdf', wraps=pdf.render_pdf) as render:
+        first = client.get(url)
+        # The printed-on timestamp is not part of the cache key
+        later = timezone.now() + timedelta(minutes=5)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            second = client.get(url)
+
+    assert first['Content-Type'] == 'application/pdf'
+    assert second.content == first.content
+    assert render.call_count == 1
+    assert pdf.PRINTED_AT_MARKER in render.call_args.args[1]
+
+
+@pytest.mark.django_db
+def test_receipt_pdf_async_job(authenticated_client, receipt):
+    url = f'/billing/download_payment_receipt_pdf/{receipt.id}/'
+
+    # Celery runs eagerly in tests, so the job is already finished
+    job = authenticated_client.get(url, {'async': '1'}).json()
+    assert job['status'] == 'ready'
+    assert job['job_id'].startswith(f'payment_receipt_{receipt.id}-')
+
+    status = authenticated_client.get(f"/reports/pdf-jobs/{job['job_id']}/").json()
+    assert status['status'] == 'ready'
+
+    download = authenticated_client.get(f"/reports/pdf-jobs/{job['job_id']}/download/")
+    assert download.status_code == 200
+    assert download['Content-Type'] == 'application/pdf'
+
+
+@pytest.mark.django_db
+def test_pdf_jobs_are_only_served_to_their_requester(authenticated_client, authenticated_doctor_client, receipt):
+    url = f'/billing/download_payment_receipt_pdf/{receipt.id}/'
+    job_id = authenticated_client.get(url, {'async': '1'}).json()['job_id']
+
+    assert authenticated_doctor_client.get(f'/reports/pdf-jobs/{job_id}/').status_code == 404
+    assert authenticated_doctor_client.get(f'/reports/pdf-jobs/{job_id}/download/').status_code == 404
+
+    anonymous = APIClient()
+    assert anonymous.get(f'/reports/pdf-jobs/{job_id}/').status_code == 401
+    assert anonymous.get(f'/reports/pdf-jobs/{job_id}/download/').status_code == 401
+
+
+def test_write_pdf_fills_in_the_printed_at_timestamp():
+    html = f'<p>Printed on: {pdf.PRINTED_AT_MARKER}</p>'
+
+    with mock.patch('weasyprint.HTML') as html_document:
+        pdf.write_pdf(html)
+
+    rendered = html_document.call_args.kwargs['string']
+    assert pdf.PRINTED_AT_MARKER not in rendered
+    assert timezone.localtime().strftime('%Y-%m-%d') in rendered
+
+
+def test_url_fetcher_refuses_network_urls():
+    with pytest.raises(ValueError):
+        pdf.local_url_fetcher('https://example.com/logo.png')
+
+
+@pytest.mark.django_db
+def test_company_logo_data_uri_is_cached_until_company_saved(company, settings, tmp_path):
+    from django.core.files.base import ContentFile
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    company.logo.save('logo.png', ContentFile(b'first'))
+
+    data_uri = pdf.get_company_logo_data_uri(company)
+    assert data_uri.startswith('data:image/png;base64,')
+    assert pdf._logo_cache
+
+    company.save()
+    assert not pdf._logo_cache
@@ -0,0 +1,83 @@
+'''
+Deferred Invoice total recomputation.
+
+Saving or deleting an InvoiceItem only marks its invoice dirty. The dirty
+invoices of a transaction are recomputed once, when it commits, with one
+grouped conditional-aggregate query, and the totals are written with
+save(update_fields=...). Outside a transaction (autocommit) the recompute
+runs straight away, as on_commit() does.
+'''
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Invoice, InvoiceItem
+
+
+class InvoiceTotalsBatch:
+    '''The invoices marked dirty in one transaction; called on commit.'''
+
+    def __init__(self, using):
+        self.using = using
+        self.invoice_ids = set()
+        self.done = False
+
+    def __call__(self):
+        # Registered once per dirty item, but only the first call recomputes
+        if self.done:
+            return
+        self.done = True
+        connection = transaction.get_connection(self.using)
+        if getattr(connection, '_invoice_totals_batch', None) is self:
+            connection._invoice_totals_batch = None
+        recompute_invoice_totals(self.invoice_ids, using=self.using)
+
+
+def _pending_batch(connection):
+    batch = getattr(connection, '_invoice_totals_batch', None)
+    if batch is None or batch.done:
+        return None
+    return batch
+
+
+def schedule_invoice_totals(invoice_id, using=DEFAULT_DB_ALIAS):
+    '''Recompute `invoice_id`'s totals once the current transaction commits.'''
+    if not invoice_id:
+        return
+
+    connection = transaction.get_connection(using)
+    batch = _pending_batch(connection)
+    if batch is None:
+        batch = InvoiceTotalsBatch(using)
+        connection._invoice_totals_batch = batch
+    batch.invoice_ids.add(invoice_id)
+    # Registered again on every call: a savepoint or transaction rollback may
+    # have dropped the earlier registrations. Recomputing an invoice whose
+    # change was rolled back is harmless, it only rereads its items.
+    transaction.on_commit(batch, using=using)
+
+
+def recompute_invoice_totals(invoice_ids, using=DEFAULT_DB_ALIAS):
+    '''
+    Recalculate Invoice.TOTAL_FIELDS for `invoice_ids` from their items in
+    one grouped query and write each invoice with update_fields.
+    '''
+    invoice_ids = set(invoice_ids)
+    if not invoice_ids:
+        return
+
+    # Prefixed: some totals share their name with an InvoiceItem column
+    aggregates = {f'sum_{field}': aggregate for field, aggregate in Invoice.item_total_aggregates().items()}
+    totals = {
+        row['invoice_id']: row
+        for row in InvoiceItem.objects.using(using).filter(invoice_id__in=invoice_ids)
+        .values('invoice_id').annotate(**aggregates)
+    }
+
+    update_fields = Invoice.TOTAL_FIELDS + ['invoice_updated_at']
+    for invoice in Invoice.objects.using(using).filter(id__in=invoice_ids):
+        row = totals.get(invoice.id, {})
+        new_totals = [row.get(f'sum_{field}') or 0 for field in Invoice.TOTAL_FIELDS]
+        if new_totals == [getattr(invoice, field) for field in Invoice.TOTAL_FIELDS]:
+            continue
+        for field, value in zip(Invoice.TOTAL_FIELDS, new_totals):
+            setattr(invoice, field, value)
+        invoice.save(using=using, update_fields=update_fields)
@@ -19,7 +19,8 @@ from .views import (
     InvoicePaymentViewset,
     MainAccountViewSet,
     SubAccountViewSet,
-    AccountingSummaryView
+    AccountingSummaryView,
+    AccountingTransactionsView,
 )
 
 router = DefaultRouter()
@@ -43,6 +44,7 @@ urlpatterns = [
     path('invoice-items-by-insurance-company/', InvoiceItemsByInsuranceCompany.as_view(), name='invoice-items-by-insurance-company'),
     path('payment-modes-breakdown/', PaymentBreakdownView.as_view(), name='payment-breakdown'),
     path('accounting-summary/', AccountingSummaryView.as_view(), name='accounting-summary'),
+    path('accounting-summary/transactions/', AccountingTransactionsView.as_view(), name='accounting-summary-transactions'),
     path('accounting-summary/pdf/', download_accounting_summary_pdf, name='accounting-summary-pdf'),
 ]
 
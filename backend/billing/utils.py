@@ -2,6 +2,7 @@ from datetime import datetime
 
 from inventory.tasks import update_stock_quantity_if_stock_is_available
 from inventory.models import Inventory
+from inventory.summary import get_item_stock
 from patient.models import AttendanceProcess, PrescribedDrug
 from laboratory.models import LabTestRequest, LabTestRequestPanel
 
@@ -46,11 +47,7 @@ def update_service_billed_status(instance):
 
 
 def get_available_stock(instance):
-    inventory_items = Inventory.objects.filter(item=instance.item)
-    if not inventory_items.exists():
-        return 0
-
-    return sum(item.quantity_at_hand for item in inventory_items)
+    return get_item_stock(instance.item_id)['total_on_hand']
 
 # def get_available_stock(instance):
 #     inventory_items = Inventory.objects.filter(item=instance.item)
@@ -72,6 +69,11 @@ def check_quantity_availability(instance):
     Function to check if there is enough quantity available for the item before billing.
     Returns True if sufficient quantity is available, otherwise False.
     Finaly, updates Inventory stock
+
+    Items are billed one at a time (check_quantity_before_billing runs per
+    InvoiceItem status change), so this deducts a single line. Code billing a
+    whole invoice or prescription at once should use
+    inventory.stock.deduct_stock_batch() instead.
     '''
     # TODO: The first if sttment is called even when we're only billing  a Lab Test
     if instance.item.category == 'Drug' or instance.item.category == 'Lab Test':
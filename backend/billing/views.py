@@ -1,24 +1,34 @@
 from django.shortcuts import render, Http404
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from django.template.loader import get_template
 
 from .models import Invoice, InvoiceItem, PaymentMode, MainAccount, SubAccount
 from inventory.models import IncomingItem
 from rest_framework import generics
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.loader import get_template
 from django.conf import settings
-from weasyprint import HTML
+from reports.pdf import get_company_logo_data_uri, pdf_response
 from rest_framework import serializers
 from rest_framework.response import Response
-from django.db.models import Sum, Q
+from django.db.models import (
+    Sum, Q, F, Exists, OuterRef, Value, Case, When, CharField, DecimalField
+)
+from django.db.models.functions import Coalesce, Greatest
 from django.db import transaction
 from decimal import Decimal
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 
 from billing.filters import InvoiceFilterSearch, InvoiceFilter
+from rest_framework.pagination import LimitOffsetPagination
+from easymed.pagination import OptInCursorPagination
+from billing.ledger import get_account_totals, get_transactions, to_transaction_row
+from billing.pricing import create_invoice_items
+from billing.allocation import (
+    plan_payment_allocation, apply_payment_allocation, serialize_allocation_plan
+)
 from .models import InvoiceItem, Invoice, InvoicePayment, PaymentReceipt, PaymentAllocation
 from company.models import Company
 from inventory.models import InsuranceItemSalePrice
@@ -31,7 +41,7 @@ from authperms.permissions import (
 from .serializers import (
     InvoiceItemSerializer, InvoiceSerializer,
     PaymentModeSerializer, InvoicePaymentSerializer,
-    PaymentReceiptSerializer, AllocatePaymentRequestSerializer,
+    PaymentReceiptSerializer, AllocatePaymentRequestSerializer, BulkInvoiceItemRequestSerializer,
     MainAccountSerializer, SubAccountSerializer
     )
 
@@ -57,6 +67,7 @@ class InvoiceItemsByInsuranceCompany(generics.ListAPIView):
 class InvoiceViewset(viewsets.ModelViewSet):
     queryset = Invoice.objects.all().order_by('-id')
     serializer_class = InvoiceSerializer
+    cursor_ordering = ('-invoice_created_at', '-id')
     permission_classes = (IsDoctorUser | IsNurseUser | IsLabTechUser | IsReceptionistUser,)
     filter_backends = [InvoiceFilterSearch, DjangoFilterBackend]
     filterset_class = InvoiceFilter
@@ -64,6 +75,42 @@ class InvoiceViewset(viewsets.ModelViewSet):
         'patient__first_name', 'patient__second_name', 'invoice_number'
     ]
 
+    @action(detail=True, methods=['post'], url_path='items/bulk')
+    def bulk_items(self, request, pk=None):
+        """
+        Add many lines to an invoice in one request:
+        POST /billing/invoices/<id>/items/bulk/
+        {"items": [{"item": 1, "payment_mode": 2, "source_tag": 3}, ...]}
+
+        Prices come from billing.pricing.PriceMap, the lines are inserted with
+        bulk_create() and the invoice totals are recomputed once.
+        """
+        invoice = self.get_object()
+        req_ser = BulkInvoiceItemRequestSerializer(data=request.data)
+        req_ser.is_valid(raise_exception=True)
+
+        created = create_invoice_items(invoice, req_ser.validated_data['items'])
+
+        return Response({
+            'invoice': invoice.id,
+            'invoice_amount': invoice.invoice_amount,
+            'total_cash': invoice.total_cash,
+            'items': [
+                {
+                    'id': invoice_item.id,
+                    'item': invoice_item.item_id,
+                    'item_name': invoice_item.item.name,
+                    'payment_mode': invoice_item.payment_mode_id,
+                    'source_tag': invoice_item.source_tag_id,
+                    'status': invoice_item.status,
+                    'item_amount': invoice_item.item_amount,
+                    'actual_total': invoice_item.actual_total,
+                    'price_source': price_source,
+                }
+                for invoice_item, price_source in created
+            ],
+        }, status=status.HTTP_201_CREATED)
+
 
 class InvoicesByPatientId(generics.ListAPIView):
     serializer_class = InvoiceSerializer
@@ -79,66 +126,88 @@ class InvoicesByPatientId(generics.ListAPIView):
         return queryset.order_by('-invoice_created_at')
 
 
+class InsuranceInvoiceCursorPagination(OptInCursorPagination):
+    ordering = ('-invoice_created_at', '-id')
+
+
 class InvoicesByInsuranceId(APIView):
+    """
+    Invoices carrying items billed to an insurer, with insurer-specific totals.
+
+    Totals, balance and status are computed in the database in a single grouped
+    query. Pass ?status=pending|paid to filter and ?page_size= / ?cursor= for
+    keyset pagination; without them the full list is returned.
+    """
     permission_classes = (IsDoctorUser | IsNurseUser | IsLabTechUser | IsReceptionistUser,)
+    pagination_class = InsuranceInvoiceCursorPagination
+
+    def get_queryset(self, insurance_id):
+        insurance_items = Q(invoice_items__payment_mode__insurance_id=insurance_id)
+        money = DecimalField(max_digits=12, decimal_places=2)
+
+        queryset = Invoice.objects.filter(
+            Exists(InvoiceItem.objects.filter(
+                invoice=OuterRef('pk'), payment_mode__insurance_id=insurance_id
+            ))
+        ).select_related('patient').annotate(
+            insurance_total=Coalesce(
+                Sum('invoice_items__actual_total', filter=insurance_items), Value(Decimal('0')), output_field=money
+            ),
+            insurance_paid=Coalesce(
+                Sum('invoice_items__amount_allocated_insurance', filter=insurance_items), Value(Decimal('0')), output_field=money
+            ),
+        ).annotate(
+            insurance_balance=Greatest(
+                F('insurance_total') - F('insurance_paid'), Value(Decimal('0')), output_field=money
+            ),
+        ).annotate(
+            insurance_status=Case(
+                When(insurance_balance__lte=0, then=Value('paid')),
+                default=Value('pending'),
+                output_field=CharField(),
+            ),
+        )
+
+        status_filter = self.request.query_params.get('status')
+        if status_filter in ('pending', 'paid'):
+            queryset = queryset.filter(insurance_status=status_filter)
+
+        return queryset.order_by('-invoice_created_at', '-id')
+
+    def to_representation(self, inv):
+        return {
+            'id': inv.id,
+            'invoice_number': inv.invoice_number,
+            'invoice_date': inv.invoice_date,
+            'patient': {
+                'id': inv.patient_id,
+                'first_name': getattr(inv.patient, 'first_name', ''),
+                'second_name': getattr(inv.patient, 'second_name', ''),
+            } if inv.patient_id else None,
+            # Keep compatibility with existing frontend columns/calculations.
+            'invoice_amount': inv.insurance_total,
+            'cash_paid': inv.insurance_paid,
+            'status': inv.insurance_status,
+            # Explicit insurance-specific totals.
+            'insurance_total': inv.insurance_total,
+            'insurance_paid': inv.insurance_paid,
+            'insurance_balance': inv.insurance_balance,
+        }
 
     def get(self, request, insurance_id):
-        status_filter = request.query_params.get('status')
-
-        invoices = Invoice.objects.filter(
-            invoice_items__payment_mode__insurance_id=insurance_id
-        ).select_related('patient').prefetch_related(
-            'invoice_items__payment_mode'
-        ).distinct().order_by('-invoice_created_at')
-
-        result = []
-        for inv in invoices:
-            insurance_items = inv.invoice_items.filter(payment_mode__insurance_id=insurance_id)
-
-            insurance_total = Decimal('0')
-            insurance_paid = Decimal('0')
-
-            for item in insurance_items:
-                component_total = item.actual_total or Decimal('0')
-                applied = item.allocations.filter(
-                    receipt__insurance_id=insurance_id
-                ).aggregate(total=Sum('amount_applied'))['total'] or Decimal('0')
-
-                insurance_total += component_total
-                insurance_paid += applied
-
-            insurance_balance = insurance_total - insurance_paid
-            if insurance_balance < 0:
-                insurance_balance = Decimal('0')
-
-            insurance_status = 'paid' if insurance_balance <= 0 else 'pending'
-            if status_filter in ('pending', 'paid') and insurance_status != status_filter:
-                continue
-
-            result.append({
-                'id': inv.id,
-                'invoice_number': inv.invoice_number,
-                'invoice_date': inv.invoice_date,
-                'patient': {
-                    'id': inv.patient_id,
-                    'first_name': getattr(inv.patient, 'first_name', ''),
-                    'second_name': getattr(inv.patient, 'second_name', ''),
-                } if inv.patient_id else None,
-                # Keep compatibility with existing frontend columns/calculations.
-                'invoice_amount': insurance_total,
-                'cash_paid': insurance_paid,
-                'status': insurance_status,
-                # Explicit insurance-specific totals.
-                'insurance_total': insurance_total,
-                'insurance_paid': insurance_paid,
-                'insurance_balance': insurance_balance,
-            })
+        queryset = self.get_queryset(insurance_id)
 
-        return Response(result)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        if page is None:
+            return Response([self.to_representation(inv) for inv in queryset.iterator()])
+
+        return paginator.get_paginated_response([self.to_representation(inv) for inv in page])
 
 class InvoiceItemViewset(viewsets.ModelViewSet):
     queryset = InvoiceItem.objects.all().order_by('-id')
     serializer_class = InvoiceItemSerializer
+    cursor_ordering = ('-item_created_at', '-id')
     permission_classes = (IsDoctorUser | IsNurseUser | IsLabTechUser | IsReceptionistUser,)
 
     def partial_update(self, request, *args, **kwargs):
@@ -192,12 +261,14 @@ class PaymentModeViewset(viewsets.ModelViewSet):
 
 
 class MainAccountViewSet(viewsets.ModelViewSet):
-    queryset = MainAccount.objects.all().order_by('-id')
+    queryset = MainAccount.objects.prefetch_related(
+        'subaccounts__main_account', 'subaccounts__payment_mode'
+    ).order_by('-id')
     serializer_class = MainAccountSerializer
 
 
 class SubAccountViewSet(viewsets.ModelViewSet):
-    queryset = SubAccount.objects.all().order_by('-id')
+    queryset = SubAccount.objects.select_related('main_account', 'payment_mode').order_by('-id')
     serializer_class = SubAccountSerializer
 
 
@@ -265,6 +336,10 @@ class AllocatePaymentView(APIView):
       minus any previous allocations to that item.
     - Creates a PaymentReceipt and PaymentAllocation entries.
     - Updates Invoice.cash_paid totals accordingly.
+    - With dry_run=true, returns the planned allocation without writing anything.
+
+    Outstanding balances for all candidate items are read in one annotated
+    query and the split is computed in memory (see billing.allocation).
     """
 
     def post(self, request, *args, **kwargs):
@@ -279,6 +354,7 @@ class AllocatePaymentView(APIView):
         amount = data['amount']
         reference_number = data['reference_number']
         payment_date = data.get('payment_date')  # Optional field
+        dry_run = data.get('dry_run', False)
 
         # Resolve sub_account and its linked payment_mode
         try:
@@ -300,10 +376,24 @@ class AllocatePaymentView(APIView):
         else:
             return Response({"detail": "Either patient_id or insurance_id must be provided."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not invoices.exists():
+        matched_ids = list(invoices.values_list('id', flat=True))
+        if not matched_ids:
             return Response({"detail": "No invoices found for the selected customer/invoice selection."}, status=status.HTTP_400_BAD_REQUEST)
 
+        if dry_run:
+            plan = plan_payment_allocation(
+                Invoice.objects.filter(id__in=matched_ids), amount,
+                insurance_id=insurance_id,
+            )
+            return Response(serialize_allocation_plan(plan), status=status.HTTP_200_OK)
+
         with transaction.atomic():
+            # Lock the selected invoices so concurrent receipts against the
+            # same invoices are planned one after the other.
+            locked_invoices = list(
+                Invoice.objects.select_for_update().filter(id__in=matched_ids).order_by('id')
+            )
+
             receipt = PaymentReceipt.objects.create(
                 patient_id=patient_id,
                 insurance_id=insurance_id,
@@ -313,92 +403,11 @@ class AllocatePaymentView(APIView):
                 payment_date=payment_date,
             )
 
-            remaining = float(amount)
-            is_insurance_payment = bool(insurance_id)
-
-            # Fetch allocatable items across invoices, oldest first.
-            # Insurance payments only apply to items billed with that insurance.
-            items_qs = InvoiceItem.objects.filter(invoice__in=invoices)
-            if is_insurance_payment:
-                items_qs = items_qs.filter(payment_mode__insurance_id=insurance_id)
-
-            items = items_qs.select_related('payment_mode', 'invoice', 'item').order_by('item_created_at', 'id')
-
-            per_invoice_applied = {}
-
-            for it in items:
-                if remaining <= 0:
-                    break
-
-                # Determine payable component for this item based on who is paying.
-                if is_insurance_payment:
-                    # Insurance pays the insurance-covered component (actual_total).
-                    payable_component = float(it.actual_total or 0)
-                    already_applied = float(
-                        it.allocations.filter(receipt__insurance_id=insurance_id).aggregate(
-                            total=Sum('amount_applied')
-                        )['total'] or 0
-                    )
-                else:
-                    # Patient cash pays cash component:
-                    # - cash item -> actual_total
-                    # - insurance item -> co-pay = item_amount - actual_total
-                    if it.payment_mode and it.payment_mode.payment_category == 'insurance':
-                        payable_component = float((it.item_amount or 0) - (it.actual_total or 0))
-                    else:
-                        payable_component = float(it.actual_total or 0)
-
-                    already_applied = float(
-                        it.allocations.filter(
-                            receipt__patient_id=patient_id,
-                            receipt__insurance__isnull=True,
-                        ).aggregate(total=Sum('amount_applied'))['total'] or 0
-                    )
-
-                outstanding = max(0.0, payable_component - already_applied)
-
-                if outstanding <= 0:
-                    continue
-
-                apply_now = min(remaining, outstanding)
-                if apply_now > 0:
-                    PaymentAllocation.objects.create(
-                        receipt=receipt,
-                        invoice_item=it,
-                        amount_applied=apply_now,
-                    )
-                    remaining -= apply_now
-                    per_invoice_applied[it.invoice_id] = per_invoice_applied.get(it.invoice_id, 0.0) + apply_now
-
-            # Update invoices: cash_paid only for patient payments, status for all
-            for inv in invoices:
-                applied = per_invoice_applied.get(inv.id, 0.0)
-
-                # Fallback only for patient cash receipts when no allocatable items exist.
-                # For insurance receipts, allocation must remain tied to insurance items.
-                if not is_insurance_payment and applied <= 0 and remaining > 0:
-                    outstanding_cash = float(max(Decimal('0'), (inv.total_cash or Decimal('0')) - (inv.cash_paid or Decimal('0'))))
-                    if outstanding_cash > 0:
-                        invoice_level_apply = min(remaining, outstanding_cash)
-                        if invoice_level_apply > 0:
-                            applied = invoice_level_apply
-                            remaining -= invoice_level_apply
-
-                if applied > 0:
-                    update_fields = ['status', 'invoice_updated_at']
-
-                    # Only increment cash_paid for patient/cash payments
-                    if not is_insurance_payment:
-                        inv.cash_paid = (inv.cash_paid or Decimal('0')) + Decimal(str(applied))
-                        update_fields.append('cash_paid')
-
-                    # Determine status from total allocations across all items
-                    total_allocated = inv.invoice_items.aggregate(
-                        total=Sum('allocations__amount_applied')
-                    )['total'] or Decimal('0')
-                    inv.status = 'paid' if total_allocated >= (inv.invoice_amount or Decimal('0')) else 'pending'
-
-                    inv.save(update_fields=update_fields)
+            plan = plan_payment_allocation(
+                locked_invoices, amount,
+                insurance_id=insurance_id,
+            )
+            apply_payment_allocation(receipt, plan, is_insurance_payment=bool(insurance_id))
 
             ser = PaymentReceiptSerializer(receipt)
             return Response(ser.data, status=status.HTTP_201_CREATED)
@@ -408,7 +417,7 @@ def download_payment_receipt_pdf(request, receipt_id):
     receipt = get_object_or_404(PaymentReceipt, pk=receipt_id)
     company = Company.objects.first()
 
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company and company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
 
     allocations = receipt.allocations.select_related('invoice_item__invoice', 'invoice_item__item').all()
     # Group by invoice for display
@@ -427,10 +436,9 @@ def download_payment_receipt_pdf(request, receipt_id):
         'invoice_numbers': invoice_numbers,
     })
 
-    pdf_file = HTML(string=html_template).write_pdf()
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="payment_receipt_{receipt.id}.pdf"'
-    return response
+    return pdf_response(
+        request, f'payment_receipt_{receipt.id}', html_template, f'payment_receipt_{receipt.id}.pdf'
+    )
 
 def download_invoice_pdf(request, invoice_id):
     '''
@@ -444,7 +452,7 @@ def download_invoice_pdf(request, invoice_id):
     insurance_items = invoice_items.filter(payment_mode__payment_category="insurance")
     insurance_names_str = ", ".join(insurance_items.values_list('payment_mode__payment_mode', flat=True).distinct())
 
-    company_logo_url = request.build_absolute_uri(company.logo.url) if (company and getattr(company, 'logo', None)) else None
+    company_logo_url = get_company_logo_data_uri(company)
 
     for item in invoice_items:
         regular_sale_price = item.sale_price  
@@ -492,17 +500,20 @@ def download_invoice_pdf(request, invoice_id):
         'balance': balance
     })
 
-    pdf_file = HTML(string=html_template).write_pdf()
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    # Hint browser to render inline in a new tab
-    response['Content-Disposition'] = f'inline; filename="invoice_report_{invoice_id}.pdf"'
-
-    return response
+    # Rendered inline so the browser opens it in a new tab
+    return pdf_response(
+        request, f'invoice_report_{invoice_id}', html_template, f'invoice_report_{invoice_id}.pdf'
+    )
 class AccountingSummaryView(APIView):
     """
     API View to summarize accounting data based on:
     - Payments received from patients/insurers
     - Payments made to suppliers
+
+    Totals are summed from the daily AccountBalanceSnapshot rows. The
+    individual transactions are served, paginated, by
+    AccountingTransactionsView; pass ?include_transactions=true to embed
+    them all here instead.
     """
     permission_classes = (IsDoctorUser | IsNurseUser | IsLabTechUser | IsReceptionistUser,)
 
@@ -510,171 +521,49 @@ class AccountingSummaryView(APIView):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
 
-        # Payments received allocations
-        received_qs = PaymentAllocation.objects.select_related(
-            'receipt__patient',
-            'receipt__insurance',
-            'receipt__sub_account__main_account',
-            'receipt__sub_account__payment_mode',
-            'receipt__payment_mode',
-            'invoice_item__invoice',
-        )
+        totals, sub_account_totals = get_account_totals(start_date, end_date)
+        data = {
+            'totals': totals,
+            'sub_account_totals': sub_account_totals,
+        }
 
-        # Payments made to suppliers allocations
-        from inventory.models import SupplierPaymentAllocation
-        supplier_paid_qs = SupplierPaymentAllocation.objects.select_related(
-            'receipt__supplier',
-            'receipt__payment_mode',
-            'receipt__sub_account__main_account',
-            'supplier_invoice',
-        )
+        if request.query_params.get('include_transactions', '').lower() == 'true':
+            data['transactions'] = [
+                to_transaction_row(row) for row in get_transactions(start_date, end_date)
+            ]
 
-        if start_date:
-            received_qs = received_qs.filter(
-                Q(receipt__payment_date__gte=start_date) |
-                Q(receipt__payment_date__isnull=True, receipt__created_at__date__gte=start_date)
-            )
-            supplier_paid_qs = supplier_paid_qs.filter(
-                Q(receipt__payment_date__gte=start_date) |
-                Q(receipt__payment_date__isnull=True, receipt__created_at__date__gte=start_date)
-            )
-        if end_date:
-            received_qs = received_qs.filter(
-                Q(receipt__payment_date__lte=end_date) |
-                Q(receipt__payment_date__isnull=True, receipt__created_at__date__lte=end_date)
-            )
-            supplier_paid_qs = supplier_paid_qs.filter(
-                Q(receipt__payment_date__lte=end_date) |
-                Q(receipt__payment_date__isnull=True, receipt__created_at__date__lte=end_date)
-            )
-            
-        # 1. Drill-down view: Individual transactions
-        transactions = []
-        for alloc in received_qs:
-            # Prefer configured main account tag from payment mode, fallback to mode name.
-            source_name = 'Main Account'
-            sub_acct = getattr(alloc.receipt, 'sub_account', None)
-            pay_mode = getattr(alloc.receipt, 'payment_mode', None)
-            if sub_acct and sub_acct.main_account:
-                source_name = sub_acct.main_account.name
-            elif pay_mode and pay_mode.payment_mode:
-                source_name = pay_mode.payment_mode
-
-            customer_name = "Unknown"
-            if alloc.receipt and alloc.receipt.patient:
-                customer_name = f"{alloc.receipt.patient.first_name} {alloc.receipt.patient.second_name}"
-            elif alloc.receipt and alloc.receipt.insurance:
-                customer_name = alloc.receipt.insurance.name
-
-            tx_date = alloc.receipt.payment_date or alloc.receipt.created_at.date()
-            invoice_number = alloc.invoice_item.invoice.invoice_number if alloc.invoice_item and alloc.invoice_item.invoice else "N/A"
-                
-            transactions.append({
-                'id': alloc.id,
-                'date': tx_date,
-                'invoice_number': invoice_number,
-                'customer': customer_name,
-                'tag': source_name,
-                'sub_account': sub_acct.name if sub_acct else (pay_mode.payment_mode if pay_mode else source_name),
-                'action': 'Received',
-                'amount': alloc.amount_applied,
-            })
+        return Response(data)
 
-        for alloc in supplier_paid_qs:
-            # Use the sub_account directly from the receipt (this is the account the payment was made from)
-            source_name = 'Main Account'
-            sub_acct = getattr(alloc.receipt, 'sub_account', None)
-            pay_mode = getattr(alloc.receipt, 'payment_mode', None)
-            if sub_acct and sub_acct.main_account:
-                source_name = sub_acct.main_account.name
-            elif pay_mode and pay_mode.payment_mode:
-                source_name = pay_mode.payment_mode
-
-            supplier_name = "Unknown Supplier"
-            if alloc.receipt and alloc.receipt.supplier:
-                supplier_name = alloc.receipt.supplier.official_name or alloc.receipt.supplier.common_name
-
-            tx_date = alloc.receipt.payment_date or alloc.receipt.created_at.date()
-            invoice_number = alloc.supplier_invoice.invoice_no if alloc.supplier_invoice else "N/A"
-
-            transactions.append({
-                'id': f"sp-{alloc.id}",
-                'date': tx_date,
-                'invoice_number': invoice_number,
-                'customer': supplier_name,
-                'tag': source_name,
-                'sub_account': sub_acct.name if sub_acct else (pay_mode.payment_mode if pay_mode else source_name),
-                'action': 'Paid to Supplier',
-                'amount': alloc.amount_applied,
-            })
 
-        # Latest first for readability
-        transactions = sorted(transactions, key=lambda x: x['date'], reverse=True)
-            
-        # 2a. Sub-Account Aggregation: per (main_account, sub_account)
-        sub_account_totals_dict = {}
-        for trans in transactions:
-            key = (trans['tag'], trans.get('sub_account', trans['tag']))
-            if key not in sub_account_totals_dict:
-                sub_account_totals_dict[key] = {
-                    'main_account': trans['tag'],
-                    'sub_account': trans.get('sub_account', trans['tag']),
-                    'total_debited': 0,
-                    'total_credited': 0,
-                    'net_balance': 0,
-                }
-            amount = float(trans['amount'])
-            if trans['action'] == 'Received':
-                sub_account_totals_dict[key]['total_debited'] += amount
-                sub_account_totals_dict[key]['net_balance'] += amount
-            else:
-                sub_account_totals_dict[key]['total_credited'] += amount
-                sub_account_totals_dict[key]['net_balance'] -= amount
+class AccountingTransactionPagination(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = 500
 
-        sub_account_totals = sorted(
-            sub_account_totals_dict.values(),
-            key=lambda x: (x['main_account'], x['sub_account'])
-        )
 
-        # 2b. Bird's Eye View: Departmental Aggregation
-        totals_dict = {}
-        for trans in transactions:
-            tag = trans['tag']
-            if tag not in totals_dict:
-                totals_dict[tag] = {
-                    'tag': tag,
-                    'total_debited': 0,
-                    'total_credited': 0,
-                    'net_balance': 0
-                }
-            
-            amount = float(trans['amount'])
-            if trans['action'] == 'Received':
-                totals_dict[tag]['total_debited'] += amount
-                totals_dict[tag]['net_balance'] += amount
-            else:
-                totals_dict[tag]['total_credited'] += amount
-                totals_dict[tag]['net_balance'] -= amount
-            
-        # Convert dictionary to list
-        totals = list(totals_dict.values())
-        
-        # Calculate Grand Totals
-        grand_total = sum(t['net_balance'] for t in totals)
-        if totals:
-            totals.append({
-                'tag': 'TOTAL',
-                'total_debited': sum(t['total_debited'] for t in totals),
-                'total_credited': sum(t['total_credited'] for t in totals),
-                'net_balance': grand_total,
-                'is_summary': True
-            })
+class AccountingTransactionsView(APIView):
+    """
+    Paginated drill-down of the transactions behind the accounting summary.
 
-        return Response({
-            'totals': totals,
-            'sub_account_totals': list(sub_account_totals),
-            'transactions': transactions
-        })
+    Query params:
+    - start_date, end_date: date filters
+    - filter_main: main account name
+    - filter_sub: sub account name
+    - limit, offset: pagination
+    """
+    permission_classes = (IsDoctorUser | IsNurseUser | IsLabTechUser | IsReceptionistUser,)
+    pagination_class = AccountingTransactionPagination
+
+    def get(self, request):
+        transactions = get_transactions(
+            start_date=request.query_params.get('start_date'),
+            end_date=request.query_params.get('end_date'),
+            main_account=request.query_params.get('filter_main'),
+            sub_account=request.query_params.get('filter_sub'),
+        )
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(transactions, request, view=self)
+        return paginator.get_paginated_response([to_transaction_row(row) for row in page])
 
 
 def download_accounting_summary_pdf(request):
@@ -695,26 +584,7 @@ def download_accounting_summary_pdf(request):
     filter_main = request.GET.get('filter_main')
     filter_sub = request.GET.get('filter_sub')
 
-    # Re-use the AccountingSummaryView logic via an internal call
-    # Build a fake request with the same query params
-    from django.test import RequestFactory
-    factory = RequestFactory()
-    fake_request = factory.get('/billing/accounting-summary/', {
-        k: v for k, v in {
-            'start_date': start_date,
-            'end_date': end_date,
-        }.items() if v
-    })
-    fake_request.user = request.user
-
-    view = AccountingSummaryView()
-    view.request = fake_request
-    response = view.get(fake_request)
-    data = response.data
-
-    # Sub-account summary rows
-    sub_account_totals = data.get('sub_account_totals', [])
-    transactions = data.get('transactions', [])
+    _, sub_account_totals = get_account_totals(start_date, end_date)
 
     # Merge sub-account totals with balance from SubAccount model
     sub_accounts_qs = SubAccount.objects.select_related('main_account').all()
@@ -788,14 +658,16 @@ def download_accounting_summary_pdf(request):
     filter_label = None
     if filter_main and filter_sub:
         filter_label = f"{filter_main} › {filter_sub}"
-        transactions = [t for t in transactions if t['tag'] == filter_main and t.get('sub_account') == filter_sub]
     elif filter_main:
         filter_label = filter_main
-        transactions = [t for t in transactions if t['tag'] == filter_main]
+        filter_sub = None
 
-    # Convert amounts to Decimal for the money template filter
-    for tx in transactions:
-        tx['amount'] = Decimal(str(tx.get('amount', 0)))
+    transactions = []
+    if report_type != 'summary':
+        transactions = [
+            to_transaction_row(row)
+            for row in get_transactions(start_date, end_date, filter_main, filter_sub)
+        ]
 
     transactions_total = sum(tx['amount'] for tx in transactions)
 
@@ -816,11 +688,7 @@ def download_accounting_summary_pdf(request):
     }
 
     company = Company.objects.first()
-    company_logo_url = (
-        request.build_absolute_uri(company.logo.url)
-        if company and getattr(company, 'logo', None) and company.logo
-        else None
-    )
+    company_logo_url = get_company_logo_data_uri(company)
 
     html_template = get_template('accounting_summary.html').render({
         'company': company,
@@ -836,7 +704,4 @@ def download_accounting_summary_pdf(request):
         'filter_label': filter_label,
     })
 
-    pdf_file = HTML(string=html_template).write_pdf()
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="accounting_summary.pdf"'
-    return response
+    return pdf_response(request, 'accounting_summary', html_template, 'accounting_summary.pdf')
@@ -70,4 +70,22 @@ class InsuranceCompany(models.Model):
         super().delete(*args, **kwargs)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class NumberSequence(models.Model):
+    '''
+    Counter behind a family of document numbers (invoices, samples, patient
+    IDs, ...), one row per name and period, e.g. ('invoice', '2026').
+    Only ever advanced through company.sequences.next_number().
+    '''
+    name = models.CharField(max_length=100)
+    period = models.CharField(max_length=20, blank=True, default='')
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'period'], name='unique_number_sequence'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} {self.period} - {self.last_value}"
@@ -0,0 +1,138 @@
+'''
+Shared number generator for invoices, samples, patient IDs, requisitions,
+purchase orders and lab test codes.
+
+Each (name, period) pair has a NumberSequence counter row that is advanced
+with a single UPDATE ... RETURNING, so concurrent writers never read the
+latest document, never collide and only hold the row lock until their
+transaction ends.
+
+The first call for a pair creates its row with one INSERT ... ON CONFLICT,
+starting from `seed()` - the last number already used by existing documents -
+so numbering carries on from data written before the counters existed.
+
+With block_size > 1 a worker reserves that many numbers in one UPDATE and
+hands them out from memory. Numbers from a block are not in creation order
+across workers and a restarted worker leaves a gap, so keep it to codes
+where only uniqueness matters.
+'''
+import threading
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def _increment(name, period, step, using):
+    '''Advance the counter by `step` and return its new value, or None if there is no row yet.'''
+    NumberSequence = apps.get_model('company', 'NumberSequence')
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {qn(NumberSequence._meta.db_table)} '
+            f'SET {qn("last_value")} = {qn("last_value")} + %s '
+            f'WHERE {qn("name")} = %s AND {qn("period")} = %s '
+            f'RETURNING {qn("last_value")}',
+            [step, name, period],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _create(name, period, step, seed, using):
+    '''
+    Create the counter at seed() + `step` and return its value. If another
+    writer created it in the meantime the INSERT turns into the same
+    increment as _increment(), so this is one statement either way.
+    '''
+    NumberSequence = apps.get_model('company', 'NumberSequence')
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(NumberSequence._meta.db_table)
+    start = ((seed() if seed else 0) or 0) + step
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({qn("name")}, {qn("period")}, {qn("last_value")}) VALUES (%s, %s, %s) '
+            f'ON CONFLICT ({qn("name")}, {qn("period")}) '
+            f'DO UPDATE SET {qn("last_value")} = {table}.{qn("last_value")} + %s '
+            f'RETURNING {qn("last_value")}',
+            [name, period, start, step],
+        )
+        return cursor.fetchone()[0]
+
+
+def _take_from_block(key):
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if block and block[0] <= block[1]:
+            value = block[0]
+            block[0] += 1
+            return value
+    return None
+
+
+def _reserve(name, period, count, seed, using):
+    '''Reserve `count` consecutive numbers and return the (first, last) pair.'''
+    last = _increment(name, period, count, using)
+    if last is None:
+        last = _create(name, period, count, seed, using)
+    return last - count + 1, last
+
+
+def next_number(name, period='', seed=None, block_size=1, using=DEFAULT_DB_ALIAS):
+    '''
+    Next number of the (name, period) sequence, starting at 1 (or seed() + 1).
+
+    period scopes the counter, e.g. the year for numbers that restart every
+    year. seed is a callable returning the last number already in use; it is
+    only called when the counter row is created.
+    '''
+    period = str(period)
+    key = (using, name, period)
+    if block_size > 1:
+        value = _take_from_block(key)
+        if value is not None:
+            return value
+
+    first, last = _reserve(name, period, block_size, seed, using)
+    if block_size > 1:
+        # Only keep the rest of the block once the UPDATE that reserved it is
+        # committed; after a rollback those numbers are handed out again.
+        def keep_block():
+            with _blocks_lock:
+                _blocks[key] = [first + 1, last]
+        transaction.on_commit(keep_block, using=using)
+    return first
+
+
+def next_numbers(name, count, period='', seed=None, using=DEFAULT_DB_ALIAS):
+    '''
+    `count` consecutive numbers of the (name, period) sequence as a range,
+    reserved with a single UPDATE. Used when creating documents in bulk.
+    '''
+    if count < 1:
+        return range(0)
+    first, last = _reserve(name, str(period), count, seed, using)
+    return range(first, last + 1)
+
+
+def max_suffix(values, prefix='', suffix=''):
+    '''
+    Largest integer found between `prefix` and `suffix` in `values`, for
+    seeding a sequence from existing document numbers. Unparseable values are
+    skipped.
+    '''
+    highest = 0
+    for value in values:
+        if not value or not value.startswith(prefix) or not value.endswith(suffix):
+            continue
+        number = value[len(prefix):len(value) - len(suffix)] if suffix else value[len(prefix):]
+        try:
+            highest = max(highest, int(number))
+        except ValueError:
+            continue
+    return highest
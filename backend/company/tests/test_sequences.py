@@ -0,0 +1,54 @@
+import pytest
+
+from billing.models import Invoice
+from company import sequences
+from company.models import NumberSequence
+from company.sequences import max_suffix, next_number
+from django.utils import timezone
+
+
+@pytest.fixture(autouse=True)
+def clear_blocks():
+    sequences._blocks.clear()
+    yield
+    sequences._blocks.clear()
+
+
+@pytest.mark.django_db
+def test_next_number_counts_per_name_and_period():
+    assert [next_number('invoice', 2025) for _ in range(3)] == [1, 2, 3]
+    assert next_number('invoice', 2026) == 1
+    assert next_number('patient_sample', 2025) == 1
+    assert NumberSequence.objects.get(name='invoice', period='2025').last_value == 3
+
+
+@pytest.mark.django_db
+def test_next_number_starts_after_seed():
+    assert next_number('purchase_order', seed=lambda: 41) == 42
+    # The seed is only read when the counter is created
+    assert next_number('purchase_order', seed=lambda: 1000) == 43
+
+
+@pytest.mark.django_db
+def test_block_allocation_reserves_numbers_once(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        first = next_number('lab_test_code', block_size=5)
+    rest = [next_number('lab_test_code', block_size=5) for _ in range(4)]
+
+    assert [first] + rest == [1, 2, 3, 4, 5]
+    assert NumberSequence.objects.get(name='lab_test_code').last_value == 5
+
+
+def test_max_suffix_skips_other_formats():
+    values = ['DDLI00007-2026', 'DDLI00012-2026', 'DDLIxx-2026', 'OTHER-2026', None]
+    assert max_suffix(values, 'DDLI', '-2026') == 12
+
+
+@pytest.mark.django_db
+def test_invoice_numbers_continue_from_existing_invoices(patient):
+    year = timezone.now().year
+    Invoice.objects.create(patient=patient, invoice_number=f'DDLI00041-{year}')
+
+    invoice = Invoice.objects.create(patient=patient)
+
+    assert invoice.invoice_number == f'DDLI00042-{year}'
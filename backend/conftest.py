@@ -2,6 +2,7 @@ import pytest
 from datetime import date
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -40,6 +41,13 @@ from inpatient.models import (
 
 User = get_user_model()
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Ids are reused between tests, so cached stock figures must not leak
+    cache.clear()
+    yield
+    cache.clear()
+
 @pytest.fixture
 def user():
     return User.objects.create_user(
@@ -0,0 +1,71 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import models
+from rest_framework.pagination import CursorPagination
+
+
+CREATED_FIELD_NAMES = ('created_at', 'date_created', 'created_on')
+
+
+@lru_cache(maxsize=None)
+def get_created_field(model):
+    '''
+    Name of `model`'s non-null creation timestamp: a field called
+    created_at, date_created or created_on, else the first auto_now_add
+    DateTimeField. None if it has neither.
+    '''
+    fields = [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.DateTimeField) and not field.null
+    ]
+    for name in CREATED_FIELD_NAMES:
+        for field in fields:
+            if field.name == name:
+                return name
+    for field in fields:
+        if field.auto_now_add:
+            return field.name
+    return None
+
+
+def get_default_ordering(model):
+    '''Newest first on (creation timestamp, id), or on id alone.'''
+    created_field = get_created_field(model)
+    return (f'-{created_field}', '-id') if created_field else '-id'
+
+
+class OptInCursorPagination(CursorPagination):
+    '''
+    Keyset (cursor) pagination, the default for every DRF list endpoint.
+
+    While settings.EASYMED_LEGACY_UNPAGINATED is on (the default) it only
+    kicks in when the client asks for it with `?cursor=` or `?page_size=`;
+    without either parameter the view returns the full, unpaginated list so
+    existing frontend calls keep working. Turn the flag off to page every
+    list.
+
+    Ordering is newest first on the model's creation timestamp and id, e.g.
+    ('-date_created', '-id'), or `-id` for models without one (see
+    get_default_ordering()). Views can set `cursor_ordering` to another
+    stable ordering.
+    '''
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def is_requested(self, request):
+        return (
+            not getattr(settings, 'EASYMED_LEGACY_UNPAGINATED', True)
+            or self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = getattr(view, 'cursor_ordering', None) or get_default_ordering(queryset.model)
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
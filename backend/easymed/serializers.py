@@ -0,0 +1,41 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsetMixin:
+    '''
+    Lets GET clients ask for a subset of a serializer's fields with
+    `?fields=id,name,...`. Unrequested fields are dropped before
+    serialization, so their SerializerMethodFields and nested serializers
+    never run. Only the serializer the view returns is trimmed, never the
+    ones nested inside it. Without the parameter every field is returned.
+
+    Serializers whose to_representation() adds keys of its own must guard
+    them with is_field_requested().
+    '''
+    fields_query_param = 'fields'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.get_requested_fields()
+        if not requested:
+            return fields
+        return {name: field for name, field in fields.items() if name in requested}
+
+    def is_field_requested(self, name):
+        requested = self.get_requested_fields()
+        return not requested or name in requested
+
+    def get_requested_fields(self):
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None
+
+        value = request.query_params.get(self.fields_query_param, '')
+        return {name.strip() for name in value.split(',') if name.strip()}
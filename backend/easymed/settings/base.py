@@ -146,6 +146,11 @@ EASYMED_CURRENCY_CODE = config('CURRENCY_CODE', default='KES')
 EASYMED_CURRENCY_SYMBOL = config('CURRENCY_SYMBOL', default='')
 EASYMED_CURRENCY_FRACTION_DIGITS = config('CURRENCY_FRACTION_DIGITS', default=2, cast=int)
 
+# Rendered PDFs, keyed by document and a hash of their HTML (see reports/pdf.py)
+PDF_CACHE_DIR = config('PDF_CACHE_DIR', default=str(BASE_DIR / 'pdf_cache'))
+# Seconds before cached PDFs and generated report artifacts are purged
+PDF_REPORT_TTL = config('PDF_REPORT_TTL', default=60 * 60 * 24, cast=int)
+
 
 
 STATIC_URL = '/static/'
@@ -182,8 +187,14 @@ REST_FRAMEWORK = {
     ],
     
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # Keyset pagination on every list endpoint, see easymed/pagination.py
+    "DEFAULT_PAGINATION_CLASS": "easymed.pagination.OptInCursorPagination",
 }
 
+# While True, list endpoints stay unpaginated unless the client sends ?cursor=
+# or ?page_size=, which is what the current frontend expects.
+EASYMED_LEGACY_UNPAGINATED = config('LEGACY_UNPAGINATED', default=True, cast=bool)
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -263,6 +274,24 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Read-through cache for stock levels (inventory.summary). Shared through
+# Redis when CACHE_URL is set (e.g. redis://redis:6379/1), otherwise kept
+# per process.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
 
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
@@ -280,6 +309,14 @@ CELERY_BEAT_SCHEDULE = {
         "task": "inpatient.tasks.check_medication_notifications",
         'schedule': crontab(minute='*/60'),
     },
+    "purge-expired-pdfs": {
+        "task": "reports.tasks.purge_expired_pdfs_task",
+        'schedule': crontab(minute=0),
+    },
+    "deduct-test-kits": {
+        "task": "laboratory.tasks.deduct_test_kits",
+        'schedule': crontab(minute='*/15'),
+    },
 }
 
 
@@ -1,4 +1,5 @@
 import logging
+import tempfile
 
 from .base import *
 
@@ -12,6 +13,10 @@ DEFAULT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
 
 DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
 
+PDF_CACHE_DIR = tempfile.mkdtemp(prefix='easymed-pdf-cache-')
+
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 
 CELERY_TASK_ALWAYS_EAGER = True  # Execute tasks immediately in tests
 CELERY_TASK_EAGER_PROPAGATES = True  # Raise exceptions immediately in tests
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from easymed.serializers import SparseFieldsetMixin
 from django.core.exceptions import ObjectDoesNotExist
 
 
@@ -13,7 +14,7 @@ from .celery_tasks import set_bed_status_occupied
 User = get_user_model()
 
 
-class PatientAdmissionSerializer(serializers.ModelSerializer):
+class PatientAdmissionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     ward = serializers.PrimaryKeyRelatedField(queryset=Ward.objects.all(), required=False, allow_null=True)
     bed = serializers.PrimaryKeyRelatedField(queryset=Bed.objects.all(), required=False, allow_null=True)
     attendance_process = serializers.PrimaryKeyRelatedField(queryset=AttendanceProcess.objects.all(), required=False, allow_null=True)
@@ -51,9 +52,12 @@ class PatientAdmissionSerializer(serializers.ModelSerializer):
         # Only add extra fields if instance is a model (not an OrderedDict)
         from django.db.models import Model
         if isinstance(instance, Model):
-            data["ward"] = getattr(instance.ward, "name", None)
-            data["bed"] = getattr(instance.bed, "bed_number", None)
-            data["bed_status"] = getattr(instance.bed, "status", None)
+            if self.is_field_requested("ward"):
+                data["ward"] = getattr(instance.ward, "name", None)
+            if self.is_field_requested("bed"):
+                data["bed"] = getattr(instance.bed, "bed_number", None)
+            if self.is_field_requested("bed_status"):
+                data["bed_status"] = getattr(instance.bed, "status", None)
         return data
 
 
@@ -126,7 +130,7 @@ class InPatientTriageSerializer(serializers.ModelSerializer):
         return None
 
 
-class BedSerializer(serializers.ModelSerializer):
+class BedSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     ward = serializers.SerializerMethodField()
     current_occupant = serializers.SerializerMethodField()
 
@@ -245,7 +249,7 @@ class WardNurseAssignmentSerializer(serializers.ModelSerializer):
         data["assigned_by"] = instance.assigned_by.get_fullname()
         return data
 
-class WardSerializer(serializers.ModelSerializer):
+class WardSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     admissions = serializers.SerializerMethodField()
     nurse_assignments = WardNurseAssignmentSerializer(many=True, read_only=True)
     class Meta:
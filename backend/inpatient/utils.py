@@ -1,7 +1,7 @@
 from io import BytesIO
 from django.http import HttpResponse
 from django.template.loader import render_to_string, get_template
-from weasyprint import HTML
+from reports.pdf import get_company_logo_data_uri, write_pdf
 from .models import PatientAdmission, PatientDischarge
 from company.models import Company
 from laboratory.models import LabTestRequest, PatientSample
@@ -58,7 +58,7 @@ def generate_discharge_summary_pdf(admission_id, request):
             'recorded_at': last_triage.date_created
         }
 
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company and company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
 
     context = {
         'company': {
@@ -102,8 +102,7 @@ def generate_discharge_summary_pdf(admission_id, request):
         }
 
     html_string = render_to_string('discharge_summary.html', context)
-    html = HTML(string=html_string)
     pdf_file = BytesIO()
-    html.write_pdf(pdf_file)
+    write_pdf(html_string, target=pdf_file)
     pdf_file.seek(0)
     return pdf_file, None
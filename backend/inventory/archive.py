@@ -0,0 +1,104 @@
+'''
+Set-based archival of empty Inventory lots into InventoryArchive.
+
+Each batch locks up to `batch_size` zero-quantity lots (skipping lots locked
+by a sale), copies them with one INSERT ... SELECT, removes them with one
+DELETE ... RETURNING and refreshes the ItemStockSummary rows of the items
+returned. Batches run until nothing is left or the time budget is spent;
+the rest is picked up by the next run.
+
+Rows archived and batch latency are exported as Prometheus metrics.
+'''
+import logging
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from prometheus_client import Counter, Histogram
+
+from .models import DepartmentInventory, Inventory, InventoryArchive, ItemStockSummary
+from .summary import refresh_stock_summaries
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_LOTS = Counter(
+    'easymed_inventory_lots_archived_total',
+    'Zero-quantity Inventory lots moved to InventoryArchive',
+)
+BATCH_SECONDS = Histogram(
+    'easymed_inventory_archive_batch_seconds',
+    'Duration of one Inventory archival batch',
+)
+
+
+def _archive_columns():
+    '''(archive column, inventory column) pairs of the fields both tables share.'''
+    inventory_fields = {field.name: field for field in Inventory._meta.concrete_fields}
+    return [
+        (field.column, inventory_fields[field.name].column)
+        for field in InventoryArchive._meta.concrete_fields
+        if not field.primary_key and field.name in inventory_fields
+    ]
+
+
+def archive_batch(batch_size=500, using=DEFAULT_DB_ALIAS):
+    '''Archive up to `batch_size` empty lots; returns the number archived.'''
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    columns = _archive_columns()
+
+    with transaction.atomic(using=using):
+        lot_ids = list(
+            Inventory.objects.using(using).select_for_update(skip_locked=True)
+            .filter(quantity_at_hand=0).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not lot_ids:
+            return 0
+
+        # Rows the database would otherwise refuse to orphan
+        ItemStockSummary.objects.using(using).filter(current_lot_id__in=lot_ids).update(current_lot=None)
+        DepartmentInventory.objects.using(using).filter(main_inventory_id__in=lot_ids).update(main_inventory=None)
+
+        placeholders = ', '.join(['%s'] * len(lot_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(InventoryArchive._meta.db_table)} '
+                f'({", ".join(qn(target) for target, _ in columns)}) '
+                f'SELECT {", ".join(qn(source) for _, source in columns)} '
+                f'FROM {qn(Inventory._meta.db_table)} WHERE {qn(Inventory._meta.pk.column)} IN ({placeholders})',
+                lot_ids,
+            )
+            cursor.execute(
+                f'DELETE FROM {qn(Inventory._meta.db_table)} WHERE {qn(Inventory._meta.pk.column)} IN ({placeholders}) '
+                f'RETURNING {qn(Inventory._meta.get_field("item").column)}',
+                lot_ids,
+            )
+            item_ids = {row[0] for row in cursor.fetchall()}
+
+        refresh_stock_summaries(item_ids, using=using)
+
+    return len(lot_ids)
+
+
+def archive_empty_lots(batch_size=500, time_budget=30, using=DEFAULT_DB_ALIAS):
+    '''
+    Archive empty lots batch by batch until none are left or `time_budget`
+    seconds have passed. Returns the number of lots archived.
+    '''
+    started = time.monotonic()
+    archived = 0
+    while True:
+        batch_started = time.monotonic()
+        count = archive_batch(batch_size=batch_size, using=using)
+        elapsed = time.monotonic() - batch_started
+        if not count:
+            break
+
+        BATCH_SECONDS.observe(elapsed)
+        ARCHIVED_LOTS.inc(count)
+        archived += count
+        logger.info("Archived %d empty inventory lots in %.3fs", count, elapsed)
+
+        if count < batch_size or time.monotonic() - started >= time_budget:
+            break
+    return archived
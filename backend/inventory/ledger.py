@@ -0,0 +1,92 @@
+'''
+StockMovement journal writers and the analytics that read it.
+
+Every change to a lot's quantity_at_hand is journalled:
+
+- receipts, adjustments and deletes go through Inventory.save()/delete();
+  the receivers in inventory.signals call record_lot_change(), which
+  derives the movement from the lot's last balance_after. Code saving a lot
+  for a known reason sets `lot._stock_movement_kind` first (receipts do).
+- dispenses and transfers update lots with QuerySet.update() in
+  inventory.stock and write their movements with one bulk_create().
+
+quantity_at_hand stays the current balance, moved incrementally in the same
+transaction as the journal row, so reads never sum the journal. The
+analytics below are range scans over the (kind, created_at) and
+(item, kind, created_at) indexes.
+'''
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import StockMovement
+
+
+def build_movement(kind, lot, quantity, balance_after, created_at=None):
+    return StockMovement(
+        kind=kind,
+        item_id=lot.item_id,
+        department_id=lot.department_id,
+        lot_id=lot.pk,
+        quantity=quantity,
+        balance_after=balance_after,
+        created_at=created_at or timezone.now(),
+    )
+
+
+def record_movements(movements, using=DEFAULT_DB_ALIAS):
+    movements = [movement for movement in movements if movement.quantity]
+    if movements:
+        StockMovement.objects.using(using).bulk_create(movements, batch_size=1000)
+    return movements
+
+
+def last_balance(lot_id, using=DEFAULT_DB_ALIAS):
+    '''The lot's balance as last journalled, 0 if it has no movements.'''
+    return StockMovement.objects.using(using).filter(lot_id=lot_id).order_by('-id').values_list(
+        'balance_after', flat=True
+    ).first() or 0
+
+
+def record_lot_change(lot, kind=StockMovement.ADJUSTMENT, deleted=False, using=DEFAULT_DB_ALIAS):
+    '''Journal the difference between the lot's quantity and its last journalled balance.'''
+    balance = 0 if deleted else lot.quantity_at_hand
+    quantity = balance - last_balance(lot.pk, using=using)
+    return record_movements([build_movement(kind, lot, quantity, balance)], using=using)
+
+
+def lot_balances(lot_ids, using=DEFAULT_DB_ALIAS):
+    '''{lot_id: sum of its movements}; matches quantity_at_hand for a consistent journal.'''
+    return dict(
+        StockMovement.objects.using(using).filter(lot_id__in=lot_ids)
+        .values('lot_id').annotate(balance=Sum('quantity')).values_list('lot_id', 'balance')
+    )
+
+
+def last_dispensed_at():
+    '''Subquery for Inventory rows: when the lot was last dispensed from.'''
+    return Subquery(
+        StockMovement.objects.filter(lot_id=OuterRef('pk'), kind=StockMovement.DISPENSE)
+        .order_by('-id').values('created_at')[:1]
+    )
+
+
+def consumption_rates(days=30, item_ids=None):
+    '''
+    {item_id: {'dispensed', 'daily_rate', 'last_dispensed_at'}} over the
+    last `days` days.
+    '''
+    since = timezone.now() - timedelta(days=days)
+    movements = StockMovement.objects.filter(kind=StockMovement.DISPENSE, created_at__gte=since)
+    if item_ids is not None:
+        movements = movements.filter(item_id__in=item_ids)
+    return {
+        row['item_id']: {
+            'dispensed': -row['total'],
+            'daily_rate': -row['total'] / days,
+            'last_dispensed_at': row['last'],
+        }
+        for row in movements.values('item_id').annotate(total=Sum('quantity'), last=Max('created_at'))
+    }
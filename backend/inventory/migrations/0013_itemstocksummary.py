@@ -0,0 +1,73 @@
+# Generated by Django 5.0.10 on 2026-10-17 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Min, Q, Sum
+
+
+def backfill_stock_summaries(apps, schema_editor):
+    '''
+    Build the summaries from existing lots. Mirrors
+    inventory.summary.refresh_stock_summaries().
+    '''
+    Inventory = apps.get_model('inventory', 'Inventory')
+    ItemStockSummary = apps.get_model('inventory', 'ItemStockSummary')
+
+    rows = list(
+        Inventory.objects.values('item_id', 'department_id').annotate(
+            total=Sum('quantity_at_hand'),
+            nearest_expiry=Min('expiry_date', filter=Q(quantity_at_hand__gt=0)),
+            current_lot_id=Max('id'),
+        )
+    )
+    prices = {
+        lot_id: (sale_price, purchase_price)
+        for lot_id, sale_price, purchase_price in Inventory.objects.filter(
+            id__in=[row['current_lot_id'] for row in rows]
+        ).values_list('id', 'sale_price', 'purchase_price')
+    }
+
+    ItemStockSummary.objects.bulk_create([
+        ItemStockSummary(
+            item_id=row['item_id'],
+            department_id=row['department_id'],
+            total_on_hand=row['total'] or 0,
+            nearest_expiry=row['nearest_expiry'],
+            current_lot_id=row['current_lot_id'],
+            sale_price=prices[row['current_lot_id']][0],
+            purchase_price=prices[row['current_lot_id']][1],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_merge_20260317_0106'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemStockSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_on_hand', models.PositiveBigIntegerField(default=0)),
+                ('nearest_expiry', models.DateField(blank=True, null=True)),
+                ('sale_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('purchase_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('current_lot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.inventory')),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summaries', to='inventory.department')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summaries', to='inventory.item')),
+            ],
+            options={
+                'verbose_name_plural': 'Item stock summaries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='itemstocksummary',
+            constraint=models.UniqueConstraint(fields=('item', 'department'), name='unique_item_stock_summary'),
+        ),
+        migrations.RunPython(backfill_stock_summaries, migrations.RunPython.noop),
+    ]
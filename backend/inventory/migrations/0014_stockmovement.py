@@ -0,0 +1,64 @@
+# Generated by Django 5.0.10 on 2026-10-17 14:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+OPENING = 0
+
+
+def backfill_opening_balances(apps, schema_editor):
+    '''
+    One opening movement per lot in stock, so the journal of every lot sums
+    to its current quantity_at_hand.
+    '''
+    Inventory = apps.get_model('inventory', 'Inventory')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    now = django.utils.timezone.now()
+
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            kind=OPENING,
+            item_id=item_id,
+            department_id=department_id,
+            lot_id=lot_id,
+            quantity=quantity,
+            balance_after=quantity,
+            created_at=now,
+        )
+        for lot_id, item_id, department_id, quantity in Inventory.objects.filter(
+            quantity_at_hand__gt=0
+        ).values_list('id', 'item_id', 'department_id', 'quantity_at_hand').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_itemstocksummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(0, 'Opening balance'), (1, 'Receipt'), (2, 'Dispense'), (3, 'Transfer out'), (4, 'Transfer in'), (5, 'Adjustment')])),
+                ('quantity', models.IntegerField()),
+                ('balance_after', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('department', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.department')),
+                ('item', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_movements', to='inventory.item')),
+                ('lot', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movements', to='inventory.inventory')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['item', 'kind', 'created_at'], name='stockmove_item_kind_time'),
+                    models.Index(fields=['kind', 'created_at'], name='stockmove_kind_time'),
+                    models.Index(fields=['lot', 'id'], name='stockmove_lot'),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_opening_balances, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,4 @@
 import uuid
-import random
 from datetime import datetime
 from django.db import models
 from django.conf import settings
@@ -8,6 +7,7 @@ from rest_framework.exceptions import ValidationError, status
 
 from customuser.models import CustomUser
 from company.models import InsuranceCompany
+from company.sequences import max_suffix, next_number
 
 '''
 An item will have a packed and sub-packed properties
@@ -119,13 +119,13 @@ class Item(AbstractBaseModel):
 
     @property
     def buying_price(self):
-        inventory = self.active_inventory_items.first()
-        return inventory.purchase_price if inventory else 0
+        from .summary import get_item_stock
+        return get_item_stock(self.pk)['purchase_price'] or 0
 
     @property
     def selling_price(self):
-        inventory = self.active_inventory_items.first()
-        return inventory.sale_price if inventory else 0
+        from .summary import get_item_stock
+        return get_item_stock(self.pk)['sale_price'] or 0
 
     def __str__(self):
         return f"{self.id} - {self.name} - {self.category}"
@@ -146,15 +146,17 @@ class Requisition(AbstractBaseModel):
     approved_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='req_approved_by')
 
     def save(self, *args, **kwargs):
-        '''Generate requisition number'''
-        today = timezone.now()
-        year = today.year % 100
-        month = today.month
-        day = today.day
-        abbr = self.department.name[:3].upper()
-        random_code = random.randint(1000, 9999)
-
-        self.requisition_number = f"{abbr}/{year}/{month:02d}/{day:02d}/{random_code}"
+        '''Generate requisition number on creation'''
+        if not self.requisition_number:
+            today = timezone.localdate()
+            abbr = self.department.name[:3].upper()
+            prefix = f"{abbr}/{today.year % 100}/{today.month:02d}/{today.day:02d}/"
+            code = next_number(f"requisition:{abbr}", today.isoformat(), seed=lambda: max_suffix(
+                Requisition.objects.filter(requisition_number__startswith=prefix)
+                .values_list('requisition_number', flat=True).iterator(),
+                prefix,
+            ))
+            self.requisition_number = f"{prefix}{code:04d}"
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -201,12 +203,14 @@ class PurchaseOrder(AbstractBaseModel):
     def save(self, *args, **kwargs):
         """Generate purchase order number only on creation."""
         if not self.PO_number:  # Only generate if PO_number is empty
-            today = timezone.now()
-            year = today.year % 100
-            month = today.month
-            day = today.day
-            random_code = random.randint(1000, 9999)
-            self.PO_number = f"PO/{year}/{month:02d}/{day:02d}/{random_code}"
+            today = timezone.localdate()
+            prefix = f"PO/{today.year % 100}/{today.month:02d}/{today.day:02d}/"
+            code = next_number("purchase_order", today.isoformat(), seed=lambda: max_suffix(
+                PurchaseOrder.objects.filter(PO_number__startswith=prefix)
+                .values_list('PO_number', flat=True).iterator(),
+                prefix,
+            ))
+            self.PO_number = f"{prefix}{code:04d}"
         
         super().save(*args, **kwargs)
 
@@ -323,6 +327,92 @@ class Inventory(AbstractBaseModel):
         verbose_name_plural = 'Inventory'
 
 
+class ItemStockSummary(models.Model):
+    '''
+    Stock of an item in a department, derived from its Inventory lots and
+    kept up to date by inventory.summary whenever a lot changes. Reads go
+    through inventory.summary.get_item_stock(), which caches it.
+    '''
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='stock_summaries')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='stock_summaries')
+    total_on_hand = models.PositiveBigIntegerField(default=0)
+    nearest_expiry = models.DateField(null=True, blank=True)  # of the lots still in stock
+    # Prices of the newest lot, the one billing charges from
+    current_lot = models.ForeignKey(Inventory, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    sale_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    purchase_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Item stock summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'department'], name='unique_item_stock_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id} - {self.department_id} - {self.total_on_hand}"
+
+
+class StockMovement(models.Model):
+    '''
+    Append-only stock journal: one row per change to a lot's
+    quantity_at_hand, written by inventory.ledger. `quantity` is signed
+    (negative for dispenses and transfers out) and `balance_after` is the
+    lot's quantity_at_hand once the movement is applied.
+
+    item, department and lot are plain integer references (no FK
+    constraint) so the history outlives archived lots and removed items.
+    '''
+    OPENING = 0
+    RECEIPT = 1
+    DISPENSE = 2
+    TRANSFER_OUT = 3
+    TRANSFER_IN = 4
+    ADJUSTMENT = 5
+    KIND_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (RECEIPT, 'Receipt'),
+        (DISPENSE, 'Dispense'),
+        (TRANSFER_OUT, 'Transfer out'),
+        (TRANSFER_IN, 'Transfer in'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    item = models.ForeignKey(
+        Item, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='stock_movements')
+    department = models.ForeignKey(
+        Department, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    lot = models.ForeignKey(
+        Inventory, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='movements')
+    quantity = models.IntegerField()
+    balance_after = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'kind', 'created_at'], name='stockmove_item_kind_time'),
+            models.Index(fields=['kind', 'created_at'], name='stockmove_kind_time'),
+            models.Index(fields=['lot', 'id'], name='stockmove_lot'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity} of {self.item_id} (lot {self.lot_id})"
+
+
+class LowStockAlert(models.Model):
+    '''
+    Items currently alerted as at or below their reorder level. The row is
+    removed once the item is restocked, so the next crossing alerts again.
+    '''
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, related_name='low_stock_alert')
+    quantity_at_hand = models.PositiveIntegerField()  # when alerted
+    re_order_level = models.PositiveIntegerField()
+    alerted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.item_id} - {self.quantity_at_hand}/{self.re_order_level}"
+
+
 # Any record in the Inventory that has zero value in the 
 # quantity_at_hand field should be moved here
 class InventoryArchive(AbstractBaseModel):
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from easymed.serializers import SparseFieldsetMixin
 from rest_framework.exceptions import ValidationError
 from django.db import transaction
 from django.db.models import Sum
@@ -26,6 +27,7 @@ from .models import (
     Unit
 )
 
+from .summary import get_item_stock
 from . validators import (
     greater_than_zero,
     validate_requisition_item_uniqueness,
@@ -150,7 +152,7 @@ class SupplierSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'name']
 
 
-class SupplierInvoiceSerializer(serializers.ModelSerializer):
+class SupplierInvoiceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     total_amount = serializers.DecimalField(source='amount', read_only=True, max_digits=10, decimal_places=2)
     invoice_number = serializers.CharField(source='invoice_no', read_only=True)  # Add alias for frontend
     supplier_name = serializers.CharField(source='supplier.official_name', read_only=True)
@@ -182,7 +184,7 @@ class UnitSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     item_code = serializers.CharField(max_length=255, required=False)
     unit_symbol = serializers.CharField(source='units.symbol', read_only=True)
 
@@ -497,9 +499,7 @@ class InventorySerializer(serializers.ModelSerializer):
 
     def get_total_quantity(self, obj):
         '''Get total quantity across all lots for this item'''
-        total = Inventory.objects.filter(item=obj.item).order_by('expiry_date').aggregate(
-            total_qty=Sum('quantity_at_hand'))['total_qty'] or 0
-        return total
+        return get_item_stock(obj.item_id)['total_on_hand']
 
 
 class InsuranceItemSalePriceSerializer(serializers.ModelSerializer):
@@ -578,7 +578,7 @@ class AllocateSupplierPaymentRequestSerializer(serializers.Serializer):
     payment_date = serializers.DateField(required=False, allow_null=True)
 
 
-class RequisitionItemSerializer(BaseItemSerializer, BaseSupplierSerializer):
+class RequisitionItemSerializer(SparseFieldsetMixin, BaseItemSerializer, BaseSupplierSerializer):
     preferred_supplier = serializers.PrimaryKeyRelatedField(queryset=Supplier.objects.all(), required=False, write_only=True)
     requisition = serializers.PrimaryKeyRelatedField(source='requisition.id', read_only=True)
     requisition_number = serializers.CharField(source='requisition.requisition_number', read_only=True)
@@ -602,8 +602,10 @@ class RequisitionItemSerializer(BaseItemSerializer, BaseSupplierSerializer):
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['preferred_supplier'] = instance.preferred_supplier.official_name if instance.preferred_supplier else None
-        data['item_code'] = instance.item.item_code if hasattr(instance.item, 'item_code') else None
+        if self.is_field_requested('preferred_supplier'):
+            data['preferred_supplier'] = instance.preferred_supplier.official_name if instance.preferred_supplier else None
+        if self.is_field_requested('item_code'):
+            data['item_code'] = instance.item.item_code if hasattr(instance.item, 'item_code') else None
         return data
     
     def get_quantity_at_hand(self, obj):    
@@ -648,7 +650,7 @@ class RequisitionItemSerializer(BaseItemSerializer, BaseSupplierSerializer):
         instance.save()
         return instance
 
-class RequisitionSerializer(serializers.ModelSerializer):
+class RequisitionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = RequisitionItemSerializer(many=True, required=False)
     requested_by = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all())
     department = serializers.PrimaryKeyRelatedField(queryset=Department.objects.all())
@@ -705,7 +707,8 @@ class RequisitionSerializer(serializers.ModelSerializer):
             
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['department'] = instance.department.name if instance.department else None
+        if self.is_field_requested('department'):
+            data['department'] = instance.department.name if instance.department else None
         return data
 
     def get_total_items_requested(self, obj):
@@ -720,7 +723,7 @@ class RequisitionSerializer(serializers.ModelSerializer):
         return total
 
 
-class PurchaseOrderItemSerializer(BaseItemSerializer, BaseSupplierSerializer):
+class PurchaseOrderItemSerializer(SparseFieldsetMixin, BaseItemSerializer, BaseSupplierSerializer):
     requisition_number = serializers.CharField(source='requisition_item.requisition.requisition_number', read_only=True)
     requisition_date_created = serializers.DateTimeField(source='requisition_item.requisition.date_created', read_only=True)
     requested_by = serializers.CharField(source='requisition_item.requisition.requested_by.get_fullname', read_only=True)
@@ -767,7 +770,7 @@ class PurchaseOrderItemSerializer(BaseItemSerializer, BaseSupplierSerializer):
         return float(obj.quantity_ordered * inventory.purchase_price) if inventory else None
   
     
-class PurchaseOrderSerializer(serializers.ModelSerializer):
+class PurchaseOrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     requisition_items = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
     items = PurchaseOrderItemSerializer(source='po_items', many=True, read_only=True)  
     ordered_by = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all(), required=True)
@@ -785,7 +788,8 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['ordered_by'] = instance.ordered_by.get_fullname()
+        if self.is_field_requested('ordered_by'):
+            data['ordered_by'] = instance.ordered_by.get_fullname()
         return data
 
     def create(self, validated_data):
@@ -836,7 +840,7 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
     def get_total_amount(self, obj):
         return self.get_total_amount_before_vat(obj) + self.get_total_vat_amount(obj)
 
-class IncomingItemSerializer(serializers.ModelSerializer):
+class IncomingItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     item_name = serializers.CharField(source='item.name', read_only=True)
     supplier_name = serializers.CharField(source='supplier.official_name', read_only=True)
     item_code = serializers.CharField(source='item.item_code', read_only=True)
@@ -852,7 +856,7 @@ class IncomingItemSerializer(serializers.ModelSerializer):
     def get_total_price(self, obj):
         return obj.purchase_price * obj.quantity if obj.purchase_price and obj.quantity else 0
 
-class InventorySerializer(serializers.ModelSerializer):
+class InventorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     insurance_sale_prices = serializers.SerializerMethodField()
     item_name = serializers.ReadOnlyField(source='item.name')
     item_code = serializers.ReadOnlyField(source='item.item_code')
@@ -880,9 +884,7 @@ class InventorySerializer(serializers.ModelSerializer):
 
     def get_total_quantity(self, obj):
         '''Get total quantity across all lots for this item'''
-        total = Inventory.objects.filter(item=obj.item).order_by('expiry_date').aggregate(
-            total_qty=Sum('quantity_at_hand'))['total_qty'] or 0
-        return total
+        return get_item_stock(obj.item_id)['total_on_hand']
 
 
 class InsuranceItemSalePriceSerializer(serializers.ModelSerializer):
@@ -919,7 +921,7 @@ class SupplierPaymentAllocationSerializer(serializers.ModelSerializer):
         fields = ['supplier_invoice', 'invoice_no', 'amount_applied', 'applied_at']
 
 
-class SupplierPaymentReceiptSerializer(serializers.ModelSerializer):
+class SupplierPaymentReceiptSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     allocations = SupplierPaymentAllocationSerializer(many=True, read_only=True)
     supplier_name = serializers.SerializerMethodField()
     sub_account_name = serializers.SerializerMethodField()
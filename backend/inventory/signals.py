@@ -15,8 +15,11 @@ from .models import (
     IncomingItem,
     Inventory,
     Item,
+    StockMovement,
 )
 from .tasks import (create_insurance_prices_for_inventory)
+from .summary import refresh_stock_summaries
+from .ledger import record_lot_change
 
 logger=logging.getLogger(__name__)
 
@@ -39,10 +42,9 @@ def update_inventory_after_incomingitem_creation(sender, instance, created, **kw
                     inventory.purchase_price = instance.purchase_price
                     inventory.sale_price = instance.sale_price
                     inventory.expiry_date = instance.expiry_date
-                    inventory.save()
                 else:
                     # Create a new inventory record if lot number does not exist
-                    Inventory.objects.create(
+                    inventory = Inventory(
                         item=instance.item,
                         purchase_price=instance.purchase_price,
                         sale_price=instance.sale_price,
@@ -52,6 +54,9 @@ def update_inventory_after_incomingitem_creation(sender, instance, created, **kw
                         expiry_date=instance.expiry_date,
                         department=instance.purchase_order.requisition.department
                     )
+                # Journalled as a receipt by journal_inventory_change
+                inventory._stock_movement_kind = StockMovement.RECEIPT
+                inventory.save()
         except Exception as e:
             # Handle the exception appropriately (e.g., log the error)
             print(f"Error updating inventory for incoming item: {instance.id}, Error: {e}")
@@ -110,15 +115,6 @@ def update_purchase_order_item_quantity_received_on_delete(sender, instance, **k
 
             update_purchase_order_status(purchase_order_item.purchase_order)
 
-@receiver(post_save, sender=Inventory)
-def update_last_deducted_on(sender, instance, **kwargs):
-        old_instance = Inventory.objects.get(pk=instance.pk)
-
-        if instance.quantity_at_hand < old_instance.quantity_at_hand:
-            instance.last_deducted_on = timezone.now()
-            instance.save()
-
-
 @receiver(post_save, sender=IncomingItem)
 def update_reagent_test_counter(sender, instance, created, **kwargs):
     """
@@ -140,9 +136,11 @@ def update_reagent_test_counter(sender, instance, created, **kwargs):
                 tests_per_kit = int(instance.item.subpacked) if instance.item.subpacked else 1
                 tests_added = instance.quantity * tests_per_kit
                 
-                # Update available tests
-                counter.available_tests += tests_added
-                counter.save()
+                # Update available tests in the database, as reagent deduction does
+                TestKitCounter.objects.filter(pk=counter.pk).update(
+                    available_tests=F('available_tests') + tests_added, last_updated=timezone.now(),
+                )
+                counter.refresh_from_db(fields=['available_tests'])
                 
                 logger.info(
                     f"Updated TestKitCounter for {instance.item.name}: "
@@ -170,6 +168,34 @@ def create_default_insurance_prices(sender, instance, created, **kwargs):
             )
 
 
+@receiver([post_save, post_delete], sender=Inventory)
+def refresh_item_stock_summary(sender, instance, using, **kwargs):
+    '''
+    Keep the item's ItemStockSummary rows (and cached stock figures) in
+    step with its lots. Stock deducted through inventory.stock is refreshed
+    there, since QuerySet.update() sends no signals.
+    '''
+    refresh_stock_summaries([instance.item_id], using=using)
+
+
+@receiver(post_save, sender=Inventory)
+def journal_inventory_change(sender, instance, created, using, **kwargs):
+    '''
+    Journal a change to a lot's quantity_at_hand made through save(). New
+    lots count as receipts, other changes as adjustments unless the caller
+    set instance._stock_movement_kind.
+    '''
+    default_kind = StockMovement.RECEIPT if created else StockMovement.ADJUSTMENT
+    kind = getattr(instance, '_stock_movement_kind', default_kind)
+    record_lot_change(instance, kind=kind, using=using)
+    instance.__dict__.pop('_stock_movement_kind', None)
+
+
+@receiver(post_delete, sender=Inventory)
+def journal_inventory_delete(sender, instance, using, **kwargs):
+    record_lot_change(instance, kind=StockMovement.ADJUSTMENT, deleted=True, using=using)
+
+
 @receiver(post_save, sender=Item)
 def sync_lab_test_item(sender, instance, created, **kwargs):
     """
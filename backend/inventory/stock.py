@@ -0,0 +1,158 @@
+'''
+First-expiry-first-out (FEFO) stock deduction.
+
+All candidate Inventory lots for the requested items are locked in one
+SELECT ... FOR UPDATE, the split across lots is worked out in memory, and
+each lot is then decremented with a single conditional
+UPDATE ... WHERE quantity_at_hand >= n. No Inventory.save() is involved, so
+no post_save signals fire per lot; the DISPENSE StockMovements are written
+with one bulk insert and the items' ItemStockSummary rows are refreshed
+once for the whole batch.
+
+Lots are locked in id order, whatever their FEFO order, so two deductions
+touching the same lots queue behind each other instead of deadlocking, and a
+sale waits for a concurrent one rather than being refused while stock exists.
+'''
+import logging
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from .ledger import build_movement, record_movements
+from .models import Inventory, Item, StockMovement
+from .summary import refresh_stock_summaries
+
+
+logger = logging.getLogger(__name__)
+
+
+def _fefo_key(lot):
+    return (lot.item_id, lot.expiry_date is None, lot.expiry_date, lot.pk)
+
+
+def _lock_lots(item_ids):
+    '''Lock the items' lots with stock, in id order; returns them in FEFO order.'''
+    lots = Inventory.objects.select_for_update().filter(
+        item_id__in=item_ids, quantity_at_hand__gt=0,
+    ).order_by('id')
+    return sorted(lots, key=_fefo_key)
+
+
+def plan_fefo_deductions(lots, quantities):
+    '''
+    Split each requested quantity across `lots` (already in FEFO order).
+    Returns ([(lot, quantity)], {item_id: missing_quantity}).
+    '''
+    remaining = dict(quantities)
+    deductions = []
+    for lot in lots:
+        needed = remaining.get(lot.item_id, 0)
+        if needed <= 0:
+            continue
+        take = min(needed, lot.quantity_at_hand)
+        deductions.append((lot, take))
+        remaining[lot.item_id] = needed - take
+
+    missing = {item_id: quantity for item_id, quantity in remaining.items() if quantity > 0}
+    return deductions, missing
+
+
+def deduct_stock_batch(lines):
+    '''
+    Deduct several (item or item_id, quantity) lines - e.g. a whole
+    prescription or invoice - in one transaction. Raises ValidationError and
+    deducts nothing if any item is short.
+
+    Returns a list of (inventory_id, item_id, quantity) deductions.
+    '''
+    quantities = OrderedDict()
+    for item, quantity in lines:
+        item_id = getattr(item, 'pk', item)
+        if quantity > 0:
+            quantities[item_id] = quantities.get(item_id, 0) + quantity
+    if not quantities:
+        return []
+
+    with transaction.atomic():
+        deductions, missing = plan_fefo_deductions(_lock_lots(list(quantities)), quantities)
+        if missing:
+            names = dict(Item.objects.filter(pk__in=missing).values_list('pk', 'name'))
+            raise ValidationError([
+                f"Not enough stock available for {names.get(item_id, item_id)}. Missing quantity: {quantity}."
+                for item_id, quantity in missing.items()
+            ])
+
+        movements = []
+        for lot, quantity in deductions:
+            updated = Inventory.objects.filter(pk=lot.pk, quantity_at_hand__gte=quantity).update(
+                quantity_at_hand=F('quantity_at_hand') - quantity,
+                last_deducted_at=Now(),
+            )
+            if not updated:
+                raise ValidationError(
+                    f"Stock for lot {lot.lot_number or lot.pk} changed while deducting; please retry."
+                )
+            # The lot is locked, so its balance is what we read minus what we took
+            movements.append(build_movement(
+                StockMovement.DISPENSE, lot, -quantity, lot.quantity_at_hand - quantity,
+            ))
+            logger.info(
+                "Deducted %d from item %s, lot %s", quantity, lot.item_id, lot.lot_number,
+            )
+
+        record_movements(movements)
+        refresh_stock_summaries({lot.item_id for lot, _ in deductions})
+
+    return [(lot.pk, lot.item_id, quantity) for lot, quantity in deductions]
+
+
+def deduct_stock(item, quantity):
+    '''Deduct `quantity` of a single item, FEFO.'''
+    return deduct_stock_batch([(item, quantity)])
+
+
+def transfer_stock(lot, department, quantity):
+    '''
+    Move `quantity` from `lot` into the same lot (item, lot number, expiry)
+    held by `department`, creating it if needed. Returns the receiving lot.
+    '''
+    if quantity <= 0:
+        raise ValidationError("Transfer quantity must be positive.")
+    if lot.department_id == getattr(department, 'pk', department):
+        raise ValidationError("Stock is already held by this department.")
+
+    with transaction.atomic():
+        source = Inventory.objects.select_for_update().get(pk=lot.pk)
+        if source.quantity_at_hand < quantity:
+            raise ValidationError(
+                f"Not enough stock in lot {source.lot_number or source.pk}. Available: {source.quantity_at_hand}."
+            )
+        target, _ = Inventory.objects.select_for_update().get_or_create(
+            item_id=source.item_id,
+            department=department,
+            lot_number=source.lot_number,
+            expiry_date=source.expiry_date,
+            defaults={
+                'purchase_price': source.purchase_price,
+                'sale_price': source.sale_price,
+                'quantity_at_hand': 0,
+                're_order_level': source.re_order_level,
+                'category_one': source.category_one,
+            },
+        )
+
+        Inventory.objects.filter(pk=source.pk).update(quantity_at_hand=F('quantity_at_hand') - quantity)
+        Inventory.objects.filter(pk=target.pk).update(quantity_at_hand=F('quantity_at_hand') + quantity)
+        source.quantity_at_hand -= quantity
+        target.quantity_at_hand += quantity
+
+        record_movements([
+            build_movement(StockMovement.TRANSFER_OUT, source, -quantity, source.quantity_at_hand),
+            build_movement(StockMovement.TRANSFER_IN, target, quantity, target.quantity_at_hand),
+        ])
+        refresh_stock_summaries([source.item_id])
+
+    return target
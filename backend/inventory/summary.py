@@ -0,0 +1,178 @@
+'''
+Per item stock levels: ItemStockSummary rows plus a read-through cache.
+
+refresh_stock_summaries() rebuilds the (item, department) rows of the given
+items from their Inventory lots with one grouped query and one upsert,
+holding the items' row locks. It runs in the same
+transaction as the stock change (the Inventory post_save/post_delete
+receivers and inventory.stock.deduct_stock_batch call it), so the summary is
+never behind the lots it describes.
+
+get_item_stock()/get_item_stocks() serve the item level figures - total on
+hand, nearest expiry and current cash price - from the cache, falling back
+to the summary table on a miss. Cache entries of refreshed items are dropped
+straight away and again once the transaction commits, so a reader can't
+re-cache figures from before the commit. If the cache is unavailable the
+summary table is read directly.
+'''
+import logging
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Inventory, Item, ItemStockSummary
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'inventory:item-stock:{}'
+CACHE_TIMEOUT = 60 * 60
+
+
+def _empty_stock():
+    return {
+        'total_on_hand': 0,
+        'nearest_expiry': None,
+        'sale_price': None,
+        'purchase_price': None,
+    }
+
+
+def _cache_call(method, *args):
+    try:
+        return getattr(cache, method)(*args)
+    except Exception as e:
+        logger.warning(f"Stock cache unavailable ({method}): {e}")
+        return None
+
+
+def invalidate_item_stock(item_ids, using=DEFAULT_DB_ALIAS):
+    keys = [CACHE_KEY.format(item_id) for item_id in set(item_ids)]
+    if not keys:
+        return
+    _cache_call('delete_many', keys)
+    transaction.on_commit(lambda: _cache_call('delete_many', keys), using=using)
+
+
+def refresh_stock_summaries(item_ids=None, using=DEFAULT_DB_ALIAS):
+    '''
+    Recompute the ItemStockSummary rows of `item_ids` (every item if None)
+    from Inventory and invalidate their cache entries.
+
+    The items are locked (in id order) before their lots are read, so two
+    stock changes of one item refresh its rows one after the other, the
+    second from the first one's committed lots. Rows are upserted; the rows
+    of departments left without lots are deleted.
+    '''
+    if item_ids is not None:
+        item_ids = set(item_ids)
+        if not item_ids:
+            return
+
+    with transaction.atomic(using=using):
+        items = Item.objects.using(using).select_for_update().order_by('id')
+        if item_ids is not None:
+            items = items.filter(pk__in=item_ids)
+        locked_ids = list(items.values_list('id', flat=True))
+        if item_ids is None:
+            item_ids = set(locked_ids)
+
+        lots = Inventory.objects.using(using).filter(item_id__in=item_ids)
+        rows = list(
+            lots.values('item_id', 'department_id').annotate(
+                total=Sum('quantity_at_hand'),
+                nearest_expiry=Min('expiry_date', filter=Q(quantity_at_hand__gt=0)),
+                current_lot_id=Max('id'),
+            ).order_by('item_id', 'department_id')
+        )
+        prices = {
+            lot_id: (sale_price, purchase_price)
+            for lot_id, sale_price, purchase_price in Inventory.objects.using(using)
+            .filter(id__in=[row['current_lot_id'] for row in rows])
+            .values_list('id', 'sale_price', 'purchase_price')
+        }
+
+        ItemStockSummary.objects.using(using).bulk_create(
+            [
+                ItemStockSummary(
+                    item_id=row['item_id'],
+                    department_id=row['department_id'],
+                    total_on_hand=row['total'] or 0,
+                    nearest_expiry=row['nearest_expiry'],
+                    current_lot_id=row['current_lot_id'],
+                    sale_price=prices.get(row['current_lot_id'], (None, None))[0],
+                    purchase_price=prices.get(row['current_lot_id'], (None, None))[1],
+                    updated_at=timezone.now(),
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['item', 'department'],
+            update_fields=[
+                'total_on_hand', 'nearest_expiry', 'current_lot', 'sale_price', 'purchase_price', 'updated_at',
+            ],
+        )
+
+        stocked = {(row['item_id'], row['department_id']) for row in rows}
+        stale = [
+            summary_id
+            for summary_id, item_id, department_id in ItemStockSummary.objects.using(using)
+            .filter(item_id__in=item_ids).values_list('id', 'item_id', 'department_id')
+            if (item_id, department_id) not in stocked
+        ]
+        if stale:
+            ItemStockSummary.objects.using(using).filter(id__in=stale).delete()
+
+    invalidate_item_stock(item_ids, using=using)
+
+
+def _stocks_from_summaries(item_ids):
+    stocks = {item_id: _empty_stock() for item_id in item_ids}
+    current_lots = {}
+    for summary in ItemStockSummary.objects.filter(item_id__in=item_ids):
+        stock = stocks[summary.item_id]
+        stock['total_on_hand'] += summary.total_on_hand
+        if summary.nearest_expiry and (
+            stock['nearest_expiry'] is None or summary.nearest_expiry < stock['nearest_expiry']
+        ):
+            stock['nearest_expiry'] = summary.nearest_expiry
+        # The item's price is that of its newest lot in any department
+        if summary.current_lot_id and summary.current_lot_id > current_lots.get(summary.item_id, 0):
+            current_lots[summary.item_id] = summary.current_lot_id
+            stock['sale_price'] = summary.sale_price
+            stock['purchase_price'] = summary.purchase_price
+    return stocks
+
+
+def get_item_stocks(item_ids):
+    '''
+    {item_id: {'total_on_hand', 'nearest_expiry', 'sale_price',
+    'purchase_price'}} for `item_ids`; prices are None for items that have
+    never been stocked.
+    '''
+    item_ids = {item_id for item_id in item_ids if item_id is not None}
+    if not item_ids:
+        return {}
+
+    keys = {CACHE_KEY.format(item_id): item_id for item_id in item_ids}
+    cached = _cache_call('get_many', list(keys)) or {}
+    stocks = {keys[key]: value for key, value in cached.items()}
+
+    missing = item_ids - set(stocks)
+    if missing:
+        loaded = _stocks_from_summaries(missing)
+        _cache_call(
+            'set_many',
+            {CACHE_KEY.format(item_id): stock for item_id, stock in loaded.items()},
+            CACHE_TIMEOUT,
+        )
+        stocks.update(loaded)
+    return stocks
+
+
+def get_item_stock(item_id):
+    '''Stock figures of a single item; see get_item_stocks().'''
+    return get_item_stocks([item_id]).get(item_id, _empty_stock())
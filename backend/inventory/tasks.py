@@ -4,15 +4,13 @@ from celery import shared_task
 from channels.layers import get_channel_layer
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.db import transaction
-from django.db.models import F
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Max, Sum
 from django.core.exceptions import ValidationError
 
 from authperms.models import Group
-from inventory.models import (
-    Inventory, InventoryArchive
-)
+from inventory.models import Inventory, LowStockAlert
+from inventory.archive import archive_empty_lots
 
 User = get_user_model()
 
@@ -32,67 +30,43 @@ def get_inventory_or_error(item):
 def update_stock_quantity_if_stock_is_available(instance, deductions):
     """
     Deducts stock quantity from the Inventory model based on the billed quantity.
-    Prioritizes inventory records with the nearest expiry date.
+    Prioritizes inventory records with the nearest expiry date (see inventory.stock).
     """
-    try:
-        # Get inventory records for the item, ordered by expiry date (nearest first)
-        # TODO: WHat the hell is this? expiry_date__isnull=True??
-        # inventory_records = Inventory.objects.filter(
-        #     item=instance.item
-        # ).exclude(expiry_date__isnull=True, item__item_code="99999-NA").order_by('expiry_date')
-        inventory_records = Inventory.objects.filter(
-            item=instance.item
-        ).order_by('expiry_date')
-
-        if not inventory_records.exists():
-            raise ValidationError(f"No inventory record found for item: {instance.item.name}.")
-
-        remaining_deduction = deductions
-
-        with transaction.atomic():
-            for inventory_record in inventory_records:
-                if remaining_deduction <= 0:
-                    break 
-
-                if inventory_record.quantity_at_hand >= remaining_deduction:
-                    inventory_record.quantity_at_hand -= remaining_deduction
-                    inventory_record.save()
-                    logger.info(
-                        "Stock updated successfully for item: %s, Lot: %s, Remaining: %d",
-                        instance.item.name,
-                        inventory_record.lot_number,
-                        inventory_record.quantity_at_hand,
-                    )
-                    remaining_deduction = 0
-                else:
-                    remaining_deduction -= inventory_record.quantity_at_hand
-                    inventory_record.quantity_at_hand = 0
-                    inventory_record.save()
-                    logger.info(
-                        "Stock exhausted for item: %s, Lot: %s",
-                        instance.item.name,
-                        inventory_record.lot_number,
-                    )
-
-            if remaining_deduction > 0:
-                raise ValidationError(f"Not enough stock available for {instance.item.name}. Missing quantity: {remaining_deduction}.")
+    from .stock import deduct_stock
 
+    try:
+        return deduct_stock(instance.item, deductions)
     except ValidationError as e:
         logger.error("Stock update failed: %s", e)
         raise
     except Exception as e:
         logger.exception("Unexpected error during stock update: %s", e)
         raise
-    
+
 
 @shared_task
 def check_inventory_reorder_levels():
     """
-    Periodically checks all inventory items for reorder levels and sends notifications if needed.
+    Periodically checks item stock (summed across lots) against reorder
+    levels. Only items that crossed their level since the last run are
+    notified: one aggregated WebSocket message and one digest email.
+    Items back above their level are cleared so they can alert again.
     """
-    items = Inventory.objects.filter(quantity_at_hand__lte=F('re_order_level'))
-    if not items.exists():
-        logger.info("No items found below reorder levels.")
+    low_stock = {
+        row['item_id']: row
+        for row in Inventory.objects.values('item_id', 'item__name').annotate(
+            total=Sum('quantity_at_hand'),
+            level=Max('re_order_level'),
+        ).filter(total__lte=F('level')).order_by('item__name')
+    }
+
+    # Restocked since they were alerted
+    LowStockAlert.objects.exclude(item_id__in=low_stock).delete()
+
+    alerted = set(LowStockAlert.objects.filter(item_id__in=low_stock).values_list('item_id', flat=True))
+    new_alerts = [row for item_id, row in low_stock.items() if item_id not in alerted]
+    if not new_alerts:
+        logger.info("No items newly below reorder levels.")
         return
 
     groups_with_notification_permission = Group.objects.filter(
@@ -109,87 +83,56 @@ def check_inventory_reorder_levels():
         return
     user_emails = list(users_to_notify.values_list('email', flat=True))
 
+    message = "\n".join(
+        f"Low stock alert for {row['item__name']}: Only {row['total']} items left."
+        for row in new_alerts
+    )
+
     channel_layer = get_channel_layer()
-    for item in items:
-        message = f"Low stock alert for {item.item.name}: Only {item.quantity_at_hand} items left."
-        try:
-            async_to_sync(channel_layer.group_send)(
-                "inventory_notifications",
-                {
-                    "type": "send_notification",
-                    "message": message,
-                }
-            )
-        except Exception as ws_error:
-            raise Exception(
-                f"Failed to send WebSocket notification for {item.item.name}: {ws_error}"
-            )
-
-        try:
-            send_mail(
-                subject="Inventory Notification",
-                message=message,
-                from_email=settings.EMAIL_HOST_USER, 
-                recipient_list=user_emails,
-            )
-        except Exception as email_error:
-            logger.error(f"Error sending email for {item.item.name}: {email_error}")
+    try:
+        async_to_sync(channel_layer.group_send)(
+            "inventory_notifications",
+            {
+                "type": "send_notification",
+                "message": message,
+            }
+        )
+    except Exception as ws_error:
+        raise Exception(f"Failed to send WebSocket low stock notification: {ws_error}")
+
+    try:
+        with get_connection() as connection:
+            EmailMessage(
+                subject=f"Inventory Notification: {len(new_alerts)} item(s) below reorder level",
+                body=message,
+                from_email=settings.EMAIL_HOST_USER,
+                to=user_emails,
+                connection=connection,
+            ).send()
+    except Exception as email_error:
+        logger.error(f"Error sending low stock digest email: {email_error}")
+
+    LowStockAlert.objects.bulk_create([
+        LowStockAlert(item_id=row['item_id'], quantity_at_hand=row['total'], re_order_level=row['level'])
+        for row in new_alerts
+    ], ignore_conflicts=True)
 
 
 @shared_task(bind=True, max_retries=3)
 def inventory_garbage_collection(self):
     """
-    Periodically checks and archives inventory items with zero quantity.
+    Periodically archives inventory items with zero quantity, in set-based
+    batches (see inventory.archive).
     """
-
     try:
-        zero_quantity_items = Inventory.objects.filter(quantity_at_hand=0)
-        
-        if not zero_quantity_items.exists():
+        archived_count = archive_empty_lots()
+        if not archived_count:
             logger.info("No zero-quantity items found to archive")
             return
-        
-        archived_count = 0
-        for item in zero_quantity_items:
-            try:
-                with transaction.atomic():
-                    archive = InventoryArchive.objects.create(
-                        item=item.item,
-                        purchase_price=item.purchase_price,
-                        sale_price=item.sale_price,
-                        quantity_at_hand=item.quantity_at_hand,
-                        re_order_level=item.re_order_level,
-                        date_created=item.date_created,
-                        category_one=item.category_one,
-                        lot_number=item.lot_number,
-                        expiry_date=item.expiry_date,
-                    )
-                    
-                    logger.info(
-                        "Created archive record for item: %s (ID: %s)",
-                        item.item.name,
-                        item.item.id
-                    )
-                    
-                    item.delete()
-                    archived_count += 1
-                    logger.info(
-                        "Deleted original inventory record for: %s",
-                        item.item.name
-                    )
-                
-            except Exception as e:
-                logger.error(
-                    "Error processing item %s: %s",
-                    item.item.name,
-                    str(e),
-                    exc_info=True
-                )
-                continue
-        
+
         logger.info("Successfully archived %d items", archived_count)
         return f"Archived {archived_count} items"
-        
+
     except Exception as e:
         logger.error(
             "Error in inventory garbage collection: %s",
@@ -197,7 +140,7 @@ def inventory_garbage_collection(self):
             exc_info=True
         )
         # Retry the task if it fails
-        self.retry(exc=e, countdown=60 * 5)            
+        self.retry(exc=e, countdown=60 * 5)
 
 
 
@@ -11,6 +11,8 @@ from inventory.models import (
     Department,
     Supplier
 )
+from inventory.archive import archive_empty_lots
+from inventory.summary import get_item_stock, refresh_stock_summaries
 from inventory.tasks import inventory_garbage_collection
 
 @pytest.mark.django_db
@@ -115,3 +117,39 @@ def test_multiple_items_archived(item, department):
     
     assert InventoryArchive.objects.count() == 2
     assert Inventory.objects.count() == 0  
+
+
+@pytest.mark.django_db
+def test_archival_runs_in_batches_and_refreshes_summaries(item, department, inventory):
+    Inventory.objects.bulk_create([
+        Inventory(
+            item=item,
+            department=department,
+            purchase_price=Decimal('100.00'),
+            sale_price=Decimal('150.00'),
+            quantity_at_hand=0,
+            category_one='Resale',
+            lot_number=f'EMPTY{n}',
+        )
+        for n in range(5)
+    ])
+    # The newest (empty) lot sets the price until it is archived
+    refresh_stock_summaries([item.id])
+    assert get_item_stock(item.id)['sale_price'] == Decimal('150.00')
+
+    assert archive_empty_lots(batch_size=2) == 5
+
+    assert InventoryArchive.objects.filter(item=item).count() == 5
+    assert list(Inventory.objects.filter(item=item)) == [inventory]
+    assert get_item_stock(item.id)['sale_price'] == inventory.sale_price
+
+
+@pytest.mark.django_db
+def test_archival_stops_at_time_budget(item, department):
+    Inventory.objects.bulk_create([
+        Inventory(item=item, department=department, quantity_at_hand=0, category_one='Resale', lot_number=f'L{n}')
+        for n in range(3)
+    ])
+
+    assert archive_empty_lots(batch_size=1, time_budget=0) == 1
+    assert Inventory.objects.filter(item=item).count() == 2
@@ -5,6 +5,7 @@ from django.db import transaction
 from inventory.tasks import check_inventory_reorder_levels
 from authperms.models import Group, Permission
 from customuser.models import CustomUser
+from inventory.models import Inventory, Item, LowStockAlert
 
 @pytest.mark.django_db
 @patch("inventory.tasks.get_channel_layer")
@@ -50,3 +51,55 @@ def test_check_inventory_reorder_levels(mock_get_channel_layer, inventory):
             "message": f"Low stock alert for {inventory.item.name}: Only {inventory.quantity_at_hand} items left.",
         },
     )
+
+
+@pytest.fixture
+def notified_user(db):
+    permission = Permission.objects.create(name='CAN_RECEIVE_INVENTORY_NOTIFICATIONS')
+    group = Group.objects.create(name='Stock Alerts')
+    group.permissions.add(permission)
+    user = CustomUser.objects.create_user(
+        email='stock@example.com', password='testpass', first_name='Stock', last_name='User', role='patient'
+    )
+    user.group = group
+    user.save()
+    return user
+
+
+@pytest.mark.django_db
+@patch("inventory.tasks.get_channel_layer")
+def test_reorder_alerts_fire_once_per_crossing(mock_get_channel_layer, notified_user, inventory, item, department, mailoutbox):
+    mock_channel_layer = AsyncMock()
+    mock_get_channel_layer.return_value = mock_channel_layer
+    other_item = Item.objects.create(name="Other", desc="Other", category="Drug", item_code="OTH1")
+    for lot_item, quantity in ((item, 2), (other_item, 1), (other_item, 1)):
+        Inventory.objects.create(
+            item=lot_item, department=department, quantity_at_hand=quantity,
+            re_order_level=20, category_one='Resale',
+        )
+
+    check_inventory_reorder_levels()
+
+    # Both items summed across lots, in one message and one email
+    mock_channel_layer.group_send.assert_called_once()
+    message = mock_channel_layer.group_send.call_args[0][1]["message"]
+    assert f"{item.name}: Only 12 items left." in message
+    assert "Other: Only 2 items left." in message
+    assert len(mailoutbox) == 1
+    assert mailoutbox[0].to == [notified_user.email]
+    assert LowStockAlert.objects.count() == 2
+
+    check_inventory_reorder_levels()
+    mock_channel_layer.group_send.assert_called_once()
+    assert len(mailoutbox) == 1
+
+    # Restocked, then low again: alerts again
+    inventory.quantity_at_hand = 100
+    inventory.save()
+    check_inventory_reorder_levels()
+    assert not LowStockAlert.objects.filter(item=item).exists()
+    inventory.quantity_at_hand = 0
+    inventory.save()
+    check_inventory_reorder_levels()
+    assert mock_channel_layer.group_send.call_count == 2
+    assert "Other" not in mock_channel_layer.group_send.call_args[0][1]["message"]
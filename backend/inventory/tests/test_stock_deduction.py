@@ -0,0 +1,62 @@
+import pytest
+from datetime import date
+
+from django.core.exceptions import ValidationError
+
+from inventory.models import Inventory
+from inventory.stock import deduct_stock, deduct_stock_batch
+
+
+@pytest.fixture
+def later_lot(item, department):
+    return Inventory.objects.create(
+        item=item,
+        quantity_at_hand=10,
+        purchase_price=10.0,
+        sale_price=20.0,
+        lot_number="LOT-002",
+        expiry_date=date(2030, 1, 1),
+        category_one="resale",
+        department=department,
+    )
+
+
+@pytest.mark.django_db
+def test_deducts_earliest_expiry_first(inventory, later_lot):
+    deductions = deduct_stock(inventory.item, 12)
+
+    assert deductions == [(inventory.id, inventory.item_id, 10), (later_lot.id, later_lot.item_id, 2)]
+    inventory.refresh_from_db()
+    later_lot.refresh_from_db()
+    assert inventory.quantity_at_hand == 0
+    assert later_lot.quantity_at_hand == 8
+    assert later_lot.last_deducted_at is not None
+
+
+@pytest.mark.django_db
+def test_batch_is_all_or_nothing(inventory, later_lot):
+    with pytest.raises(ValidationError):
+        deduct_stock_batch([(inventory.item, 5), (inventory.item_id, 20)])
+
+    inventory.refresh_from_db()
+    later_lot.refresh_from_db()
+    assert inventory.quantity_at_hand == 10
+    assert later_lot.quantity_at_hand == 10
+
+
+@pytest.mark.django_db
+def test_fefo_order_does_not_follow_lot_ids(inventory, later_lot):
+    # Created last, but expires first; lots without an expiry go last
+    no_expiry = Inventory.objects.create(
+        item=inventory.item, quantity_at_hand=5, purchase_price=10.0, sale_price=20.0,
+        lot_number="LOT-003", category_one="resale", department=inventory.department,
+    )
+    earliest = Inventory.objects.create(
+        item=inventory.item, quantity_at_hand=5, purchase_price=10.0, sale_price=20.0,
+        lot_number="LOT-004", expiry_date=date(2020, 1, 1), category_one="resale", department=inventory.department,
+    )
+
+    deductions = deduct_stock(inventory.item, 28)
+
+    assert [lot_id for lot_id, _, _ in deductions] == [earliest.id, inventory.id, later_lot.id, no_expiry.id]
+    assert [quantity for _, _, quantity in deductions] == [5, 10, 10, 3]
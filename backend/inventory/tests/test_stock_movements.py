@@ -0,0 +1,75 @@
+import pytest
+from datetime import timedelta
+
+from django.utils import timezone
+
+from inventory.ledger import build_movement, lot_balances, record_movements
+from inventory.models import Department, Inventory, StockMovement
+from inventory.stock import deduct_stock, transfer_stock
+
+
+def kinds(lot_id):
+    return list(StockMovement.objects.filter(lot_id=lot_id).order_by('id').values_list('kind', 'quantity', 'balance_after'))
+
+
+@pytest.mark.django_db
+def test_every_change_is_journalled(inventory):
+    deduct_stock(inventory.item, 4)
+    inventory.refresh_from_db()
+    inventory.quantity_at_hand = 5  # stock-take
+    inventory.save()
+
+    assert kinds(inventory.pk) == [
+        (StockMovement.RECEIPT, 10, 10),
+        (StockMovement.DISPENSE, -4, 6),
+        (StockMovement.ADJUSTMENT, -1, 5),
+    ]
+    assert lot_balances([inventory.pk]) == {inventory.pk: 5}
+
+    # delete() clears inventory.pk; the journal keeps the old lot id
+    lot_id = inventory.pk
+    inventory.delete()
+    assert kinds(lot_id)[-1] == (StockMovement.ADJUSTMENT, -5, 0)
+
+
+@pytest.mark.django_db
+def test_transfer_moves_stock_between_departments(inventory):
+    pharmacy = Department.objects.create(name="Pharmacy")
+
+    target = transfer_stock(inventory, pharmacy, 3)
+
+    inventory.refresh_from_db()
+    assert inventory.quantity_at_hand == 7
+    assert target.department == pharmacy
+    assert Inventory.objects.get(pk=target.pk).quantity_at_hand == 3
+    assert kinds(inventory.pk)[-1] == (StockMovement.TRANSFER_OUT, -3, 7)
+    assert kinds(target.pk) == [(StockMovement.TRANSFER_IN, 3, 3)]
+    assert lot_balances([inventory.pk, target.pk]) == {inventory.pk: 7, target.pk: 3}
+
+
+@pytest.mark.django_db
+def test_consumption_endpoint(authenticated_client, inventory):
+    deduct_stock(inventory.item, 6)
+
+    response = authenticated_client.get(f"/inventory/inventories/consumption/?days=3&items={inventory.item_id}")
+
+    assert response.status_code == 200
+    row = response.json()[0]
+    assert row['item'] == inventory.item_id
+    assert row['dispensed'] == 6
+    assert row['daily_rate'] == 2
+    assert row['on_hand'] == 4
+    assert row['days_of_cover'] == 2
+
+
+@pytest.mark.django_db
+def test_slow_moving_items_use_the_journal(authenticated_client, inventory):
+    period = inventory.item.slow_moving_period
+    record_movements([build_movement(
+        StockMovement.DISPENSE, inventory, -1, 9, created_at=timezone.now() - timedelta(days=period + 1),
+    )])
+
+    response = authenticated_client.get("/inventory/inventories/slow-moving-items/")
+
+    assert response.status_code == 200
+    assert [row['item_id'] for row in response.json()] == [inventory.item_id]
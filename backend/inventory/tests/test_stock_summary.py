@@ -0,0 +1,83 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+
+from inventory.models import Department, Inventory, ItemStockSummary
+from inventory.stock import deduct_stock
+from inventory.summary import get_item_stock
+
+
+@pytest.fixture
+def pharmacy_lot(item):
+    return Inventory.objects.create(
+        item=item,
+        quantity_at_hand=5,
+        purchase_price=12.0,
+        sale_price=25.0,
+        lot_number="LOT-002",
+        expiry_date=date(2030, 1, 1),
+        category_one="resale",
+        department=Department.objects.create(name="Pharmacy"),
+    )
+
+
+@pytest.mark.django_db
+def test_summary_follows_lots(inventory, pharmacy_lot):
+    summaries = {summary.department_id: summary for summary in ItemStockSummary.objects.filter(item=inventory.item)}
+
+    assert summaries[inventory.department_id].total_on_hand == 10
+    assert summaries[pharmacy_lot.department_id].total_on_hand == 5
+    assert summaries[pharmacy_lot.department_id].sale_price == Decimal('25.00')
+
+    stock = get_item_stock(inventory.item_id)
+    assert stock['total_on_hand'] == 15
+    assert stock['nearest_expiry'] == date(2024, 1, 1)
+    # Newest lot's price, as billed
+    assert stock['sale_price'] == Decimal('25.00')
+    assert inventory.item.selling_price == Decimal('25.00')
+    assert inventory.item.buying_price == Decimal('12.00')
+
+
+@pytest.mark.django_db
+def test_cached_stock_is_invalidated_by_deductions_and_deletes(inventory, pharmacy_lot, django_assert_num_queries):
+    assert get_item_stock(inventory.item_id)['total_on_hand'] == 15
+    with django_assert_num_queries(0):
+        assert get_item_stock(inventory.item_id)['total_on_hand'] == 15
+
+    deduct_stock(inventory.item, 12)
+    stock = get_item_stock(inventory.item_id)
+    assert stock['total_on_hand'] == 3
+    # The earliest lot is used up
+    assert stock['nearest_expiry'] == date(2030, 1, 1)
+
+    pharmacy_lot.delete()
+    stock = get_item_stock(inventory.item_id)
+    assert stock['total_on_hand'] == 0
+    assert stock['sale_price'] == Decimal('20.00')
+
+
+@pytest.mark.django_db
+def test_refresh_updates_rows_in_place(inventory, pharmacy_lot):
+    row = ItemStockSummary.objects.get(item=inventory.item, department=inventory.department)
+
+    inventory.quantity_at_hand = 4
+    inventory.save()
+    refreshed = ItemStockSummary.objects.get(item=inventory.item, department=inventory.department)
+    assert (refreshed.pk, refreshed.total_on_hand) == (row.pk, 4)
+
+    # A department left without lots loses its row
+    pharmacy_lot.delete()
+    assert list(ItemStockSummary.objects.filter(item=inventory.item).values_list('department_id', flat=True)) == [
+        inventory.department_id
+    ]
+
+
+@pytest.mark.django_db
+def test_stock_levels_endpoint(authenticated_admin_client, inventory, item):
+    response = authenticated_admin_client.get(f'/inventory/inventories/stock-levels/?items={item.id},999999')
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body[0]['item'] == item.id
+    assert body[0]['total_on_hand'] == 10
+    assert body[1] == {'item': 999999, 'total_on_hand': 0, 'nearest_expiry': None, 'sale_price': None, 'purchase_price': None}
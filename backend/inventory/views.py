@@ -5,14 +5,14 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.response import Response # type: ignore
 from rest_framework.exceptions import ValidationError
-from weasyprint import HTML
+from reports.pdf import get_company_logo_data_uri, pdf_response
 from django.shortcuts import render, get_object_or_404
 from django.template.loader import get_template
 from django.http import HttpResponse
 from django.conf import settings
 from rest_framework.generics import ListAPIView
 from django.utils import timezone
-from django.db.models.functions import Now
+from django.db.models.functions import Coalesce, Now
 from django.db.models import F, Sum
 from datetime import timedelta
 
@@ -59,6 +59,8 @@ from .serializers import (
     UnitSerializer
 )
 
+from .ledger import consumption_rates, last_dispensed_at
+from .summary import get_item_stocks
 from .filters import (
     InventoryFilter,
     InventoryFilterSearch,
@@ -231,14 +233,67 @@ class InventoryViewSet(viewsets.ModelViewSet):
         'lot_number', 'item__name', 'item__item_code', 'department__name'
     ]
 
+    @action(detail=False, methods=['get'], url_path='stock-levels')
+    def stock_levels(self, request):
+        '''
+        Cached stock figures per item, from inventory.summary:
+        GET /inventory/inventories/stock-levels/?items=1,2,3
+        '''
+        try:
+            item_ids = [int(pk) for pk in request.query_params.get('items', '').split(',') if pk.strip()]
+        except ValueError:
+            raise ValidationError({"items": "Expected a comma separated list of item ids."})
+        if not item_ids:
+            raise ValidationError({"items": "This parameter is required."})
+
+        stocks = get_item_stocks(item_ids)
+        return Response([
+            {'item': item_id, **stocks[item_id]}
+            for item_id in dict.fromkeys(item_ids)
+        ])
+
+    @action(detail=False, methods=['get'], url_path='consumption')
+    def consumption(self, request):
+        '''
+        Dispensed quantity, daily consumption and days of cover per item over
+        the last `days` days (default 30), from the StockMovement journal:
+        GET /inventory/inventories/consumption/?days=30&items=1,2
+        '''
+        try:
+            days = int(request.query_params.get('days', 30))
+            item_ids = [int(pk) for pk in request.query_params.get('items', '').split(',') if pk.strip()] or None
+        except ValueError:
+            raise ValidationError({"error": "'days' and 'items' must be integers."})
+        if days < 1:
+            raise ValidationError({"days": "Must be at least 1."})
+
+        rates = consumption_rates(days=days, item_ids=item_ids)
+        stocks = get_item_stocks(rates)
+        return Response([
+            {
+                'item': item_id,
+                **rate,
+                'on_hand': stocks[item_id]['total_on_hand'],
+                'days_of_cover': (
+                    round(stocks[item_id]['total_on_hand'] / rate['daily_rate'], 1) if rate['daily_rate'] else None
+                ),
+            }
+            for item_id, rate in rates.items()
+        ])
+
     @action(detail=False, methods=['get'], url_path='slow-moving-items')
     def slow_moving_items(self, request):
+        # Last dispense from the journal; last_deducted_at covers lots
+        # deducted before the journal existed
         inventory_items = Inventory.objects.filter(
             quantity_at_hand__gt=0,
             item__slow_moving_period__isnull=False,
-            last_deducted_at__isnull=False,
         ).annotate(
-            days_without_transactions=(Now() - F('last_deducted_at'))
+            last_dispensed_at=Coalesce(last_dispensed_at(), 'last_deducted_at'),
+        ).filter(
+            last_dispensed_at__isnull=False,
+        ).annotate(
+            days_without_transactions=(Now() - F('last_dispensed_at'))
         ).filter(
             days_without_transactions__gte=F('item__slow_moving_period') * timedelta(days=1)
         ).select_related('item', 'department')
@@ -399,7 +454,7 @@ def download_requisition_pdf(request, requisition_id):
     pdf accessed here http://127.0.0.1:8080/download_requisition_pdf/26/
     '''
     company = Company.objects.first()
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
     requisition = get_object_or_404(Requisition, pk=requisition_id)
     requisition_items = RequisitionItem.objects.filter(requisition=requisition)
 
@@ -429,11 +484,9 @@ def download_requisition_pdf(request, requisition_id):
 
     html_template = get_template('requisition.html').render(context)
     
-    pdf_file = HTML(string=html_template).write_pdf()
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="purchase_order_report_{requisition_id}.pdf"'
-
-    return response
+    return pdf_response(
+        request, f'requisition_{requisition_id}', html_template, f'purchase_order_report_{requisition_id}.pdf'
+    )
 
 
 def download_purchaseorder_pdf(request, purchaseorder_id):
@@ -447,7 +500,7 @@ def download_purchaseorder_pdf(request, purchaseorder_id):
     company = Company.objects.first()
     user = CustomUser.objects.first()
 
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
 
     item_details = []
     total_amount = 0
@@ -463,7 +516,7 @@ def download_purchaseorder_pdf(request, purchaseorder_id):
         })
 
     # Get signature and logo URLs
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
     creator_sig_url = request.build_absolute_uri(purchase_order.created_by.signature.url) if purchase_order.created_by and purchase_order.created_by.signature else None
     approver_sig_url = request.build_absolute_uri(purchase_order.approved_by.signature.url) if purchase_order.approved_by and purchase_order.approved_by.signature else None
 
@@ -480,12 +533,9 @@ def download_purchaseorder_pdf(request, purchaseorder_id):
 
     html_template = get_template('purchase_order_note.html').render(context)
     
-    pdf_file = HTML(string=html_template).write_pdf()
-
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="purchase_order_report_{purchaseorder_id}.pdf"'
-
-    return response
+    return pdf_response(
+        request, f'purchase_order_{purchaseorder_id}', html_template, f'purchase_order_report_{purchaseorder_id}.pdf'
+    )
 
 
 def download_goods_receipt_note_pdf(request, purchase_order_id):
@@ -523,7 +573,7 @@ def download_goods_receipt_note_pdf(request, purchase_order_id):
         })
 
     # Construct full logo URL for template
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
 
     context = {
         'incoming_items': incoming_items,
@@ -538,10 +588,10 @@ def download_goods_receipt_note_pdf(request, purchase_order_id):
     }
 
     html_template = get_template('goods_receipt_note.html').render(context)
-    pdf_file = HTML(string=html_template).write_pdf()
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="incoming_items.pdf"'
-    return response
+    return pdf_response(
+        request, f'goods_receipt_note_{purchase_order_id}', html_template, 'incoming_items.pdf',
+        disposition='attachment',
+    )
 
 
 def download_supplier_invoice_pdf(request, supplier_id):
@@ -550,7 +600,7 @@ def download_supplier_invoice_pdf(request, supplier_id):
     incoming_items = IncomingItem.objects.filter(supplier_invoice__supplier=supplier)
     company = Company.objects.first()
 
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
 
     context = {
         'supplier': supplier,
@@ -562,12 +612,9 @@ def download_supplier_invoice_pdf(request, supplier_id):
 
     html_template = get_template('supplier_invoice.html').render(context)
 
-    pdf_file = HTML(string=html_template).write_pdf()
-
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="supplier_invoice_report_{supplier_id}.pdf"'
-
-    return response
+    return pdf_response(
+        request, f'supplier_invoice_{supplier_id}', html_template, f'supplier_invoice_report_{supplier_id}.pdf'
+    )
 
 
 class AllocateSupplierPaymentView(APIView):
@@ -596,26 +643,29 @@ class AllocateSupplierPaymentView(APIView):
         if not invoices.exists():
             return Response({"detail": "No invoices found for the selected supplier."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get sub account and its payment mode
-        try:
-            sub_account = SubAccount.objects.select_related('payment_mode').get(id=sub_account_id)
-        except SubAccount.DoesNotExist:
-            return Response({"detail": "Invalid sub account."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Validate sub account has sufficient balance
-        account_balance = sub_account.balance
-        if account_balance <= 0:
-            return Response(
-                {"detail": f"Sub account '{sub_account.name}' has zero balance. Cannot make payment."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if amount > account_balance:
-            return Response(
-                {"detail": f"Insufficient funds. Sub account '{sub_account.name}' has a balance of {account_balance:.2f} but the payment amount is {amount:.2f}."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
         with transaction.atomic():
+            # Lock the sub account row so concurrent payouts can't both pass
+            # the balance check and overdraw it.
+            try:
+                sub_account = SubAccount.objects.select_for_update(of=('self',)).select_related(
+                    'payment_mode'
+                ).get(id=sub_account_id)
+            except SubAccount.DoesNotExist:
+                return Response({"detail": "Invalid sub account."}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Validate sub account has sufficient balance
+            account_balance = sub_account.balance
+            if account_balance <= 0:
+                return Response(
+                    {"detail": f"Sub account '{sub_account.name}' has zero balance. Cannot make payment."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if amount > account_balance:
+                return Response(
+                    {"detail": f"Insufficient funds. Sub account '{sub_account.name}' has a balance of {account_balance:.2f} but the payment amount is {amount:.2f}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
             # Create payment receipt
             receipt = SupplierPaymentReceipt.objects.create(
                 supplier_id=supplier_id,
@@ -684,11 +734,7 @@ def download_supplier_payment_receipt_pdf(request, receipt_id):
         pk=receipt_id,
     )
     company = Company.objects.first()
-    company_logo_url = (
-        request.build_absolute_uri(company.logo.url)
-        if company and getattr(company, 'logo', None) and company.logo
-        else None
-    )
+    company_logo_url = get_company_logo_data_uri(company)
 
     allocations = receipt.allocations.select_related(
         'supplier_invoice', 'supplier_invoice__supplier'
@@ -704,7 +750,7 @@ def download_supplier_payment_receipt_pdf(request, receipt_id):
         'total_invoiced': total_invoiced,
     })
 
-    pdf_file = HTML(string=html_template).write_pdf()
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="supplier_payment_receipt_{receipt.id}.pdf"'
-    return response
+    return pdf_response(
+        request, f'supplier_payment_receipt_{receipt.id}', html_template,
+        f'supplier_payment_receipt_{receipt.id}.pdf',
+    )
@@ -2,6 +2,7 @@ import django_filters
 
 from .models import (
     LabTestRequest,
+    PatientSample,
 )
 
 class LabTestRequestFilter(django_filters.FilterSet):
@@ -11,4 +12,34 @@ class LabTestRequestFilter(django_filters.FilterSet):
         fields = "__all__"
 
 
-        
\ No newline at end of file
+class LabWorkListFilter(django_filters.FilterSet):
+    '''
+    Filters of the lab work list. `bench` is the LabTestProfile of the
+    sample's request; `status` reads the flags LabWorkListViewSet annotates.
+    '''
+    STATUS_CHOICES = (
+        ('pending', 'Awaiting collection'),
+        ('collected', 'Collected'),
+        ('archived', 'Archived'),
+        ('disposed', 'Disposed'),
+        ('retested', 'Retested'),
+        ('released', 'Released'),
+    )
+
+    bench = django_filters.NumberFilter(field_name='lab_test_request__test_profile')
+    specimen = django_filters.NumberFilter(field_name='specimen')
+    status = django_filters.ChoiceFilter(choices=STATUS_CHOICES, method='filter_status')
+
+    class Meta:
+        model = PatientSample
+        fields = ['bench', 'specimen', 'status', 'process']
+
+    def filter_status(self, queryset, name, value):
+        if value == 'pending':
+            return queryset.filter(is_sample_collected=False)
+        if value == 'collected':
+            return queryset.filter(
+                is_sample_collected=True, is_archived=False, is_disposed=False,
+                is_retested=False, is_released=False,
+            )
+        return queryset.filter(**{f'is_{value}': True})
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.10 on 2026-10-17 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_billed_panels(apps, schema_editor):
+    '''Panels billed so far had their reagents deducted when they were billed.'''
+    LabTestRequestPanel = apps.get_model('laboratory', 'LabTestRequestPanel')
+    ReagentDeduction = apps.get_model('laboratory', 'ReagentDeduction')
+
+    ReagentDeduction.objects.bulk_create([
+        ReagentDeduction(lab_test_request_panel_id=panel_id)
+        for panel_id in LabTestRequestPanel.objects.filter(is_billed=True).values_list('id', flat=True).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laboratory', '0020_remove_labtestpanel_unit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReagentDeduction',
+            fields=[
+                ('lab_test_request_panel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reagent_deduction', serialize=False, to='laboratory.labtestrequestpanel')),
+                ('deducted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(mark_billed_panels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:20
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_tat(apps, schema_editor):
+    '''Stamp panels whose samples were already collected, as the models now do.'''
+    LabSettings = apps.get_model('laboratory', 'LabSettings')
+    LabTestRequestPanel = apps.get_model('laboratory', 'LabTestRequestPanel')
+
+    lab_settings = LabSettings.objects.filter(pk=1).first()
+    default_tat = timedelta(minutes=lab_settings.default_tat_minutes if lab_settings else 60)
+
+    panels = LabTestRequestPanel.objects.filter(
+        patient_sample__collected_on__isnull=False
+    ).select_related('test_panel', 'patient_sample').order_by('id')
+    batch = []
+    for panel in panels.iterator(chunk_size=1000):
+        tat_limit = panel.test_panel.tat or default_tat
+        panel.sample_collected_at = panel.patient_sample.collected_on
+        panel.tat_deadline = panel.sample_collected_at + tat_limit if tat_limit else None
+        if not panel.result_approved:
+            panel.tat_status = 'pending'
+        elif panel.tat_deadline and panel.approved_on and panel.approved_on > panel.tat_deadline:
+            panel.tat_status = 'failed'
+        else:
+            panel.tat_status = 'passed'
+        batch.append(panel)
+        if len(batch) == 1000:
+            LabTestRequestPanel.objects.bulk_update(batch, ['sample_collected_at', 'tat_deadline', 'tat_status'])
+            batch = []
+    if batch:
+        LabTestRequestPanel.objects.bulk_update(batch, ['sample_collected_at', 'tat_deadline', 'tat_status'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laboratory', '0021_reagentdeduction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labtestrequestpanel',
+            name='sample_collected_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='labtestrequestpanel',
+            name='tat_deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='labtestrequestpanel',
+            name='tat_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('passed', 'Passed'), ('failed', 'Failed')], max_length=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='labtestrequestpanel',
+            index=models.Index(fields=['tat_status', 'tat_deadline'], name='labpanel_tat_status_deadline'),
+        ),
+        migrations.AddIndex(
+            model_name='labtestrequestpanel',
+            index=models.Index(fields=['sample_collected_at'], name='labpanel_sample_collected_at'),
+        ),
+        migrations.RunPython(backfill_tat, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.10 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laboratory', '0022_labtestrequestpanel_tat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='disposedsample',
+            index=models.Index(fields=['patient_sample_code'], name='disposedsample_code'),
+        ),
+        migrations.AddIndex(
+            model_name='retestsample',
+            index=models.Index(fields=['patient_sample_code'], name='retestsample_code'),
+        ),
+    ]
@@ -1,13 +1,13 @@
 import logging
 from django.db import models
-from random import randrange, choices
 from django.conf import settings
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db import transaction, IntegrityError
 from django.core.validators import FileExtensionValidator
 
 from customuser.models import CustomUser
+from company.sequences import max_suffix, next_number, next_numbers
 
 
 # TODO: Redundant. Should be removed.
@@ -96,6 +96,19 @@ class ReagentConsumptionLog(models.Model):
         return f"{self.reagent_item.name} - {self.tests_consumed} tests - {self.consumed_at.strftime('%Y-%m-%d %H:%M')}"
 
 
+class ReagentDeduction(models.Model):
+    """
+    Marks a billed LabTestRequestPanel whose reagents have been deducted.
+    Keyed on the panel, so its reagents can only ever be deducted once.
+    """
+    lab_test_request_panel = models.OneToOneField('LabTestRequestPanel', on_delete=models.CASCADE,
+                                                  primary_key=True, related_name='reagent_deduction')
+    deducted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Reagents deducted for panel {self.lab_test_request_panel_id}"
+
+
 class LabEquipment(models.Model):
     COM_MODE_CHOICE = (
         ("serial", "Serial"),
@@ -274,31 +287,32 @@ class PatientSample(models.Model):
     is_sample_collected = models.BooleanField(default=False)
     collected_on = models.DateTimeField(null=True, blank=True)
 
+    @staticmethod
+    def _sample_code_seed(prefix, suffix):
+        return lambda: max_suffix(
+            PatientSample.objects.filter(
+                patient_sample_code__startswith=prefix, patient_sample_code__endswith=suffix
+            ).values_list('patient_sample_code', flat=True).iterator(),
+            prefix, suffix,
+        )
+
     def generate_sample_code(self):
         prefix = "DDLR"
         current_year = timezone.now().year
+        suffix = f"-{current_year}"
 
-        with transaction.atomic():
-            # Lock the table to prevent race conditions during code generation.
-            # Find the last sample created in the current year.
-            last_sample = PatientSample.objects.select_for_update().filter(
-                patient_sample_code__endswith=f"-{current_year}"
-            ).order_by('-patient_sample_code').first()
-
-            if last_sample:
-                try:
-                    # Extract the numeric part of the code, e.g., '00001' from 'DDLR00001-2025'
-                    last_number_str = last_sample.patient_sample_code.split('-')[0][len(prefix):]
-                    last_number = int(last_number_str)
-                    next_number = last_number + 1
-                except (ValueError, IndexError): 
-                    next_number = 1 # Fallback in case of unexpected format
-            else:
-                next_number = 1 # First sample of the year
-
-            new_number_str = f"{next_number:05d}"
-            sp_id = f"{prefix}{new_number_str}-{current_year}"  
-            return sp_id
+        # e.g. 'DDLR00001-2025', numbered per year
+        sample_number = next_number('patient_sample', current_year, seed=self._sample_code_seed(prefix, suffix))
+        return f"{prefix}{sample_number:05d}{suffix}"
+
+    @classmethod
+    def generate_sample_codes(cls, count):
+        """`count` sample codes reserved with a single sequence UPDATE."""
+        prefix = "DDLR"
+        current_year = timezone.now().year
+        suffix = f"-{current_year}"
+        numbers = next_numbers('patient_sample', count, current_year, seed=cls._sample_code_seed(prefix, suffix))
+        return [f"{prefix}{number:05d}{suffix}" for number in numbers]
 
     def save(self, *args, **kwargs):
         """Generate a unique patient_sample_code with retry to avoid race condition.
@@ -333,6 +347,21 @@ class PatientSample(models.Model):
                 # Different integrity error, re-raise immediately
                 raise
 
+        if self.collected_on:
+            self.start_panels_tat()
+
+    def start_panels_tat(self):
+        """Start the TAT clock of this sample's panels once it is collected."""
+        panels = list(self.labtestrequestpanel_set.filter(
+            sample_collected_at__isnull=True
+        ).select_related('test_panel'))
+        if not panels:
+            return
+        default_tat = LabSettings.get_settings().default_tat()
+        for panel in panels:
+            panel.start_tat(self.collected_on, default_tat)
+        LabTestRequestPanel.objects.bulk_update(panels, ['sample_collected_at', 'tat_deadline', 'tat_status'])
+
     def __str__(self):
         return str(f"{self.patient_sample_code} - {self.specimen.name} - {self.process}")
 
@@ -347,18 +376,57 @@ class LabTestRequestPanel(models.Model):
     result_approved=models.BooleanField(default=False)
     approved_on = models.DateTimeField(null=True, blank=True) 
     is_billed = models.BooleanField(default=False)
+
+    # Turnaround time, stamped when the sample is collected and the result approved
+    TAT_PENDING = 'pending'
+    TAT_PASSED = 'passed'
+    TAT_FAILED = 'failed'
+    TAT_STATUS_CHOICES = (
+        (TAT_PENDING, 'Pending'),
+        (TAT_PASSED, 'Passed'),
+        (TAT_FAILED, 'Failed'),
+    )
+    sample_collected_at = models.DateTimeField(null=True, blank=True)
+    tat_deadline = models.DateTimeField(null=True, blank=True)
+    tat_status = models.CharField(max_length=10, choices=TAT_STATUS_CHOICES, null=True, blank=True)
     
     # Auto-generated interpretation based on result value
     auto_interpretation = models.TextField(null=True, blank=True, help_text="Auto-generated interpretation based on result ranges")
     clinical_action = models.TextField(null=True, blank=True, help_text="Recommended clinical action from interpretation")
     requires_attention = models.BooleanField(default=False, help_text="Flagged for immediate attention")
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['tat_status', 'tat_deadline'], name='labpanel_tat_status_deadline'),
+            models.Index(fields=['sample_collected_at'], name='labpanel_sample_collected_at'),
+        ]
+
+    @staticmethod
+    def _last_test_number():
+        return max_suffix(
+            LabTestRequestPanel.objects.filter(
+                test_code__startswith="TC-"
+            ).values_list('test_code', flat=True).iterator(),
+            "TC-",
+        )
+
     def generate_test_code(self):
-        while True:
-            random_number = ''.join(choices('0123456789', k=4))
-            test_id = f"TC-{random_number}"
-            if not LabTestRequestPanel.objects.filter(test_code=test_id).exists():
-                return test_id
+        # Only uniqueness matters here, so workers reserve codes in blocks
+        test_number = next_number('lab_test_code', block_size=20, seed=self._last_test_number)
+        return f"TC-{test_number:04d}"
+
+    @classmethod
+    def generate_test_codes(cls, count):
+        """`count` test codes reserved with a single sequence UPDATE."""
+        return [f"TC-{number:04d}" for number in next_numbers('lab_test_code', count, seed=cls._last_test_number)]
+
+    @staticmethod
+    def category_for(test_panel):
+        if test_panel.is_qualitative:
+            return 'qualitative'
+        elif test_panel.is_quantitative:
+            return 'quantitative'
+        return 'none'
             
     def get_patient_name(self):
         return self.patient_sample.process.reference  # Should get you the process track_number or reference ID
@@ -425,12 +493,7 @@ class LabTestRequestPanel(models.Model):
                     )
 
         # Set the category based on the related LabTestPanel
-        if self.test_panel.is_qualitative:
-            self.category = 'qualitative'
-        elif self.test_panel.is_quantitative:
-            self.category = 'quantitative'
-        else:
-            self.category = 'none'
+        self.category = self.category_for(self.test_panel)
 
         # Auto-generate interpretation if result is present
         if self.result and self.test_panel and self.patient_sample:
@@ -447,9 +510,30 @@ class LabTestRequestPanel(models.Model):
         elif self.result_approved and not self.approved_on:
             # Also set if result_approved is set but approved_on wasn't set
             self.approved_on = timezone.now()
+
+        if not self.sample_collected_at and self.patient_sample and self.patient_sample.collected_on:
+            self.start_tat(self.patient_sample.collected_on, LabSettings.get_settings().default_tat())
+        self.update_tat_status()
             
         super().save(*args, **kwargs)
 
+    def start_tat(self, collected_on, default_tat):
+        tat_limit = self.test_panel.tat or default_tat
+        self.sample_collected_at = collected_on
+        self.tat_deadline = collected_on + tat_limit if tat_limit else None
+        self.update_tat_status()
+
+    def update_tat_status(self):
+        """Pending until the result is approved, then passed or failed against tat_deadline."""
+        if not self.sample_collected_at:
+            self.tat_status = None
+        elif not self.result_approved:
+            self.tat_status = self.TAT_PENDING
+        elif self.tat_deadline and (self.approved_on or timezone.now()) > self.tat_deadline:
+            self.tat_status = self.TAT_FAILED
+        else:
+            self.tat_status = self.TAT_PASSED
+
     def __str__(self):
         return f"{self.test_panel.name}"
 
@@ -515,6 +599,9 @@ class LabSettings(models.Model):
         settings, created = cls.objects.get_or_create(pk=1)
         return settings
 
+    def default_tat(self):
+        return timedelta(minutes=self.default_tat_minutes)
+
 
 class Archive(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -581,6 +668,11 @@ class DisposedSample(models.Model):
     disposed_on = models.DateField(auto_now_add=True)
     disposed_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient_sample_code'], name='disposedsample_code'),
+        ]
+
     def __str__(self):
         return f"{self.patient_sample_code} - Disposed on {self.disposed_on}"
 
@@ -593,6 +685,11 @@ class RetestSample(models.Model):
     retested_on = models.DateField(auto_now_add=True)
     retested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='retest_samples')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient_sample_code'], name='retestsample_code'),
+        ]
+
     def __str__(self):
         return f"{self.patient_sample_code} - Retested on {self.retested_on}"
 
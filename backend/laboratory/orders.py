@@ -0,0 +1,76 @@
+'''
+Bulk lab orders.
+
+LabTestRequestPanel.save() numbers each panel and finds or creates its
+PatientSample on its own, several queries per panel. create_request_panels()
+does the same for a whole order in a fixed handful of queries: the samples of
+every specimen involved are fetched in one query and the missing ones created
+with one bulk_create(), test and sample codes are reserved with one sequence
+UPDATE each, and the panels are inserted with one bulk_create().
+
+bulk_create() sends no post_save, so nothing is deducted here; billing a
+panel later saves it and triggers the reagent deduction as usual.
+'''
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import LabSettings, LabTestRequestPanel, PatientSample
+
+
+def _order_samples(lab_test_request, specimen_ids, using):
+    '''{specimen id: PatientSample} of the request's process, creating the missing ones.'''
+    process_id = lab_test_request.process_id
+    if not process_id or not specimen_ids:
+        return {}
+
+    samples = {}
+    for sample in PatientSample.objects.using(using).filter(
+        process_id=process_id, specimen_id__in=specimen_ids
+    ).order_by('id'):
+        samples.setdefault(sample.specimen_id, sample)
+
+    missing = sorted(specimen_id for specimen_id in specimen_ids if specimen_id not in samples)
+    if missing:
+        created = PatientSample.objects.using(using).bulk_create([
+            PatientSample(
+                process_id=process_id,
+                specimen_id=specimen_id,
+                lab_test_request=lab_test_request,
+                patient_sample_code=code,
+            )
+            for specimen_id, code in zip(missing, PatientSample.generate_sample_codes(len(missing)))
+        ])
+        samples.update((sample.specimen_id, sample) for sample in created)
+    return samples
+
+
+def create_request_panels(lab_test_request, test_panels, using=DEFAULT_DB_ALIAS):
+    '''
+    Create a LabTestRequestPanel per LabTestPanel in `test_panels` for
+    `lab_test_request`; returns them in order. Panels without a specimen get
+    no sample.
+    '''
+    if not test_panels:
+        return []
+
+    with transaction.atomic(using=using):
+        samples = _order_samples(
+            lab_test_request, {test_panel.specimen_id for test_panel in test_panels if test_panel.specimen_id}, using,
+        )
+        default_tat = None
+        panels = []
+        for test_panel, test_code in zip(test_panels, LabTestRequestPanel.generate_test_codes(len(test_panels))):
+            panel = LabTestRequestPanel(
+                lab_test_request=lab_test_request,
+                test_panel=test_panel,
+                test_code=test_code,
+                patient_sample=samples.get(test_panel.specimen_id),
+                category=LabTestRequestPanel.category_for(test_panel),
+            )
+            # Samples collected before the order start the clock right away
+            if panel.patient_sample and panel.patient_sample.collected_on:
+                if default_tat is None:
+                    default_tat = LabSettings.get_settings().default_tat()
+                panel.start_tat(panel.patient_sample.collected_on, default_tat)
+            panels.append(panel)
+
+        return LabTestRequestPanel.objects.using(using).bulk_create(panels)
@@ -0,0 +1,159 @@
+'''
+Reagent consumption for billed lab tests.
+
+A LabTestRequestPanel consumes its test panel's reagents exactly once: the
+run that deducts them inserts the panel's ReagentDeduction row in the same
+transaction, and that row is keyed on the panel. Runs pick up every billed
+panel without one, so billing only has to schedule a run; panels billed
+within SCHEDULE_WINDOW seconds of each other share it.
+
+Each run claims its panels and the TestKitCounters involved with
+select_for_update, decrements every counter with a single UPDATE and
+writes the ReagentConsumptionLog rows with one bulk_create.
+'''
+import logging
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import LabTestRequestPanel, ReagentConsumptionLog, ReagentDeduction, TestKitCounter, TestPanelReagent
+
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_WINDOW = 10  # seconds
+SCHEDULED_KEY = 'laboratory:reagent-deduction:scheduled'
+
+
+def schedule_reagent_deduction():
+    '''Queue a deduction run unless one is already queued for this window.'''
+    from .tasks import deduct_test_kits
+
+    try:
+        # Expires on its own, so a lost task only delays the next run
+        queued = not cache.add(SCHEDULED_KEY, 1, SCHEDULE_WINDOW * 6)
+    except Exception:
+        queued = False
+    if not queued:
+        deduct_test_kits.apply_async(countdown=SCHEDULE_WINDOW)
+
+
+def release_schedule():
+    '''Let panels billed from now on schedule a new run.'''
+    try:
+        cache.delete(SCHEDULED_KEY)
+    except Exception:
+        pass
+
+
+def _patient_name(panel):
+    try:
+        patient = panel.patient_sample.process.attendanceprocess.patient
+        return f"{patient.first_name} {patient.second_name}"
+    except Exception:
+        return "Unknown"
+
+
+def _counters(reagent_ids, using):
+    '''Locked {reagent item id: TestKitCounter}, creating the missing counters empty.'''
+    counters = {}
+    for counter in TestKitCounter.objects.using(using).select_for_update().filter(
+        reagent_item_id__in=reagent_ids
+    ).order_by('id'):
+        counters.setdefault(counter.reagent_item_id, counter)
+
+    missing = [TestKitCounter(reagent_item_id=reagent_id, available_tests=0)
+               for reagent_id in reagent_ids if reagent_id not in counters]
+    if missing:
+        for counter in TestKitCounter.objects.using(using).bulk_create(missing):
+            logger.warning("Created new TestKitCounter for reagent item %s with 0 tests", counter.reagent_item_id)
+            counters[counter.reagent_item_id] = counter
+    return counters
+
+
+def deduct_batch(panel_ids=None, batch_size=500, using=DEFAULT_DB_ALIAS):
+    '''
+    Deduct reagents for up to `batch_size` pending panels (all pending
+    panels, or those among `panel_ids`). Returns the number of panels handled.
+    '''
+    with transaction.atomic(using=using):
+        pending = LabTestRequestPanel.objects.using(using).filter(is_billed=True, reagent_deduction__isnull=True)
+        if panel_ids is not None:
+            pending = pending.filter(id__in=panel_ids)
+        panels = list(
+            pending.select_for_update(skip_locked=True, of=('self',)).select_related(
+                'test_panel', 'lab_test_request',
+                'patient_sample__process__attendanceprocess__patient',
+            ).order_by('id')[:batch_size]
+        )
+        if not panels:
+            return 0
+        ReagentDeduction.objects.using(using).bulk_create([
+            ReagentDeduction(lab_test_request_panel=panel) for panel in panels
+        ])
+
+        links = defaultdict(list)
+        for link in TestPanelReagent.objects.using(using).filter(
+            test_panel_id__in={panel.test_panel_id for panel in panels}
+        ).order_by('id'):
+            links[link.test_panel_id].append(link)
+        reagent_ids = {link.reagent_item_id for panel_links in links.values() for link in panel_links}
+        if not reagent_ids:
+            return len(panels)
+
+        counters = _counters(reagent_ids, using)
+        available = {reagent_id: counter.available_tests for reagent_id, counter in counters.items()}
+        logs = []
+        for panel in panels:
+            patient_name = _patient_name(panel)
+            for link in links[panel.test_panel_id]:
+                before = available[link.reagent_item_id]
+                available[link.reagent_item_id] = before - link.tests_consumed_per_run
+                logs.append(ReagentConsumptionLog(
+                    reagent_item_id=link.reagent_item_id,
+                    test_panel_id=panel.test_panel_id,
+                    lab_test_request_panel=panel,
+                    tests_consumed=link.tests_consumed_per_run,
+                    available_tests_before=before,
+                    available_tests_after=available[link.reagent_item_id],
+                    patient_name=patient_name,
+                    performed_by_id=panel.lab_test_request.requested_by_id,
+                ))
+
+        consumed = {
+            counter.pk: counter.available_tests - available[reagent_id]
+            for reagent_id, counter in counters.items()
+            if available[reagent_id] != counter.available_tests
+        }
+        if consumed:
+            TestKitCounter.objects.using(using).filter(pk__in=consumed).update(
+                available_tests=F('available_tests') - Case(
+                    *[When(pk=pk, then=Value(tests)) for pk, tests in consumed.items()],
+                    output_field=IntegerField(),
+                ),
+                last_updated=timezone.now(),
+            )
+        ReagentConsumptionLog.objects.using(using).bulk_create(logs, batch_size=1000)
+
+    for reagent_id, counter in counters.items():
+        counter.available_tests = available[reagent_id]
+        if counter.is_out_of_stock():
+            logger.error("Reagent item %s is out of stock (%d tests) after billed lab tests", reagent_id, counter.available_tests)
+        elif counter.is_low_stock():
+            logger.warning("Reagent item %s is low on stock: %d tests remaining", reagent_id, counter.available_tests)
+
+    logger.info("Deducted reagents for %d billed lab test panel(s)", len(panels))
+    return len(panels)
+
+
+def deduct_pending_reagents(panel_ids=None, batch_size=500, using=DEFAULT_DB_ALIAS):
+    '''Deduct reagents for every pending panel, batch by batch; returns the count.'''
+    deducted = 0
+    while True:
+        count = deduct_batch(panel_ids=panel_ids, batch_size=batch_size, using=using)
+        deducted += count
+        if count < batch_size:
+            return deducted
@@ -0,0 +1,171 @@
+'''
+In-process index of ReferenceValue ranges, for flagging lab results.
+
+Per LabTestPanel the index keeps, per sex, the panel's age intervals sorted
+by age_min. Panels are loaded on first use, all missing panels of a request
+in one query. Saving or deleting a ReferenceValue replaces a version token
+in the shared cache; every process compares it once per lookup call (or,
+given a serializer context, once per response) and drops its index when it
+has moved on.
+
+Matching follows the previous per-panel queries: sex equal to the
+patient's, age_min <= age <= age_max, lowest id first; patients whose sex
+is neither M nor F fall back to the male ranges.
+'''
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ReferenceValue
+
+
+ReferenceRange = namedtuple('ReferenceRange', ['low', 'high', 'critical_low', 'critical_high'])
+
+VERSION_KEY = 'laboratory:reference-ranges:version'
+CONTEXT_KEY = 'reference_ranges_version'
+
+_lock = threading.Lock()
+_index = {}
+_index_version = None
+
+
+def _shared_version():
+    try:
+        # A fresh token whenever the key is missing, e.g. after a cache flush
+        return cache.get_or_set(VERSION_KEY, lambda: uuid4().hex, None)
+    except Exception:
+        # No shared cache: rely on this process's own invalidation
+        return _index_version
+
+
+def _bump_version():
+    global _index_version
+    try:
+        cache.set(VERSION_KEY, uuid4().hex, None)
+    except Exception:
+        pass
+    with _lock:
+        _index.clear()
+        _index_version = None
+
+
+def invalidate_reference_ranges():
+    '''Drop the index here and, once the change is committed, everywhere.'''
+    _bump_version()
+    transaction.on_commit(_bump_version)
+
+
+def _load(panel_ids):
+    loaded = {panel_id: {} for panel_id in panel_ids}
+    values = ReferenceValue.objects.filter(
+        lab_test_panel_id__in=panel_ids, age_min__isnull=False, age_max__isnull=False,
+    ).order_by('age_min', 'id').values_list(
+        'lab_test_panel_id', 'sex', 'age_min', 'age_max', 'id',
+        'ref_value_low', 'ref_value_high', 'critical_low', 'critical_high',
+    )
+    for panel_id, sex, age_min, age_max, pk, low, high, critical_low, critical_high in values:
+        intervals = loaded[panel_id].setdefault(sex, ([], []))
+        intervals[0].append(age_min)
+        intervals[1].append((age_max, pk, ReferenceRange(low, high, critical_low, critical_high)))
+    return loaded
+
+
+def _context_version(context):
+    '''The shared version, checked once per serializer context.'''
+    if CONTEXT_KEY not in context:
+        context[CONTEXT_KEY] = _shared_version()
+    return context[CONTEXT_KEY]
+
+
+def _panels(panel_ids, context=None):
+    '''The index entries of `panel_ids`, loading the missing ones.'''
+    global _index_version
+    version = _shared_version() if context is None else _context_version(context)
+    with _lock:
+        if version != _index_version:
+            _index.clear()
+            _index_version = version
+        missing = [panel_id for panel_id in panel_ids if panel_id not in _index]
+
+    if missing:
+        loaded = _load(missing)
+        with _lock:
+            if _index_version == version:
+                _index.update(loaded)
+    else:
+        loaded = {}
+
+    with _lock:
+        return {panel_id: _index.get(panel_id) or loaded.get(panel_id) or {} for panel_id in panel_ids}
+
+
+def _match(by_sex, sex, age):
+    intervals = by_sex.get(sex)
+    if not intervals:
+        return None
+    starts, rest = intervals
+    best = None
+    # Intervals starting at or before `age`; keep the lowest id that covers it
+    for age_max, pk, reference in rest[:bisect_right(starts, age)]:
+        if age_max >= age and (best is None or pk < best[0]):
+            best = (pk, reference)
+    return best[1] if best else None
+
+
+def _lookup(by_sex, patient):
+    age = patient.age
+    if age is None:
+        return None
+    reference = _match(by_sex, patient.gender, age)
+    if reference is None and patient.gender not in ['M', 'F']:
+        reference = _match(by_sex, 'M', age)
+    return reference
+
+
+def reference_range(panel_id, patient, context=None):
+    '''
+    The ReferenceRange of a LabTestPanel for `patient`, or None. Serializers
+    pass their context so a list checks the shared version once, not per row.
+    '''
+    return _lookup(_panels([panel_id], context)[panel_id], patient)
+
+
+def flag_result(result, reference):
+    """'Critical Low', 'Low', 'Normal', 'High', 'Critical High', or None for non-numeric results."""
+    if reference is None or result in (None, ''):
+        return None
+    try:
+        value = Decimal(str(result).strip())
+    except InvalidOperation:
+        return None
+    if not value.is_finite():
+        return None
+    if reference.critical_low is not None and value < reference.critical_low:
+        return 'Critical Low'
+    if reference.critical_high is not None and value > reference.critical_high:
+        return 'Critical High'
+    if value < reference.low:
+        return 'Low'
+    if value > reference.high:
+        return 'High'
+    return 'Normal'
+
+
+def flag_results(panels, patient):
+    '''
+    Flag every LabTestRequestPanel of a request for `patient` in one pass:
+    {panel id: {'flag', 'reference'}}, where reference is a ReferenceRange
+    or None.
+    '''
+    panels = list(panels)
+    index = _panels({panel.test_panel_id for panel in panels})
+    results = {}
+    for panel in panels:
+        reference = _lookup(index[panel.test_panel_id], patient) if patient else None
+        results[panel.pk] = {'flag': flag_result(panel.result, reference), 'reference': reference}
+    return results
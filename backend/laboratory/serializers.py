@@ -1,10 +1,10 @@
 import pdb
 from random import randrange, choices
 from rest_framework import serializers
-from rest_framework.exceptions import NotFound
+from easymed.serializers import SparseFieldsetMixin
 
 from customuser.models import CustomUser
-from inventory.models import Inventory
+from inventory.summary import get_item_stock
 from .models import (
     LabReagent,
     LabTestRequest, 
@@ -32,6 +32,7 @@ from .models import (
     RetestSample,
     ReleasedSample
     )
+from .reference_ranges import reference_range
 
 
 class TestKitSerializer(serializers.ModelSerializer):
@@ -58,7 +59,7 @@ class LabTestProfileSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class LabTestPanelSerializer(serializers.ModelSerializer):
+class LabTestPanelSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     reference_values = serializers.SerializerMethodField()
     item_name = serializers.ReadOnlyField(source='item.name')
     test_profile_name = serializers.ReadOnlyField(source='test_profile.name')
@@ -73,7 +74,8 @@ class LabTestPanelSerializer(serializers.ModelSerializer):
         # Assuming `patient` is passed to the serializer context
         patient = self.context.get('patient')
         if patient:
-            return obj.get_reference_values(patient)
+            reference = reference_range(obj.pk, patient, self.context)
+            return dict(reference._asdict()) if reference else None
         return None
     
 
@@ -93,7 +95,7 @@ class LabTestProfileSerializer(serializers.ModelSerializer):
         fields = '__all__'        
 
 
-class LabTestRequestPanelSerializer(serializers.ModelSerializer):
+class LabTestRequestPanelSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     test_panel_name = serializers.ReadOnlyField(source='test_panel.name')
     item = serializers.CharField(source='test_panel.item.id', read_only=True)
     sale_price = serializers.SerializerMethodField()
@@ -106,13 +108,8 @@ class LabTestRequestPanelSerializer(serializers.ModelSerializer):
     tat = serializers.DurationField(source='test_panel.tat', read_only=True)
 
     def get_sale_price(self, instance):
-        try:
-            inventory = instance.test_panel.item.active_inventory_items.first()
-            if inventory:
-                return inventory.sale_price
-            return None  # Handle case where no inventory is found
-        except Inventory.DoesNotExist:
-            raise NotFound('Inventory record not found for this item.')
+        # None when the item has never been stocked
+        return get_item_stock(instance.test_panel.item_id)['sale_price']
         
     def get_patient_name(self, instance):
         if instance.patient_sample and instance.patient_sample.process:
@@ -136,29 +133,8 @@ class LabTestRequestPanelSerializer(serializers.ModelSerializer):
         patient = self._get_patient(instance)
         if not patient:
             return None
-
-        reference_value = instance.test_panel.reference_values.filter(
-            sex=patient.gender,
-            age_min__lte=patient.age,
-            age_max__gte=patient.age
-        ).first()
-        
-        # If no exact match for gender (e.g., gender 'O'), try male reference values as fallback
-        if not reference_value and patient.gender not in ['M', 'F']:
-            reference_value = instance.test_panel.reference_values.filter(
-                sex='M',
-                age_min__lte=patient.age,
-                age_max__gte=patient.age
-            ).first()
-
-        if reference_value:
-            return {
-                "low": reference_value.ref_value_low,
-                "high": reference_value.ref_value_high,
-                "critical_low": reference_value.critical_low,
-                "critical_high": reference_value.critical_high,
-            }
-        return None
+        reference = reference_range(instance.test_panel_id, patient, self.context)
+        return dict(reference._asdict()) if reference else None
     
     def _get_patient(self, instance):
         # Helper method to get the patient object
@@ -191,7 +167,26 @@ class LabTestRequestPanelSerializer(serializers.ModelSerializer):
         ]
 
 
-class LabTestRequestSerializer(serializers.ModelSerializer):
+class BulkLabTestRequestPanelSerializer(serializers.Serializer):
+    '''
+    A lab order for LabTestRequestPanelViewSet.bulk: the request and the
+    LabTestPanel ids to order, resolved with one query.
+    '''
+    lab_test_request = serializers.PrimaryKeyRelatedField(queryset=LabTestRequest.objects.all())
+    test_panels = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=500)
+
+    def validate_test_panels(self, test_panel_ids):
+        test_panels = LabTestPanel.objects.in_bulk(set(test_panel_ids))
+        errors = [
+            {} if pk in test_panels else {'test_panel': [f'Invalid pk "{pk}" - object does not exist.']}
+            for pk in test_panel_ids
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [test_panels[pk] for pk in test_panel_ids]
+
+
+class LabTestRequestSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     patient_first_name = serializers.ReadOnlyField(source='patient.first_name')
     patient_last_name = serializers.ReadOnlyField(source='patient.second_name')
     test_profile_name = serializers.ReadOnlyField(source='test_profile.name')
@@ -210,7 +205,7 @@ class ProcessTestRequestSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PatientSampleSerializer(serializers.ModelSerializer):
+class PatientSampleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     specimen_name = serializers.SerializerMethodField()
     is_archived = serializers.SerializerMethodField()
     is_disposed = serializers.SerializerMethodField()
@@ -254,6 +249,38 @@ class PatientSampleSerializer(serializers.ModelSerializer):
     def get_is_released(self, obj):
         return hasattr(obj, 'release_record')
 
+
+class LabWorkListSerializer(PatientSampleSerializer):
+    '''
+    PatientSampleSerializer for the lab work list. Reads only what
+    LabWorkListViewSet has joined or annotated, so serializing a page costs
+    no extra queries per row.
+    '''
+    specimen_name = serializers.ReadOnlyField(source='specimen.name')
+    bench = serializers.ReadOnlyField(source='lab_test_request.test_profile_id')
+    bench_name = serializers.ReadOnlyField(source='lab_test_request.test_profile.name')
+    patient_id = serializers.SerializerMethodField()
+    patient_name = serializers.SerializerMethodField()
+    is_archived = serializers.BooleanField(read_only=True)
+    is_disposed = serializers.BooleanField(read_only=True)
+    is_retested = serializers.BooleanField(read_only=True)
+    is_released = serializers.BooleanField(read_only=True)
+
+    class Meta(PatientSampleSerializer.Meta):
+        fields = PatientSampleSerializer.Meta.fields + ['bench', 'bench_name', 'patient_id', 'patient_name']
+
+    def _patient(self, obj):
+        attendance = getattr(obj.process, 'attendanceprocess', None) if obj.process else None
+        return attendance.patient if attendance else None
+
+    def get_patient_id(self, obj):
+        patient = self._patient(obj)
+        return patient.id if patient else None
+
+    def get_patient_name(self, obj):
+        patient = self._patient(obj)
+        return f"{patient.first_name} {patient.second_name}" if patient else None
+
 class SpecimenSerializer(serializers.ModelSerializer):
     class Meta:
         model = Specimen
@@ -392,7 +419,7 @@ class ArchivePositionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PatientSampleArchiveSerializer(serializers.ModelSerializer):
+class PatientSampleArchiveSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     patient_sample_code = serializers.ReadOnlyField(source='patient_sample.patient_sample_code')
     position_name = serializers.ReadOnlyField(source='position.name')
     created_by_name = serializers.ReadOnlyField(source='created_by.get_fullname')
@@ -1,14 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
+from django.db import transaction
 from django.dispatch import receiver
-from .models import LabTestRequestPanel, PatientSampleArchive, DisposedSample, RetestSample
-from laboratory.tasks import deduct_test_kit
+from .models import LabTestRequestPanel, PatientSampleArchive, DisposedSample, RetestSample, ReferenceValue
+from .reference_ranges import invalidate_reference_ranges
+from .reagents import schedule_reagent_deduction
 
 @receiver(post_save, sender=LabTestRequestPanel)
 def trigger_test_kit_deduction(sender, instance, **kwargs):
+    # Deduction runs skip panels already deducted, so later saves consume nothing
     if instance.is_billed:
-        deduct_test_kit.delay(instance.id)
-
-    print("Test Counter Signal Triggered")
+        transaction.on_commit(schedule_reagent_deduction)
 
 
 @receiver(post_save, sender=PatientSampleArchive)
@@ -30,4 +31,9 @@ def handle_archive_action(sender, instance, **kwargs):
             archiving_date=instance.archiving_date,
             retested_by=instance.created_by,
         )
-        PatientSampleArchive.objects.filter(pk=instance.pk).delete()
\ No newline at end of file
+        PatientSampleArchive.objects.filter(pk=instance.pk).delete()
+
+
+@receiver([post_save, post_delete], sender=ReferenceValue)
+def refresh_reference_ranges(sender, instance, **kwargs):
+    invalidate_reference_ranges()
@@ -0,0 +1,42 @@
+'''
+Turnaround-time (TAT) queries over the columns LabTestRequestPanel stamps:
+sample_collected_at and tat_deadline when the sample is collected,
+tat_status when the result is approved.
+'''
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import LabTestRequestPanel
+
+
+def late_pending_count(now=None):
+    '''Unapproved panels past their deadline; an index range count.'''
+    return LabTestRequestPanel.objects.filter(
+        tat_status=LabTestRequestPanel.TAT_PENDING,
+        tat_deadline__lt=now or timezone.now(),
+    ).count()
+
+
+def collected_between(start, end):
+    '''Panels whose samples were collected in [start, end).'''
+    return LabTestRequestPanel.objects.filter(sample_collected_at__gte=start, sample_collected_at__lt=end)
+
+
+def hourly_rollups(start, end):
+    '''
+    Per test panel and hour of collection: tests, passed, failed, pending
+    and the average turnaround of approved tests.
+    '''
+    return collected_between(start, end).annotate(
+        hour=TruncHour('sample_collected_at'),
+    ).values('hour', 'test_panel_id', 'test_panel__name').annotate(
+        tests=Count('id'),
+        passed=Count('id', filter=Q(tat_status=LabTestRequestPanel.TAT_PASSED)),
+        failed=Count('id', filter=Q(tat_status=LabTestRequestPanel.TAT_FAILED)),
+        pending=Count('id', filter=Q(tat_status=LabTestRequestPanel.TAT_PENDING)),
+        average_turnaround=Avg(
+            ExpressionWrapper(F('approved_on') - F('sample_collected_at'), output_field=DurationField()),
+            filter=Q(result_approved=True),
+        ),
+    ).order_by('hour', 'test_panel__name')
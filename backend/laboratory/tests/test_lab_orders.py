@@ -0,0 +1,63 @@
+import pytest
+
+from laboratory.models import LabTestPanel, LabTestRequestPanel, PatientSample, Specimen
+
+
+BULK_URL = '/lab/lab-test-requests-panel/bulk/'
+
+
+@pytest.fixture
+def chemistry_panels(lab_test_profile, item, specimen):
+    urine = Specimen.objects.create(name="Urine")
+    panels = [
+        LabTestPanel.objects.create(name=f"Analyte {i}", test_profile=lab_test_profile, item=item, specimen=specimen)
+        for i in range(24)
+    ]
+    panels.append(LabTestPanel.objects.create(
+        name="Urine protein", test_profile=lab_test_profile, item=item, specimen=urine, is_quantitative=False,
+    ))
+    return panels
+
+
+@pytest.mark.django_db
+def test_bulk_order_creates_panels_and_missing_samples(
+    authenticated_admin_client, lab_test_request, patient_sample, chemistry_panels, django_assert_max_num_queries
+):
+    with django_assert_max_num_queries(20):
+        response = authenticated_admin_client.post(BULK_URL, {
+            'lab_test_request': lab_test_request.id,
+            'test_panels': [panel.id for panel in chemistry_panels],
+        }, content_type='application/json')
+
+    assert response.status_code == 201
+    rows = response.json()
+    assert [row['test_panel'] for row in rows] == [panel.id for panel in chemistry_panels]
+    assert len({row['test_code'] for row in rows}) == 25
+
+    # Blood panels share the sample already collected; urine gets a new one
+    assert {row['patient_sample'] for row in rows[:24]} == {patient_sample.id}
+    urine_sample = PatientSample.objects.get(pk=rows[24]['patient_sample'])
+    assert urine_sample.process_id == lab_test_request.process_id
+    assert urine_sample.patient_sample_code.startswith("DDLR")
+    assert rows[24]['category'] == 'none'
+
+    blood_panel = LabTestRequestPanel.objects.get(pk=rows[0]['id'])
+    assert blood_panel.category == 'quantitative'
+    assert blood_panel.sample_collected_at == patient_sample.collected_on
+    assert blood_panel.tat_status == LabTestRequestPanel.TAT_PENDING
+
+    # Codes keep coming from the same sequence as single saves
+    single = LabTestRequestPanel.objects.create(lab_test_request=lab_test_request, test_panel=chemistry_panels[0])
+    assert single.test_code not in {row['test_code'] for row in rows}
+
+
+@pytest.mark.django_db
+def test_bulk_order_reports_unknown_panels(authenticated_admin_client, lab_test_request, chemistry_panels):
+    response = authenticated_admin_client.post(BULK_URL, {
+        'lab_test_request': lab_test_request.id,
+        'test_panels': [chemistry_panels[0].id, 999999],
+    }, content_type='application/json')
+
+    assert response.status_code == 400
+    assert response.json()['test_panels'][1]['test_panel']
+    assert not LabTestRequestPanel.objects.exists()
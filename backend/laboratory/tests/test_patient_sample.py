@@ -1,12 +1,14 @@
 import pytest
+from company.models import NumberSequence
 from laboratory.models import LabTestRequestPanel, LabTestRequest, PatientSample, LabTestProfile
 from django.db import transaction
 from django.utils import timezone
 
 @pytest.mark.django_db
 def test_generate_sample_code_first_sample(patient_sample):
-    """Test generating code when it's the first sample."""
+    """Test generating code when it's the first sample of the year."""
     PatientSample.objects.all().delete() # Ensure no previous samples
+    NumberSequence.objects.filter(name='patient_sample').delete() # and no counter for this year yet
 
     new_sample = PatientSample.objects.create(
         lab_test_request=patient_sample.lab_test_request,
@@ -21,8 +23,9 @@ def test_generate_sample_code_first_sample(patient_sample):
 @pytest.mark.django_db  
 def test_generate_sample_code_new_year_reset(patient_sample):
     """Test generating code when the year changes and the number resets."""
-    # Clear all existing samples to start fresh
+    # Clear all existing samples and this year's counter to start fresh
     PatientSample.objects.all().delete()
+    NumberSequence.objects.filter(name='patient_sample').delete()
     
     current_year = timezone.now().year
     PatientSample.objects.create(
@@ -41,3 +44,20 @@ def test_generate_sample_code_new_year_reset(patient_sample):
     )
 
     assert new_sample.patient_sample_code == f"DDLR00001-{current_year}"  
+
+
+@pytest.mark.django_db
+def test_generate_sample_code_does_not_reuse_deleted_codes(patient_sample):
+    """Codes come from the yearly counter, so a deleted sample's code is never handed out again."""
+    deleted_code = patient_sample.patient_sample_code
+    PatientSample.objects.all().delete()
+
+    new_sample = PatientSample.objects.create(
+        lab_test_request=patient_sample.lab_test_request,
+        specimen=patient_sample.specimen,
+        process=patient_sample.process,
+        is_sample_collected=True
+    )
+
+    assert new_sample.patient_sample_code != deleted_code
+    assert new_sample.patient_sample_code == f"DDLR00002-{timezone.now().year}"
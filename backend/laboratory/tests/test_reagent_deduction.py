@@ -0,0 +1,72 @@
+import pytest
+
+from inventory.models import Item
+from laboratory.models import (
+    LabTestPanel, LabTestRequestPanel, ReagentConsumptionLog, ReagentDeduction, TestKitCounter, TestPanelReagent,
+)
+from laboratory.reagents import deduct_pending_reagents
+from laboratory.tasks import deduct_test_kit
+
+
+@pytest.fixture
+def reagent():
+    return Item.objects.create(
+        name="CBC Reagent",
+        desc="Haematology reagent",
+        category="LabReagent",
+        units_of_measure="Unit",
+        vat_rate=16.0,
+        item_code="RGT001",
+    )
+
+
+@pytest.fixture
+def request_panels(lab_test_request, lab_test_profile, specimen, item, reagent):
+    test_panel = LabTestPanel.objects.create(
+        name="Haemoglobin", test_profile=lab_test_profile, item=item, specimen=specimen,
+    )
+    TestPanelReagent.objects.create(test_panel=test_panel, reagent_item=reagent, tests_consumed_per_run=2)
+    return [
+        LabTestRequestPanel.objects.create(lab_test_request=lab_test_request, test_panel=test_panel)
+        for _ in range(2)
+    ]
+
+
+@pytest.mark.django_db
+def test_billed_panels_are_deducted_once(request_panels, reagent, django_capture_on_commit_callbacks):
+    counter = TestKitCounter.objects.create(reagent_item=reagent, available_tests=20)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        for panel in request_panels:
+            panel.is_billed = True
+            panel.save()
+
+    counter.refresh_from_db()
+    assert counter.available_tests == 16
+    logs = ReagentConsumptionLog.objects.order_by('id').values_list('available_tests_before', 'available_tests_after')
+    assert list(logs) == [(20, 18), (18, 16)]
+
+    # Entering a result saves the panel again
+    with django_capture_on_commit_callbacks(execute=True):
+        request_panels[0].result = "13.5"
+        request_panels[0].save()
+
+    counter.refresh_from_db()
+    assert counter.available_tests == 16
+    assert ReagentConsumptionLog.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_deduction_is_keyed_on_the_panel(request_panels, reagent):
+    LabTestRequestPanel.objects.filter(pk__in=[panel.pk for panel in request_panels]).update(is_billed=True)
+
+    deduct_test_kit(request_panels[0].pk)
+    deduct_test_kit(request_panels[0].pk)
+
+    # A missing counter is created and goes negative rather than losing the usage
+    assert TestKitCounter.objects.get(reagent_item=reagent).available_tests == -2
+    assert list(ReagentDeduction.objects.values_list('lab_test_request_panel_id', flat=True)) == [request_panels[0].pk]
+
+    assert deduct_pending_reagents() == 1
+    assert deduct_pending_reagents() == 0
+    assert TestKitCounter.objects.get(reagent_item=reagent).available_tests == -4
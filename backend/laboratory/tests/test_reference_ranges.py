@@ -0,0 +1,81 @@
+import pytest
+from decimal import Decimal
+from unittest import mock
+
+from laboratory import reference_ranges
+from laboratory.models import LabTestPanel, ReferenceValue
+from laboratory.serializers import LabTestPanelSerializer
+from laboratory.reference_ranges import ReferenceRange, flag_result, reference_range
+
+
+@pytest.fixture
+def lab_test_panel(lab_test_profile, item):
+    return LabTestPanel.objects.create(name="Haemoglobin", test_profile=lab_test_profile, item=item)
+
+
+def add_range(panel, sex, age_min, age_max, low, high, **critical):
+    return ReferenceValue.objects.create(
+        lab_test_panel=panel, sex=sex, age_min=age_min, age_max=age_max,
+        ref_value_low=low, ref_value_high=high, **critical,
+    )
+
+
+@pytest.mark.django_db
+def test_reference_range_matches_sex_and_age(lab_test_panel, patient):
+    add_range(lab_test_panel, 'F', 0, 17, 10, 14)
+    adult = add_range(lab_test_panel, 'F', 18, 64, 12, 16)
+    add_range(lab_test_panel, 'F', 30, 40, 11, 15)  # overlaps; the older row wins
+    add_range(lab_test_panel, 'M', 18, 64, 13, 17)
+
+    reference = reference_range(lab_test_panel.pk, patient)
+
+    assert reference == ReferenceRange(adult.ref_value_low, adult.ref_value_high, None, None)
+
+    patient.gender = 'O'
+    assert reference_range(lab_test_panel.pk, patient).low == Decimal('13')
+
+    patient.date_of_birth = None
+    assert reference_range(lab_test_panel.pk, patient) is None
+
+
+@pytest.mark.django_db
+def test_index_is_reused_until_a_range_changes(lab_test_panel, patient, django_assert_num_queries):
+    value = add_range(lab_test_panel, 'F', 18, 64, 12, 16)
+    reference_range(lab_test_panel.pk, patient)
+
+    with django_assert_num_queries(0):
+        assert reference_range(lab_test_panel.pk, patient).high == Decimal('16')
+
+    value.ref_value_high = 15
+    value.save()
+    assert reference_range(lab_test_panel.pk, patient).high == Decimal('15')
+
+    value.delete()
+    assert reference_range(lab_test_panel.pk, patient) is None
+
+
+
+@pytest.mark.django_db
+def test_serializer_checks_the_version_once_per_response(lab_test_panel, lab_test_profile, item, patient):
+    other_panel = LabTestPanel.objects.create(name="Platelets", test_profile=lab_test_profile, item=item)
+    add_range(lab_test_panel, 'F', 18, 64, 12, 16)
+    add_range(other_panel, 'F', 18, 64, 150, 400)
+
+    with mock.patch.object(reference_ranges, '_shared_version', wraps=reference_ranges._shared_version) as check:
+        data = LabTestPanelSerializer(
+            [lab_test_panel, other_panel, lab_test_panel], many=True, context={'patient': patient},
+        ).data
+
+    assert [row['reference_values']['high'] for row in data] == [Decimal('16'), Decimal('400'), Decimal('16')]
+    assert check.call_count == 1
+
+def test_flag_result():
+    reference = ReferenceRange(Decimal('12'), Decimal('16'), Decimal('7'), Decimal('20'))
+
+    assert flag_result('6.9', reference) == 'Critical Low'
+    assert flag_result('11', reference) == 'Low'
+    assert flag_result('14', reference) == 'Normal'
+    assert flag_result('16.5', reference) == 'High'
+    assert flag_result('21', reference) == 'Critical High'
+    assert flag_result('positive', reference) is None
+    assert flag_result('14', None) is None
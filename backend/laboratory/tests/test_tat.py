@@ -0,0 +1,64 @@
+import pytest
+from datetime import timedelta
+
+from django.utils import timezone
+
+from laboratory.models import LabTestPanel, LabTestRequestPanel, Specimen
+from laboratory.tat import hourly_rollups, late_pending_count
+
+
+@pytest.fixture
+def blood():
+    return Specimen.objects.create(name="Blood")
+
+
+@pytest.fixture
+def test_panel(lab_test_profile, item, blood):
+    return LabTestPanel.objects.create(
+        name="Glucose", test_profile=lab_test_profile, item=item, specimen=blood, tat=timedelta(minutes=30),
+    )
+
+
+@pytest.mark.django_db
+def test_collecting_the_sample_starts_the_clock(lab_test_request, test_panel):
+    panel = LabTestRequestPanel.objects.create(lab_test_request=lab_test_request, test_panel=test_panel)
+    assert panel.tat_status is None
+
+    sample = panel.patient_sample
+    sample.is_sample_collected = True
+    sample.save()
+
+    panel.refresh_from_db()
+    assert panel.sample_collected_at == sample.collected_on
+    assert panel.tat_deadline == sample.collected_on + timedelta(minutes=30)
+    assert panel.tat_status == LabTestRequestPanel.TAT_PENDING
+    assert late_pending_count() == 0
+    assert late_pending_count(now=panel.tat_deadline + timedelta(minutes=1)) == 1
+
+
+@pytest.mark.django_db
+def test_approval_settles_the_status(lab_test_request, test_panel):
+    on_time, late = [
+        LabTestRequestPanel.objects.create(lab_test_request=lab_test_request, test_panel=test_panel)
+        for _ in range(2)
+    ]
+    sample = on_time.patient_sample
+    sample.is_sample_collected = True
+    sample.save()
+
+    for panel, approved_on in [(on_time, sample.collected_on + timedelta(minutes=20)),
+                               (late, sample.collected_on + timedelta(minutes=45))]:
+        panel.refresh_from_db()
+        panel.result = "5.4"
+        panel.result_approved = True
+        panel.approved_on = approved_on
+        panel.save()
+
+    assert LabTestRequestPanel.objects.get(pk=on_time.pk).tat_status == LabTestRequestPanel.TAT_PASSED
+    assert LabTestRequestPanel.objects.get(pk=late.pk).tat_status == LabTestRequestPanel.TAT_FAILED
+
+    now = timezone.now()
+    [rollup] = hourly_rollups(now - timedelta(days=1), now + timedelta(hours=1))
+    assert rollup['test_panel_id'] == test_panel.pk
+    assert (rollup['tests'], rollup['passed'], rollup['failed'], rollup['pending']) == (2, 1, 1, 0)
+    assert rollup['average_turnaround'] == timedelta(minutes=32, seconds=30)
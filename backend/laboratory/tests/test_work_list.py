@@ -0,0 +1,66 @@
+import pytest
+from datetime import date
+
+from laboratory.models import DisposedSample, LabTestProfile, LabTestRequest, PatientSample, ReleasedSample, Specimen
+from patient.models import AttendanceProcess
+
+
+WORK_LIST_URL = '/lab/work-list/'
+
+
+@pytest.fixture
+def samples(user, patient, lab_test_profile):
+    visit = AttendanceProcess.objects.create(patient=patient, reason="Fever", created_by=user)
+    lab_test_request = LabTestRequest.objects.create(
+        process=visit.process_test_req,
+        test_profile=lab_test_profile,
+        requested_by=user,
+        requested_on=date.today(),
+        created_on=date.today(),
+    )
+    blood, urine, stool = [Specimen.objects.create(name=name) for name in ("Blood", "Urine", "Stool")]
+    collected = PatientSample.objects.create(lab_test_request=lab_test_request, specimen=blood, is_sample_collected=True)
+    disposed = PatientSample.objects.create(lab_test_request=lab_test_request, specimen=urine, is_sample_collected=True)
+    pending = PatientSample.objects.create(lab_test_request=lab_test_request, specimen=stool)
+
+    DisposedSample.objects.create(
+        patient_sample_code=disposed.patient_sample_code, position_name="A1", archiving_date=date.today(),
+    )
+    ReleasedSample.objects.create(
+        patient_sample=disposed, patient_sample_code=disposed.patient_sample_code,
+        facility_name="Referral Lab", receiving_lab_tech="Jane",
+    )
+    return collected, disposed, pending
+
+
+@pytest.mark.django_db
+def test_work_list_annotates_sample_status(authenticated_admin_client, samples, patient, django_assert_max_num_queries):
+    collected, disposed, pending = samples
+
+    with django_assert_max_num_queries(3):
+        response = authenticated_admin_client.get(WORK_LIST_URL)
+
+    assert response.status_code == 200
+    rows = {row['id']: row for row in response.json()['results']}
+    assert rows[disposed.id]['is_disposed'] is True
+    assert rows[disposed.id]['is_released'] is True
+    assert rows[collected.id]['is_disposed'] is False
+    assert rows[collected.id]['is_archived'] is False
+    assert rows[collected.id]['patient_id'] == patient.id
+    assert rows[collected.id]['specimen_name'] == "Blood"
+    assert rows[pending.id]['is_sample_collected'] is False
+
+
+@pytest.mark.django_db
+def test_work_list_filters(authenticated_admin_client, samples, lab_test_profile):
+    collected, disposed, pending = samples
+
+    def ids(**params):
+        return [row['id'] for row in authenticated_admin_client.get(WORK_LIST_URL, params).json()['results']]
+
+    assert ids(status='collected') == [collected.id]
+    assert ids(status='disposed') == [disposed.id]
+    assert ids(status='pending') == [pending.id]
+    assert ids(specimen=pending.specimen_id) == [pending.id]
+    assert ids(bench=lab_test_profile.id) == [pending.id, disposed.id, collected.id]
+    assert ids(bench=LabTestProfile.objects.create(name="Microbiology").id) == []
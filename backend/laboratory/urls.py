@@ -35,7 +35,8 @@ from .views import (
     PatientSampleArchiveViewSet,
     DisposedSampleViewSet,
     RetestSampleViewSet,
-    ReleasedSampleViewSet
+    ReleasedSampleViewSet,
+    LabWorkListViewSet,
 )
 
 router = DefaultRouter()
@@ -48,6 +49,7 @@ router.register(r'lab-equipment', LabEquipmentViewSet)
 router.register(r'public-lab-test-request', PublicLabTestRequestViewSet)
 router.register(r'process-test-request', ProcessTestRequestViewSet)
 router.register(r'patient-samples', PatientSampleViewSet)
+router.register(r'work-list', LabWorkListViewSet, basename='work-list')
 router.register(r'specimens', SpecimenViewSet)
 router.register(r'reference-values', ReferenceValueViewSet)
 router.register(r'lab-test-interpretations', LabTestInterpretationViewSet)
@@ -4,16 +4,19 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework import generics, viewsets, status
+from rest_framework.pagination import CursorPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.core.paginator import Paginator
 from django.template.loader import get_template, render_to_string
-from weasyprint import HTML
-from django.db.models import F
+from reports.pdf import get_company_logo_data_uri, pdf_response, write_pdf
+from django.db.models import Exists, F, OuterRef
 
 from company.models import Company
 from patient.models import Patient
@@ -59,6 +62,8 @@ from .serializers import (
     LabTestRequestPanelSerializer,
     ProcessTestRequestSerializer,
     PatientSampleSerializer,
+    LabWorkListSerializer,
+    BulkLabTestRequestPanelSerializer,
     SpecimenSerializer,
     TestKitCounterSerializer,
     TestKitSerializer,
@@ -91,7 +96,11 @@ from authperms.permissions import (
 # filters
 from .filters import (
     LabTestRequestFilter,
+    LabWorkListFilter,
 )
+from .orders import create_request_panels
+from .reference_ranges import flag_results
+from .tat import collected_between, hourly_rollups, late_pending_count
 
 
 class TestKitViewSet(viewsets.ModelViewSet):
@@ -208,7 +217,9 @@ class LabTestRequestByPatientIdAPIView(APIView):
  
 
 class LabTestRequestPanelViewSet(viewsets.ModelViewSet):
-    queryset = LabTestRequestPanel.objects.all()
+    queryset = LabTestRequestPanel.objects.select_related(
+        'test_panel', 'patient_sample__process__attendanceprocess__patient',
+    )
     serializer_class = LabTestRequestPanelSerializer
     permission_classes = (IsDoctorUser | IsNurseUser | IsLabTechUser | IsSystemsAdminUser | IsReceptionistUser,)
 
@@ -219,13 +230,44 @@ class LabTestRequestPanelViewSet(viewsets.ModelViewSet):
             context['patient'] = get_object_or_404(Patient, id=patient_id)
         return context
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        '''
+        Order several panels of a lab test request at once:
+        POST /lab/lab-test-requests-panel/bulk/
+        {"lab_test_request": 1, "test_panels": [3, 4, 5]}
+
+        Samples, codes and panels are created in bulk by laboratory.orders.
+        '''
+        req_ser = BulkLabTestRequestPanelSerializer(data=request.data)
+        req_ser.is_valid(raise_exception=True)
+
+        panels = create_request_panels(
+            req_ser.validated_data['lab_test_request'], req_ser.validated_data['test_panels'],
+        )
+
+        return Response([
+            {
+                'id': panel.id,
+                'test_code': panel.test_code,
+                'test_panel': panel.test_panel_id,
+                'test_panel_name': panel.test_panel.name,
+                'lab_test_request': panel.lab_test_request_id,
+                'patient_sample': panel.patient_sample_id,
+                'category': panel.category,
+            }
+            for panel in panels
+        ], status=status.HTTP_201_CREATED)
+
 
 class LabTestRequestPanelByLabTestRequestId(generics.ListAPIView):
     serializer_class = LabTestRequestPanelSerializer
 
     def get_queryset(self):
         lab_test_request_id = self.kwargs['lab_test_request_id']
-        return LabTestRequestPanel.objects.filter(lab_test_request_id=lab_test_request_id)
+        return LabTestRequestPanel.objects.filter(lab_test_request_id=lab_test_request_id).select_related(
+            'test_panel', 'patient_sample__process__attendanceprocess__patient',
+        )
     
     
 class PatientSampleByProcessId(generics.ListAPIView):
@@ -257,6 +299,40 @@ class PatientSampleViewSet(viewsets.ModelViewSet):
     queryset = PatientSample.objects.all().order_by('-id')
     serializer_class = PatientSampleSerializer
 
+
+class LabWorkListPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-id'
+
+
+class LabWorkListViewSet(viewsets.ReadOnlyModelViewSet):
+    '''
+    Sample work list polled by the lab benches.
+
+    Specimen, request profile (the bench) and patient are joined, and the
+    archived/disposed/retested/released flags are EXISTS subqueries on
+    indexed columns, so a page is a single query. Filter with ?bench=
+    (LabTestProfile id), ?specimen=, ?status= and ?process=; results are
+    keyset paginated on -id: /lab/work-list/?bench=2&status=collected
+    '''
+    serializer_class = LabWorkListSerializer
+    pagination_class = LabWorkListPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = LabWorkListFilter
+    permission_classes = (IsDoctorUser | IsNurseUser | IsLabTechUser | IsSystemsAdminUser,)
+
+    def get_queryset(self):
+        return PatientSample.objects.select_related(
+            'specimen', 'lab_test_request__test_profile', 'process__attendanceprocess__patient',
+        ).annotate(
+            is_archived=Exists(PatientSampleArchive.objects.filter(patient_sample=OuterRef('pk'))),
+            is_disposed=Exists(DisposedSample.objects.filter(patient_sample_code=OuterRef('patient_sample_code'))),
+            is_retested=Exists(RetestSample.objects.filter(patient_sample_code=OuterRef('patient_sample_code'))),
+            is_released=Exists(ReleasedSample.objects.filter(patient_sample=OuterRef('pk'))),
+        )
+
 '''
 TODO: This is not shwoing is_billed in response
 '''
@@ -270,7 +346,9 @@ class LabTestRequestPanelBySampleView(generics.ListAPIView):
         except PatientSample.DoesNotExist:
             return LabTestRequestPanel.objects.none()  # No panels if patient sample is not found
 
-        return LabTestRequestPanel.objects.filter(patient_sample=patient_sample)
+        return LabTestRequestPanel.objects.filter(patient_sample=patient_sample).select_related(
+            'test_panel', 'patient_sample__process__attendanceprocess__patient',
+        )
 
     def get(self, request, *args, **kwargs):
         patient_sample_code = self.kwargs.get('patient_sample_code')
@@ -308,7 +386,7 @@ def download_labtestresult_pdf(request, processtestrequest_id):
     # Filter panels to only include those with results
     panels = LabTestRequestPanel.objects.filter(
         lab_test_request__in=labtestrequests
-    ).exclude(result__isnull=True).exclude(result='')
+    ).exclude(result__isnull=True).exclude(result='').select_related('test_panel__test_profile')
     
     company = Company.objects.first()
 
@@ -317,7 +395,7 @@ def download_labtestresult_pdf(request, processtestrequest_id):
     patient = attendance_process.patient
 
     # Construct full logo URL for template
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
 
     first_request = labtestrequests.first() if labtestrequests.exists() else None
     first_panel = panels.first() if panels.exists() else None
@@ -346,6 +424,7 @@ def download_labtestresult_pdf(request, processtestrequest_id):
     }
 
     profile_interpretations_dict = {}
+    flags = flag_results(panels, patient)
 
     # Only process panels that have results (already filtered in the query)
     for panel in panels:
@@ -373,37 +452,12 @@ def download_labtestresult_pdf(request, processtestrequest_id):
         if panel.test_panel.is_qualitative:
             context['qualitative_panels'].append(panel_data)
         else:
-            # Fetch reference values based on the patient
-            reference_value = panel.test_panel.reference_values.filter(
-                sex=patient.gender,
-                age_min__lte=patient.age,
-                age_max__gte=patient.age
-            ).first()
-            
-            # If no exact match for gender (e.g., gender 'O'), try male reference values as fallback
-            if not reference_value and patient.gender not in ['M', 'F']:
-                reference_value = panel.test_panel.reference_values.filter(
-                    sex='M',
-                    age_min__lte=patient.age,
-                    age_max__gte=patient.age
-                ).first()
-
-            if reference_value:
-                result = panel.result
-                try:
-                    if float(result) < reference_value.ref_value_low:
-                        flag = 'Low'
-                    elif float(result) > reference_value.ref_value_high:
-                        flag = 'High'
-                    else:
-                        flag = 'Normal'
-                    
-                    panel_data['flag'] = flag
-                    panel_data['ref_value_low'] = reference_value.ref_value_low
-                    panel_data['ref_value_high'] = reference_value.ref_value_high
-                except (ValueError, TypeError):
-                    # Handle non-numeric results
-                    pass
+            flagged = flags[panel.pk]
+            # Non-numeric results keep the N/A placeholders
+            if flagged['flag']:
+                panel_data['flag'] = flagged['flag']
+                panel_data['ref_value_low'] = flagged['reference'].low
+                panel_data['ref_value_high'] = flagged['reference'].high
 
             context['quantitative_panels'].append(panel_data)
 
@@ -412,12 +466,10 @@ def download_labtestresult_pdf(request, processtestrequest_id):
     html_template = get_template('labtestresult.html').render(context)
 
 
-    pdf_file = HTML(string=html_template).write_pdf()
-
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="labtest_report_{processtestrequest_id}.pdf"'
-
-    return response
+    return pdf_response(
+        request, f'labtest_report_{processtestrequest_id}', html_template,
+        f'labtest_report_{processtestrequest_id}.pdf', disposition='attachment',
+    )
 
 
 class ReagentConsumptionLogViewSet(viewsets.ReadOnlyModelViewSet):
@@ -567,29 +619,11 @@ class LabSettingsViewSet(viewsets.ModelViewSet):
 class LabDashboardMetricsView(APIView):
     def get(self, request, *args, **kwargs):
         # 1. TAT Analysis Summary
-        now = timezone.now()
-        lab_settings = LabSettings.get_settings()
-        default_tat = timedelta(minutes=lab_settings.default_tat_minutes)
-        
-        # Tests with collected samples (for TAT analysis)
-        with_samples = LabTestRequestPanel.objects.filter(
-            patient_sample__collected_on__isnull=False
-        ).select_related('test_panel', 'patient_sample')
-        
         # Pending tests (ALL not yet approved, even without samples)
-        pending_panels = LabTestRequestPanel.objects.filter(result_approved=False)
-        pending_count = pending_panels.count()
-        
-        # Late pending tests (unapproved, with samples, duration > TAT)
-        late_pending_count = 0
-        pending_with_samples = pending_panels.filter(patient_sample__collected_on__isnull=False).select_related('test_panel', 'patient_sample')
+        pending_count = LabTestRequestPanel.objects.filter(result_approved=False).count()
         
-        for panel in pending_with_samples:
-            tat_limit = panel.test_panel.tat if panel.test_panel.tat else default_tat
-            if tat_limit:
-                duration = now - panel.patient_sample.collected_on
-                if duration > tat_limit:
-                    late_pending_count += 1
+        # Late pending tests (unapproved, with samples, past their TAT deadline)
+        late_pending = late_pending_count(timezone.now())
 
         # 2. Short Expiries for Lab Items
         today = timezone.now().date()
@@ -608,17 +642,53 @@ class LabDashboardMetricsView(APIView):
         ).count()
 
         return Response({
-            'late_pending': late_pending_count,
+            'late_pending': late_pending,
             'pending_tat': pending_count,
             'short_expiries': short_expiries_count,
             'reorder_levels': reorder_count
         })
 
+TAT_REPORT_PAGE_SIZE = 500
+TAT_REPORT_DEFAULT_DAYS = 7
+
+TAT_STATUS_DISPLAY = {
+    LabTestRequestPanel.TAT_PENDING: ("PENDING", "#ed6c02"),  # Orange
+    LabTestRequestPanel.TAT_FAILED: ("FAILED", "#d32f2f"),  # Red
+    LabTestRequestPanel.TAT_PASSED: ("PASSED", "#2e7d32"),  # Green
+}
+
+
+def _format_duration(duration):
+    # Prevent negative duration display due to timezone drift or old records
+    total_seconds = max(int(duration.total_seconds()), 0)
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes = remainder // 60
+    return f"{hours}h {minutes}m"
+
+
+def _tat_report_period(request, now):
+    '''
+    [start, end) of the TAT report from the start_date/end_date query params
+    (inclusive dates); the last TAT_REPORT_DEFAULT_DAYS days by default.
+    '''
+    def day(param):
+        try:
+            return parse_date(request.GET.get(param) or '')
+        except ValueError:
+            return None
+
+    end_date = day('end_date') or timezone.localdate(now)
+    start_date = day('start_date') or end_date - timedelta(days=TAT_REPORT_DEFAULT_DAYS - 1)
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
 def print_lab_report(request):
     report_type = request.GET.get('type')
     company = Company.objects.first()
     today = timezone.now()
-    company_logo_url = request.build_absolute_uri(company.logo.url) if (company and getattr(company, 'logo', None)) else None
+    company_logo_url = get_company_logo_data_uri(company)
     
     data = {
         'company': company,
@@ -631,56 +701,42 @@ def print_lab_report(request):
     
     if report_type == 'tat':
         now = timezone.now()
-        lab_settings = LabSettings.get_settings()
-        default_tat = timedelta(minutes=lab_settings.default_tat_minutes)
+        start, end = _tat_report_period(request, now)
+
+        panels = collected_between(start, end).select_related(
+            'test_panel', 'patient_sample__process'
+        ).order_by('sample_collected_at', 'id')
+        page = Paginator(panels, TAT_REPORT_PAGE_SIZE).get_page(request.GET.get('page'))
 
-        # All tests with collected samples
-        all_tests = LabTestRequestPanel.objects.filter(
-            patient_sample__collected_on__isnull=False
-        ).select_related('test_panel', 'patient_sample')
-        
         report_items = []
-        for panel in all_tests:
-            # Time taken: if approved, use approved_on - collected_on, else use now - collected_on
+        for panel in page:
+            # Time taken: if approved, use approved_on - collected, else use now - collected
             if panel.result_approved and panel.approved_on:
-                duration = panel.approved_on - panel.patient_sample.collected_on
+                duration = panel.approved_on - panel.sample_collected_at
             else:
-                duration = now - panel.patient_sample.collected_on
-            
-            # Prevent negative duration display due to timezone drift or old records
-            if duration.total_seconds() < 0:
-                duration = timedelta(0)
-
-            # Format duration
-            total_seconds = int(duration.total_seconds())
-            hours, remainder = divmod(total_seconds, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            time_taken_str = f"{hours}h {minutes}m"
-            
-            # TAT Goal string
-            tat_limit = panel.test_panel.tat if panel.test_panel.tat else default_tat
-            panel.tat_limit_str = f"{int(tat_limit.total_seconds() // 60)} mins" if tat_limit else "N/A"
+                duration = now - panel.sample_collected_at
+            panel.time_taken_str = _format_duration(duration)
 
-            # Determine Status and Color
-            if not panel.result_approved:
-                status_text = "PENDING"
-                status_color = "#ed6c02" # Orange
+            # TAT Goal string
+            if panel.tat_deadline:
+                panel.tat_limit_str = f"{int((panel.tat_deadline - panel.sample_collected_at).total_seconds() // 60)} mins"
             else:
-                if tat_limit and duration > tat_limit:
-                    status_text = "FAILED"
-                    status_color = "#d32f2f" # Red
-                else:
-                    status_text = "PASSED"
-                    status_color = "#2e7d32" # Green
-            
-            # Add extra info to the object for the template
-            panel.time_taken_str = time_taken_str
-            panel.status_text = status_text
-            panel.status_color = status_color
+                panel.tat_limit_str = "N/A"
+
+            panel.status_text, panel.status_color = TAT_STATUS_DISPLAY[panel.tat_status]
             report_items.append(panel)
-            
+
+        rollups = list(hourly_rollups(start, end))
+        for rollup in rollups:
+            average = rollup['average_turnaround']
+            rollup['average_turnaround_str'] = _format_duration(average) if average is not None else "N/A"
+
         data['items'] = report_items
-        data['title'] = "Laboratory TAT Analysis Report (Full)"
+        data['rollups'] = rollups
+        data['page'] = page
+        data['period_start'] = start
+        data['period_end'] = end - timedelta(days=1)
+        data['title'] = "Laboratory TAT Analysis Report"
         
     elif report_type == 'expiry':
         today_date = today.date()
@@ -702,7 +758,7 @@ def print_lab_report(request):
         data['title'] = "Lab Items Re-order Level Report"
     
     html_content = render_to_string(template_name, data)
-    pdf_file = HTML(string=html_content).write_pdf()
+    pdf_file = write_pdf(html_content)
     
     response = HttpResponse(pdf_file, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="lab_{report_type}_report_{today.strftime("%Y%m%d")}.pdf"'
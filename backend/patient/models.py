@@ -3,12 +3,13 @@ import random
 from datetime import datetime
 from django.utils import timezone
 from uuid import uuid4
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, transaction
 
 from customuser.models import CustomUser
 from inventory.models import Item
 from billing.models import Invoice
 from company.models import InsuranceCompany, Company
+from company.sequences import max_suffix, next_number
 from laboratory.models import ProcessTestRequest
 
 
@@ -59,22 +60,13 @@ class Patient(models.Model):
         except:
             prefix = "ESMED-"
         
-        # Get the highest existing patient number
         if prefix:
-            # Look for patients with this prefix
-            existing_patients = Patient.objects.filter(unique_id__startswith=prefix).order_by('-id')
-            if existing_patients.exists():
-                # Extract the number part from the last patient ID
-                last_id = existing_patients.first().unique_id
-                try:
-                    number_part = int(last_id.replace(prefix, ''))
-                    next_number = number_part + 1
-                except (ValueError, AttributeError):
-                    next_number = 1
-            else:
-                next_number = 1
-            
-            return f"{prefix}{next_number}"
+            # One counter per prefix, continuing from existing patient IDs
+            patient_number = next_number(f"patient_id:{prefix}", seed=lambda: max_suffix(
+                Patient.objects.filter(unique_id__startswith=prefix).values_list('unique_id', flat=True).iterator(),
+                prefix,
+            ))
+            return f"{prefix}{patient_number}"
         else:
             # Fallback to old method if no prefix
             while True:
@@ -283,27 +275,16 @@ class AttendanceProcess(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.pk:
-            # Generate a unique track number using the date and a random number
-            today = datetime.now().strftime('%Y%m%d')
-            random_number = random.randint(1000, 9999)
-            self.track_number = f'{today}-{random_number}'
-
-            # Check if the generated track_number already exists
-            while AttendanceProcess.objects.filter(track_number=self.track_number).exists():
-                random_number = random.randint(1000, 9999)
-                self.track_number = f'{today}-{random_number}'
-
-            self.patient_number = self.patient.unique_id
-
-            # Create related records
-            self.invoice = Invoice.objects.create(invoice_amount=0, invoice_number=self.track_number, patient=self.patient, invoice_date=self.created_at)
-            self.process_test_req = ProcessTestRequest.objects.create(reference=self.track_number)
-            self.triage = Triage.objects.create(
-                created_by_user= self.created_by,
-                created_at=self.created_at,
-                patient=self.patient
-            )
-            self.prescription = Prescription.objects.create()
+            # Track number from the attendance_track sequence plus the related
+            # Invoice, ProcessTestRequest, Triage and Prescription; see
+            # patient.visits
+            from .visits import prepare_visits
+
+            using = kwargs.get('using') or DEFAULT_DB_ALIAS
+            with transaction.atomic(using=using):
+                prepare_visits([self], using=using)
+                super().save(*args, **kwargs)
+            return
 
         super().save(*args, **kwargs)
 
@@ -340,5 +321,25 @@ class TriageSettings(models.Model):
         self.pk = 1
         super(TriageSettings, self).save(*args, **kwargs)
 
+    def critical_q(self, prefix=''):
+        '''
+        Q matching triages with any vital outside these thresholds, e.g.
+        critical_q('triage__') to filter or annotate AttendanceProcess rows.
+        Mirrors AttendanceProcessSerializer.get_has_critical_triage.
+        '''
+        def out_of_range(field, low, high=None):
+            q = models.Q(**{f'{prefix}{field}__lt': low})
+            if high is not None:
+                q |= models.Q(**{f'{prefix}{field}__gt': high})
+            return q
+
+        return (
+            out_of_range('spo2', self.spo2_min)
+            | out_of_range('systolic', self.systolic_min, self.systolic_max)
+            | out_of_range('diastolic', self.diastolic_min, self.diastolic_max)
+            | out_of_range('temperature', self.temperature_min, self.temperature_max)
+            | out_of_range('pulse', self.pulse_min, self.pulse_max)
+        )
+
     def __str__(self):
         return "Triage Critical Values Settings"
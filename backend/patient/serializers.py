@@ -1,6 +1,7 @@
 from django.db import IntegrityError, transaction
 from django.utils import timezone
 from rest_framework import serializers
+from easymed.serializers import SparseFieldsetMixin
 from .models import (
     ContactDetails,
     Patient,
@@ -16,9 +17,9 @@ from .models import (
 )
 from company.serializers import InsuranceCompanySerializer
 from inventory.models import (
-    Inventory,
     Item,
 )
+from inventory.summary import get_item_stock
 from billing.models import InvoiceItem
 from billing.serializers import InvoiceItemSerializer
 
@@ -28,7 +29,7 @@ class ContactDetailsSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     age = serializers.SerializerMethodField()
 
     class Meta:
@@ -47,8 +48,10 @@ class PatientSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance: Patient):
         data = super().to_representation(instance)
-        data["gender"] = instance.get_gender_display()
-        data["insurances"] = self.get_patient_insurances(instance)
+        if "gender" in data:
+            data["gender"] = instance.get_gender_display()
+        if "insurances" in data:
+            data["insurances"] = self.get_patient_insurances(instance)
         return data
 
 
@@ -100,7 +103,7 @@ class PrescriptionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PrescribedDrugSerializer(serializers.ModelSerializer):
+class PrescribedDrugSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     item_name = serializers.ReadOnlyField(source='item.name')
     sale_price = serializers.SerializerMethodField()
 
@@ -158,10 +161,7 @@ class PrescribedDrugSerializer(serializers.ModelSerializer):
             raise
 
     def get_sale_price(self, obj):
-        inventory = Inventory.objects.filter(item=obj.item).order_by('expiry_date').first()
-        if inventory:
-            return inventory.sale_price
-        return 0
+        return get_item_stock(obj.item_id)['sale_price'] or 0
         
 
 class ReferralSerializer(serializers.ModelSerializer):
@@ -177,7 +177,7 @@ class TriageSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class AttendanceProcessSerializer(serializers.ModelSerializer):
+class AttendanceProcessSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     insurances = serializers.SerializerMethodField()
     invoice_items = serializers.SerializerMethodField()
     assigned_doctor = serializers.CharField(source='doctor.get_fullname', read_only=True)
@@ -237,6 +237,83 @@ class AttendanceProcessSerializer(serializers.ModelSerializer):
             result_approved=True
         ).exists()
 
+
+class QueueInvoiceItemSerializer(serializers.ModelSerializer):
+    item_name = serializers.CharField(source='item.name', read_only=True)
+    item_code = serializers.CharField(source='item.item_code', read_only=True)
+    category = serializers.CharField(source='item.category', read_only=True)
+    payment_mode_name = serializers.CharField(source='payment_mode.payment_mode', read_only=True, default=None)
+    insurance_company_id = serializers.IntegerField(source='payment_mode.insurance_id', read_only=True, default=None)
+
+    class Meta:
+        model = InvoiceItem
+        fields = [
+            'id', 'item', 'item_name', 'item_code', 'category', 'payment_mode', 'payment_mode_name',
+            'insurance_company_id', 'status', 'item_amount', 'actual_total',
+        ]
+
+
+class AttendanceQueueSerializer(AttendanceProcessSerializer):
+    '''
+    AttendanceProcessSerializer for the queue board. Reads only what
+    AttendanceQueueViewSet has already joined, prefetched or annotated, so
+    serializing a page costs no extra queries per row.
+    '''
+    has_critical_triage = serializers.BooleanField(read_only=True)
+    has_approved_lab_results = serializers.BooleanField(read_only=True)
+
+    def get_insurances(self, obj):
+        return InsuranceCompanySerializer(obj.patient.insurances.all(), many=True).data
+
+    def get_invoice_items(self, obj):
+        if not obj.invoice:
+            return []
+        return QueueInvoiceItemSerializer(obj.invoice.invoice_items.all(), many=True).data
+
+
+class ScheduledVisitSerializer(serializers.Serializer):
+    patient = serializers.IntegerField()
+    reason = serializers.CharField(max_length=300)
+    doctor = serializers.IntegerField(required=False, allow_null=True)
+    track = serializers.ChoiceField(choices=AttendanceProcess.TRACK, required=False)
+    created_at = serializers.DateTimeField(required=False)
+
+
+class BulkAttendanceProcessRequestSerializer(serializers.Serializer):
+    '''
+    Visits for AttendanceProcessViewSet.bulk. The patient and doctor ids of
+    all visits are resolved with one query per model.
+    '''
+    visits = ScheduledVisitSerializer(many=True, allow_empty=False)
+
+    def validate_visits(self, visits):
+        from customuser.models import CustomUser
+
+        related = {
+            'patient': Patient.objects.in_bulk({visit['patient'] for visit in visits}),
+            'doctor': CustomUser.objects.in_bulk({visit['doctor'] for visit in visits if visit.get('doctor')}),
+        }
+
+        errors = []
+        resolved = []
+        for visit in visits:
+            visit = dict(visit)
+            missing = {}
+            for field, objects in related.items():
+                pk = visit.get(field)
+                if pk is None:
+                    continue
+                if pk not in objects:
+                    missing[field] = [f'Invalid pk "{pk}" - object does not exist.']
+                else:
+                    visit[field] = objects[pk]
+            errors.append(missing)
+            resolved.append(visit)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return resolved
+
 class TriageSettingsSerializer(serializers.ModelSerializer):
     class Meta:
         model = TriageSettings
@@ -1,15 +1,11 @@
 import logging
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.core.mail import send_mail
 from django.conf import settings
 
 
-from .models import (
-    Prescription, PrescribedDrug,
-    AttendanceProcess
-)
-from inventory.models import Inventory
+from .models import AttendanceProcess
 
 
 logger = logging.getLogger(__name__)
@@ -52,26 +48,3 @@ def appointment_assign_notification(attendance_process_id):
     except AttendanceProcess.DoesNotExist:
         logger.error(f"Attendance process with ID {attendance_process_id} not found.")
         pass
-
-
-
-
-@receiver(post_save, sender=PrescribedDrug)
-def update_inventory(sender, instance, created, **kwargs):
-    '''
-    Signal to update Invetory when PrescribedDrug is_dispensed==True
-    It retrieves the corresponding inventory item, checks if there is enough stock,
-    subtracts the prescribed quantity from the inventory, and saves the updated inventory item.
-    '''
-    if created and instance.is_dispensed:
-        try:
-            inventory_item = Inventory.objects.get(item=instance.item)
-            if inventory_item.quantity_in_stock >= instance.quantity:
-                inventory_item.quantity_in_stock -= instance.quantity
-                inventory_item.save()
-            else:
-                # Handle the case where there isn't enough inventory
-                print(f"Not enough inventory for {instance.item.name}")
-        except Inventory.DoesNotExist:
-            # Handle the case where the item doesn't exist in the inventory
-            print(f"Inventory record not found for {instance.item.name}")
\ No newline at end of file
@@ -0,0 +1,59 @@
+import pytest
+
+from patient.models import AttendanceProcess, TriageSettings
+
+
+QUEUE_URL = '/patients/attendance-queue/'
+
+
+@pytest.fixture
+def attendance_processes(db, user, patient):
+    processes = [
+        AttendanceProcess.objects.create(patient=patient, reason=f"Visit {i}", created_by=user)
+        for i in range(3)
+    ]
+    processes[0].triage.spo2 = 85
+    processes[0].triage.save()
+    processes[1].triage.pulse = 80
+    processes[1].triage.save()
+    return processes
+
+
+@pytest.mark.django_db
+def test_queue_flags_critical_triage(authenticated_client, attendance_processes):
+    TriageSettings.objects.create()
+
+    response = authenticated_client.get(QUEUE_URL)
+
+    assert response.status_code == 200
+    rows = {row['id']: row for row in response.json()['results']}
+    assert rows[attendance_processes[0].id]['has_critical_triage'] is True
+    assert rows[attendance_processes[1].id]['has_critical_triage'] is False
+    assert rows[attendance_processes[2].id]['has_critical_triage'] is False
+    assert all(row['has_approved_lab_results'] is False for row in rows.values())
+
+
+@pytest.mark.django_db
+def test_queue_ignores_inactive_triage_settings(authenticated_client, attendance_processes):
+    TriageSettings.objects.create(is_active=False)
+
+    response = authenticated_client.get(QUEUE_URL)
+
+    assert not any(row['has_critical_triage'] for row in response.json()['results'])
+
+
+@pytest.mark.django_db
+def test_queue_query_count_does_not_grow_with_rows(
+    authenticated_client, attendance_processes, django_assert_max_num_queries
+):
+    TriageSettings.objects.create()
+
+    with django_assert_max_num_queries(8):
+        response = authenticated_client.get(QUEUE_URL, {'page_size': 2})
+
+    body = response.json()
+    assert len(body['results']) == 2
+    assert body['next']
+
+    response = authenticated_client.get(body['next'])
+    assert [row['id'] for row in response.json()['results']] == [attendance_processes[0].id]
@@ -0,0 +1,71 @@
+import pytest
+
+from patient.models import AttendanceProcess
+
+
+LIST_URL = '/patients/initiate-attendance-process/'
+
+
+@pytest.fixture
+def attendance_processes(db, user, patient):
+    return [
+        AttendanceProcess.objects.create(patient=patient, reason=f"Visit {i}", created_by=user)
+        for i in range(3)
+    ]
+
+
+@pytest.mark.django_db
+def test_list_is_unpaginated_by_default(authenticated_client, attendance_processes):
+    response = authenticated_client.get(LIST_URL)
+
+    assert isinstance(response.json(), list)
+    assert len(response.json()) == 3
+
+
+@pytest.mark.django_db
+def test_list_pages_with_cursor_when_asked(authenticated_client, attendance_processes):
+    response = authenticated_client.get(LIST_URL, {'page_size': 2})
+
+    body = response.json()
+    assert [row['id'] for row in body['results']] == [p.id for p in reversed(attendance_processes[1:])]
+
+    response = authenticated_client.get(body['next'])
+    assert [row['id'] for row in response.json()['results']] == [attendance_processes[0].id]
+
+
+@pytest.mark.django_db
+def test_list_pages_when_legacy_flag_is_off(authenticated_client, attendance_processes, settings):
+    settings.EASYMED_LEGACY_UNPAGINATED = False
+
+    response = authenticated_client.get(LIST_URL)
+
+    assert len(response.json()['results']) == 3
+
+
+@pytest.mark.django_db
+def test_fields_param_skips_unrequested_fields(authenticated_client, attendance_processes, mocker):
+    get_invoice_items = mocker.patch(
+        'patient.serializers.AttendanceProcessSerializer.get_invoice_items', return_value=[]
+    )
+
+    response = authenticated_client.get(LIST_URL, {'fields': 'id,track_number,patient_name'})
+
+    assert set(response.json()[0]) == {'id', 'track_number', 'patient_name'}
+    get_invoice_items.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_fields_param_drops_keys_added_in_to_representation(authenticated_admin_client, purchase_order):
+    response = authenticated_admin_client.get('/inventory/purchase-orders/', {'fields': 'id,PO_number'})
+
+    assert set(response.json()[0]) == {'id', 'PO_number'}
+
+
+def test_default_cursor_ordering_is_per_model():
+    from easymed.pagination import get_default_ordering
+    from inventory.models import Item
+    from laboratory.models import Specimen
+
+    assert get_default_ordering(AttendanceProcess) == ('-created_at', '-id')
+    assert get_default_ordering(Item) == ('-date_created', '-id')
+    assert get_default_ordering(Specimen) == '-id'
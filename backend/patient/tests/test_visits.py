@@ -0,0 +1,84 @@
+import pytest
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+
+from billing.models import Invoice
+from patient.models import AttendanceProcess
+from patient.visits import create_visits
+
+BULK_URL = '/patients/initiate-attendance-process/bulk/'
+
+
+@pytest.mark.django_db
+def test_track_numbers_follow_the_day_sequence(patient, user):
+    day = timezone.localdate().strftime('%Y%m%d')
+    AttendanceProcess.objects.filter(track_number__startswith=day).delete()
+
+    first = AttendanceProcess.objects.create(patient=patient, reason='Cough', created_by=user)
+    second = AttendanceProcess.objects.create(patient=patient, reason='Review', created_by=user)
+
+    assert first.track_number == f'{day}-0001'
+    assert second.track_number == f'{day}-0002'
+    assert first.invoice.invoice_number == first.track_number
+    assert first.process_test_req.reference == first.track_number
+    assert first.triage.created_by_user == user
+    assert first.prescription_id is not None
+
+
+@pytest.mark.django_db
+def test_create_visits_builds_all_rows_in_bulk(patient, user, django_assert_max_num_queries):
+    tomorrow = timezone.now() + timedelta(days=1)
+    visits = [{'patient': patient, 'reason': f'Visit {n}', 'created_at': tomorrow} for n in range(10)]
+
+    # sequence row (update, seed, upsert), 5 bulk inserts, savepoint
+    with django_assert_max_num_queries(12):
+        created = create_visits(visits, created_by=user)
+
+    day = timezone.localtime(tomorrow).strftime('%Y%m%d')
+    assert [visit.track_number for visit in created] == [f'{day}-{n:04d}' for n in range(1, 11)]
+    assert Invoice.objects.filter(invoice_number__startswith=day).count() == 10
+    saved = AttendanceProcess.objects.select_related('invoice', 'triage').get(id=created[0].id)
+    assert saved.invoice.invoice_number == saved.track_number
+    assert saved.triage.patient == patient
+    assert saved.patient_number == patient.unique_id
+
+
+@pytest.mark.django_db
+def test_doctor_notifications_wait_for_commit(patient, user, doctor, django_capture_on_commit_callbacks):
+    with mock.patch('patient.signals.appointment_assign_notification') as notify:
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            created = create_visits([{'patient': patient, 'reason': 'Review', 'doctor': doctor}], created_by=user)
+            notify.assert_not_called()
+
+    assert len(callbacks) == 1
+    notify.assert_called_once_with(created[0].id)
+
+
+@pytest.mark.django_db
+def test_bulk_endpoint_rejects_unknown_patients(authenticated_admin_client, patient):
+    response = authenticated_admin_client.post(
+        BULK_URL,
+        {'visits': [{'patient': patient.id, 'reason': 'Review'}, {'patient': 999999, 'reason': 'Review'}]},
+        content_type='application/json',
+    )
+
+    assert response.status_code == 400
+    assert 'patient' in response.json()['visits'][1]
+    assert not AttendanceProcess.objects.filter(patient=patient).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_endpoint_creates_visits(authenticated_admin_client, patient, doctor):
+    response = authenticated_admin_client.post(
+        BULK_URL,
+        {'visits': [{'patient': patient.id, 'reason': 'Review', 'doctor': doctor.id}, {'patient': patient.id, 'reason': 'Lab'}]},
+        content_type='application/json',
+    )
+
+    assert response.status_code == 201
+    body = response.json()
+    assert len(body) == 2
+    assert body[0]['doctor'] == doctor.id
+    assert AttendanceProcess.objects.filter(patient=patient).count() == 2
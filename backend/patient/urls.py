@@ -15,6 +15,7 @@ from .views import (
     PrescribedDrugByPatientIdAPIView,
     PrescribedDrugByPrescriptionViewSet,
     AttendanceProcessViewSet,
+    AttendanceQueueViewSet,
 
     download_prescription_pdf,
     generate_lab_tests_report,
@@ -33,6 +34,7 @@ router.register(r'consultations', ConsultationViewSet)
 router.register(r'referrals', ReferralViewSet)
 router.register(r'triage', TriageViewSet)
 router.register(r'initiate-attendance-process', AttendanceProcessViewSet)
+router.register(r'attendance-queue', AttendanceQueueViewSet, basename='attendance-queue')
 
 
 
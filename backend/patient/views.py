@@ -1,11 +1,14 @@
 import os
 from datetime import datetime
-from weasyprint import HTML
+from reports.pdf import get_company_logo_data_uri, pdf_response, write_pdf
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 from django.template.loader import render_to_string
+from django.db.models import BooleanField, Case, Exists, OuterRef, Prefetch, Value, When
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.request import Request
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -15,7 +18,8 @@ from drf_spectacular.utils import (extend_schema)
 
 
 from authperms.permissions import (IsReceptionistUser)
-from laboratory.models import LabTestRequest
+from billing.models import InvoiceItem
+from laboratory.models import LabTestRequest, LabTestRequestPanel
 from company.models import Company
 from customuser.models import CustomUser
 from .models import (
@@ -42,8 +46,11 @@ from .serializers import (
     ReferralSerializer,
     TriageSerializer,
     AttendanceProcessSerializer,
+    AttendanceQueueSerializer,
+    BulkAttendanceProcessRequestSerializer,
     TriageSettingsSerializer,
 )
+from .visits import create_visits
 from .filters import (
     AttendanceProcessFilter,
     PatientFilter,
@@ -195,6 +202,7 @@ class TriageViewSet(viewsets.ModelViewSet):
 class AttendanceProcessViewSet(viewsets.ModelViewSet):
     queryset = AttendanceProcess.objects.all().order_by('-id')
     serializer_class = AttendanceProcessSerializer
+    cursor_ordering = ('-created_at', '-id')
     filter_backends = [AttendanceProcessFilter, DjangoFilterBackend]
     filterset_fields = ['track']
     search_fields = [
@@ -209,6 +217,86 @@ class AttendanceProcessViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        '''
+        Import scheduled visits in one request:
+        POST /patients/initiate-attendance-process/bulk/
+        {"visits": [{"patient": 1, "reason": "Review", "doctor": 2, "created_at": "..."}, ...]}
+
+        All visits and their invoices, test requests, triages and
+        prescriptions are created in one transaction by patient.visits.
+        '''
+        req_ser = BulkAttendanceProcessRequestSerializer(data=request.data)
+        req_ser.is_valid(raise_exception=True)
+
+        visits = create_visits(req_ser.validated_data['visits'], created_by=request.user)
+
+        return Response([
+            {
+                'id': visit.id,
+                'track_number': visit.track_number,
+                'patient': visit.patient_id,
+                'doctor': visit.doctor_id,
+                'invoice': visit.invoice_id,
+                'process_test_req': visit.process_test_req_id,
+                'triage': visit.triage_id,
+                'prescription': visit.prescription_id,
+                'track': visit.track,
+                'created_at': visit.created_at,
+            }
+            for visit in visits
+        ], status=status.HTTP_201_CREATED)
+
+
+class AttendanceQueuePagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-id'
+
+
+class AttendanceQueueViewSet(viewsets.ReadOnlyModelViewSet):
+    '''
+    Queue board polled by reception, doctor and lab workstations.
+
+    Same rows, filters and search as AttendanceProcessViewSet, but the related
+    rows are joined/prefetched, has_approved_lab_results is an EXISTS
+    subquery and has_critical_triage is one CASE expression built from
+    TriageSettings (read once per request), so a page is a fixed handful of
+    queries. Results are keyset paginated on -id:
+    /patients/attendance-queue/?track=doctor&page_size=50
+    '''
+    serializer_class = AttendanceQueueSerializer
+    pagination_class = AttendanceQueuePagination
+    filter_backends = [AttendanceProcessFilter, DjangoFilterBackend]
+    filterset_fields = AttendanceProcessViewSet.filterset_fields
+    search_fields = AttendanceProcessViewSet.search_fields
+
+    def get_queryset(self):
+        triage_settings = TriageSettings.objects.first()
+        if triage_settings and triage_settings.is_active:
+            has_critical_triage = Case(
+                When(triage_settings.critical_q('triage__'), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        else:
+            has_critical_triage = Value(False, output_field=BooleanField())
+
+        return AttendanceProcess.objects.select_related(
+            'patient', 'doctor', 'invoice', 'triage', 'referral', 'clinical_note',
+        ).prefetch_related(
+            'patient__insurances',
+            Prefetch('invoice__invoice_items', queryset=InvoiceItem.objects.select_related('item', 'payment_mode')),
+        ).annotate(
+            has_critical_triage=has_critical_triage,
+            has_approved_lab_results=Exists(LabTestRequestPanel.objects.filter(
+                lab_test_request__process=OuterRef('process_test_req'),
+                result_approved=True,
+            )),
+        )
+
 class TriageSettingsView(APIView):
     """
     Get or update the global triage settings.
@@ -242,7 +330,7 @@ def download_prescription_pdf(request, prescription_id):
     attendance_process = AttendanceProcess.objects.filter(prescription=prescription).first()
     
     # Get signature and logo URLs
-    company_logo_url = request.build_absolute_uri(company.logo.url) if company.logo else None
+    company_logo_url = get_company_logo_data_uri(company)
     doctor_sig_url = request.build_absolute_uri(attendance_process.doctor.signature.url) if attendance_process and attendance_process.doctor and attendance_process.doctor.signature else None
 
     # Render the HTML template with the context
@@ -256,13 +344,9 @@ def download_prescription_pdf(request, prescription_id):
         'patient': attendance_process.patient if attendance_process else None,
         })
 
-    # Use WeasyPrint to generate the PDF from the rendered HTML
-    pdf_file = HTML(string=html).write_pdf()
-
-    # Create the HTTP response with the PDF file
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{prescription.id}.pdf"'
-    return response
+    return pdf_response(
+        request, f'prescription_{prescription.id}', html, f'{prescription.id}.pdf', disposition='attachment'
+    )
 
 
 def generate_lab_tests_report(request):
@@ -310,10 +394,8 @@ def generate_lab_tests_report(request):
 
     # Render the lab test requests to a template
     html_content = render_to_string('lab_tests_report.html', {'lab_test_requests': lab_test_requests, 'company': company})
-    html = HTML(string=html_content)
-
     try:
-        pdf_bytes = html.write_pdf()
+        pdf_bytes = write_pdf(html_content)
 
         response = HttpResponse(pdf_bytes, content_type='application/pdf')
         response['Content-Disposition'] = f'inline; filename="lab_tests_report_{doctor_id}.pdf"'
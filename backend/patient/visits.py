@@ -0,0 +1,129 @@
+'''
+Visit (AttendanceProcess) creation.
+
+A visit is five rows: the AttendanceProcess and its Invoice,
+ProcessTestRequest, Triage and Prescription. prepare_visits() gives unsaved
+visits a track number from the shared `attendance_track` sequence and
+inserts the four related rows with one bulk_create() per model, so creating
+a batch of visits costs the same handful of queries as creating one.
+
+The Invoice number is the track number, so Invoice.save()'s own numbering
+never runs. Doctor notifications for visits created with a doctor already
+assigned are sent once the transaction commits.
+'''
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from billing.models import Invoice
+from company.sequences import max_suffix, next_numbers
+from laboratory.models import ProcessTestRequest
+
+from .models import AttendanceProcess, Prescription, Triage
+
+
+def _visit_day(visit):
+    created_at = visit.created_at
+    if timezone.is_aware(created_at):
+        created_at = timezone.localtime(created_at)
+    return created_at.date()
+
+
+def assign_track_numbers(visits, using=DEFAULT_DB_ALIAS):
+    '''
+    Set `track_number` (YYYYMMDD-NNNN) on each visit, one sequence UPDATE per
+    visit day. The counter of a new day starts after the highest track
+    number already used that day.
+    '''
+    by_day = {}
+    for visit in visits:
+        by_day.setdefault(_visit_day(visit).strftime('%Y%m%d'), []).append(visit)
+
+    for day, day_visits in by_day.items():
+        prefix = f'{day}-'
+
+        def seed(prefix=prefix):
+            return max_suffix(
+                AttendanceProcess.objects.using(using)
+                .filter(track_number__startswith=prefix)
+                .values_list('track_number', flat=True),
+                prefix=prefix,
+            )
+
+        numbers = next_numbers('attendance_track', len(day_visits), period=day, seed=seed, using=using)
+        for visit, number in zip(day_visits, numbers):
+            visit.track_number = f'{prefix}{number:04d}'
+
+
+def prepare_visits(visits, using=DEFAULT_DB_ALIAS):
+    '''
+    Give unsaved AttendanceProcess instances their track number and create
+    their Invoice, ProcessTestRequest, Triage and Prescription in bulk. Call
+    inside a transaction; the visits themselves are left for the caller to
+    save.
+    '''
+    assign_track_numbers(visits, using=using)
+
+    invoices = []
+    test_requests = []
+    triages = []
+    prescriptions = []
+    for visit in visits:
+        visit.patient_number = visit.patient.unique_id
+        invoices.append(Invoice(
+            invoice_amount=0,
+            invoice_number=visit.track_number,
+            patient=visit.patient,
+            invoice_date=_visit_day(visit),
+        ))
+        test_requests.append(ProcessTestRequest(reference=visit.track_number))
+        triages.append(Triage(
+            created_by_user=visit.created_by,
+            patient=visit.patient,
+        ))
+        prescriptions.append(Prescription())
+
+    Invoice.objects.using(using).bulk_create(invoices)
+    ProcessTestRequest.objects.using(using).bulk_create(test_requests)
+    Triage.objects.using(using).bulk_create(triages)
+    Prescription.objects.using(using).bulk_create(prescriptions)
+
+    for visit, invoice, test_request, triage, prescription in zip(
+        visits, invoices, test_requests, triages, prescriptions
+    ):
+        visit.invoice = invoice
+        visit.process_test_req = test_request
+        visit.triage = triage
+        visit.prescription = prescription
+
+
+def _notify_assigned_doctors(visit_ids):
+    from .signals import appointment_assign_notification
+
+    for visit_id in visit_ids:
+        appointment_assign_notification(visit_id)
+
+
+def create_visits(visits, created_by=None, using=DEFAULT_DB_ALIAS):
+    '''
+    Create visits from dicts of AttendanceProcess field values (patient,
+    reason, doctor, track, created_at, ...) in one transaction and return
+    the saved AttendanceProcess instances.
+    '''
+    instances = [AttendanceProcess(created_by=created_by, **fields) for fields in visits]
+    if not instances:
+        return []
+
+    with transaction.atomic(using=using):
+        prepare_visits(instances, using=using)
+        AttendanceProcess.objects.using(using).bulk_create(instances)
+
+        assigned = [visit.id for visit in instances if visit.doctor_id]
+        if assigned:
+            transaction.on_commit(lambda: _notify_assigned_doctors(assigned), using=using)
+
+    return instances
+
+
+def create_visit(patient, created_by=None, using=DEFAULT_DB_ALIAS, **fields):
+    '''Create a single visit; see create_visits().'''
+    return create_visits([dict(fields, patient=patient)], created_by=created_by, using=using)[0]
@@ -7,6 +7,7 @@ from datetime import timedelta
 from django.db.models import F
 from company.models import Company
 from inventory.models import Inventory, Item
+from reports.pdf import get_company_logo_data_uri, write_pdf
 
 from .models import (
     PublicPrescriptionRequest, 
@@ -92,7 +93,7 @@ def print_pharmacy_report(request):
     report_type = request.GET.get('type')
     company = Company.objects.first()
     today = timezone.now()
-    company_logo_url = request.build_absolute_uri(company.logo.url) if (company and getattr(company, 'logo', None)) else None
+    company_logo_url = get_company_logo_data_uri(company)
     
     data = {
         'company': company,
@@ -126,17 +127,12 @@ def print_pharmacy_report(request):
         return JsonResponse({"error": "Invalid report type"}, status=400)
 
     from django.template.loader import render_to_string
-    from weasyprint import HTML
-    import tempfile
     from django.http import HttpResponse
 
     html_string = render_to_string(template_name, data)
-    html = HTML(string=html_string, base_url=request.build_absolute_uri())
-    
-    with tempfile.NamedTemporaryFile(delete=True) as output:
-        html.write_pdf(target=output.name)
-        output.seek(0)
-        response = HttpResponse(output.read(), content_type='application/pdf')
-        filename = f"pharmacy_{report_type}_report_{today.strftime('%Y%m%d')}.pdf"
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        return response
\ No newline at end of file
+    pdf_file = write_pdf(html_string, base_url=request.build_absolute_uri())
+
+    response = HttpResponse(pdf_file, content_type='application/pdf')
+    filename = f"pharmacy_{report_type}_report_{today.strftime('%Y%m%d')}.pdf"
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
\ No newline at end of file
@@ -0,0 +1,281 @@
+'''
+PDF rendering shared by the download_*_pdf views.
+
+WeasyPrint layout is CPU bound and used to run in the request thread. Views
+now hand their rendered HTML to `pdf_response()`, which:
+
+- serves the PDF straight from the on-disk cache when the same document has
+  already been rendered from identical HTML;
+- with `?async=1`, queues the render on Celery and returns a job id the
+  client polls at /reports/pdf-jobs/<job_id>/. Only users the job was handed
+  to (see `grant_job_access()`) may poll or download it;
+- otherwise renders in-process (the old behaviour) and caches the result.
+
+Cache files are named `<document>-<sha256 of html>.pdf`, so any change to the
+data behind a document produces a new key; older renders of the same
+document are removed when a new one is written. Templates print their
+timestamp with `{% printed_at %}` (reports/templatetags/printing.py), which
+leaves a marker in the HTML that write_pdf() replaces, so the key only
+changes with the data.
+
+Every render, cached or not, goes through `write_pdf()`, which shares one
+process-wide WeasyPrint FontConfiguration and image cache, and a URL fetcher that serves
+media/static files from disk and refuses anything else, so no render does
+network I/O. Templates get the company logo as a data URI from
+`get_company_logo_data_uri()` instead of an absolute URL back to ourselves.
+'''
+import base64
+import hashlib
+import mimetypes
+import os
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+
+
+ASYNC_QUERY_PARAM = 'async'
+PRINTED_AT_MARKER = '<!-- printed-at -->'
+
+_font_config = None
+_logo_cache = {}
+# WeasyPrint's decoded-image cache, shared by every render in the process
+_image_cache = {}
+
+
+def get_font_config():
+    '''One FontConfiguration per process so fonts are only loaded once.'''
+    global _font_config
+    if _font_config is None:
+        from weasyprint.text.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def get_company_logo_data_uri(company):
+    '''
+    The company logo as a data: URI, read from storage once per process.
+    Keyed on the stored file name, so uploading a new logo is picked up even
+    by processes that did not see the save; clear_company_logo_cache() drops
+    it immediately in the saving process.
+    '''
+    if not company or not company.logo:
+        return None
+
+    key = (company.pk, company.logo.name)
+    if key not in _logo_cache:
+        try:
+            with company.logo.open('rb') as f:
+                content = f.read()
+        except (FileNotFoundError, OSError):
+            return None
+        mime_type = mimetypes.guess_type(company.logo.name)[0] or 'application/octet-stream'
+        _logo_cache[key] = f'data:{mime_type};base64,{base64.b64encode(content).decode("ascii")}'
+    return _logo_cache[key]
+
+
+def clear_company_logo_cache():
+    _logo_cache.clear()
+    _image_cache.clear()
+
+
+def _local_path(path):
+    '''Map a MEDIA_URL/STATIC_URL path to a file on disk, or None.'''
+    media_url = urlparse(settings.MEDIA_URL).path
+    static_url = urlparse(settings.STATIC_URL).path if settings.STATIC_URL else None
+
+    if media_url and path.startswith(media_url):
+        root = Path(settings.MEDIA_ROOT).resolve()
+        candidate = (root / path[len(media_url):]).resolve()
+        return candidate if candidate.is_relative_to(root) and candidate.is_file() else None
+    if static_url and path.startswith(static_url):
+        found = finders.find(path[len(static_url):])
+        return Path(found) if found else None
+    return None
+
+
+def local_url_fetcher(url, timeout=10, ssl_context=None):
+    '''
+    WeasyPrint URL fetcher that never touches the network: data: URIs are
+    decoded, media/static URLs (on any host) are read from disk and anything
+    else is refused, leaving the resource out of the PDF.
+    '''
+    from weasyprint.urls import default_url_fetcher
+
+    if url.startswith('data:'):
+        return default_url_fetcher(url)
+
+    path = _local_path(unquote(urlparse(url).path))
+    if path is None:
+        raise ValueError(f'Not fetching {url} while rendering a PDF')
+    return default_url_fetcher(path.as_uri())
+
+
+def write_pdf(html, target=None, base_url=None):
+    '''
+    Render `html` with the shared font config and local URL fetcher, filling
+    in the {% printed_at %} timestamp.
+    '''
+    from weasyprint import HTML
+
+    html = html.replace(PRINTED_AT_MARKER, timezone.localtime().strftime('%Y-%m-%d %H:%M'))
+    document = HTML(string=html, base_url=base_url, url_fetcher=local_url_fetcher)
+    return document.write_pdf(target=target, font_config=get_font_config(), cache=_image_cache)
+
+
+def get_cache_dir():
+    cache_dir = Path(settings.PDF_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def get_job_id(document, html):
+    '''Deterministic job id / cache key for a document rendered from `html`.'''
+    digest = hashlib.sha256(html.encode('utf-8')).hexdigest()[:32]
+    return f'{document}-{digest}'
+
+
+def get_document_name(job_id):
+    return job_id.rsplit('-', 1)[0]
+
+
+def get_cache_path(job_id):
+    return get_cache_dir() / f'{job_id}.pdf'
+
+
+def is_cached(job_id):
+    return get_cache_path(job_id).exists()
+
+
+def get_cached_pdf(job_id):
+    try:
+        return get_cache_path(job_id).read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def render_pdf(job_id, html, base_url=None, replace_stale=True):
+    '''
+    Render `html` with WeasyPrint and store it in the cache. Returns the PDF
+    bytes. With replace_stale, older renders of the same document are removed.
+    '''
+    pdf_file = write_pdf(html, base_url=base_url)
+
+    path = get_cache_path(job_id)
+    # Write to a temp file first so a concurrent reader never sees a partial PDF
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pdf_file)
+    os.replace(tmp_path, path)
+
+    if not replace_stale:
+        return pdf_file
+
+    document = get_document_name(job_id)
+    for stale in path.parent.glob(f'{document}-*.pdf'):
+        if stale != path and get_document_name(stale.stem) == document:
+            stale.unlink(missing_ok=True)
+
+    return pdf_file
+
+
+def purge_expired_pdfs(max_age=None):
+    '''Delete cached PDFs older than `max_age` seconds (default PDF_REPORT_TTL).'''
+    max_age = settings.PDF_REPORT_TTL if max_age is None else max_age
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in get_cache_dir().glob('*.pdf'):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def is_async_requested(request):
+    return request.GET.get(ASYNC_QUERY_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+def get_requester(request):
+    '''
+    The authenticated user behind `request`, or None. The download_*_pdf
+    views are plain Django views, so the JWT the API clients send is checked
+    here when no session user is set.
+    '''
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated else None
+
+
+def _job_owner_key(job_id, user_id):
+    return f'pdf-job-owner:{job_id}:{user_id}'
+
+
+def grant_job_access(request, job_id):
+    '''Let the requester poll and download `job_id` for as long as the artifact lives.'''
+    user = get_requester(request)
+    if user is not None:
+        cache.set(_job_owner_key(job_id, user.pk), True, settings.PDF_REPORT_TTL)
+
+
+def has_job_access(user, job_id):
+    return bool(user and user.is_authenticated and cache.get(_job_owner_key(job_id, user.pk)))
+
+
+def file_response(pdf_file, filename, disposition='inline'):
+    response = HttpResponse(pdf_file, content_type='application/pdf')
+    response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    return response
+
+
+def job_response(request, job_id, ready):
+    return JsonResponse(
+        {
+            'job_id': job_id,
+            'status': 'ready' if ready else 'pending',
+            'status_url': request.build_absolute_uri(reverse('pdf-job-status', args=[job_id])),
+            'download_url': request.build_absolute_uri(reverse('pdf-job-download', args=[job_id])),
+        },
+        status=200 if ready else 202,
+    )
+
+
+def pdf_response(request, document, html, filename, disposition='inline', base_url=None):
+    '''
+    Response for a download_*_pdf view. `document` identifies the document
+    (e.g. 'invoice_26') and must be slug-safe; `html` is the fully rendered
+    template.
+    '''
+    from .tasks import render_pdf_task
+
+    job_id = get_job_id(document, html)
+    pdf_file = get_cached_pdf(job_id)
+
+    if is_async_requested(request):
+        grant_job_access(request, job_id)
+        if pdf_file is None:
+            render_pdf_task.apply_async(args=[job_id, html, base_url], task_id=job_id)
+            pdf_file = get_cached_pdf(job_id)
+        return job_response(request, job_id, ready=pdf_file is not None)
+
+    if pdf_file is None:
+        pdf_file = render_pdf(job_id, html, base_url=base_url)
+    return file_response(pdf_file, filename, disposition)
@@ -0,0 +1,175 @@
+'''
+Sales report engine.
+
+Rows are read as flat values() tuples one day at a time (a date partition
+over the indexed item_created_at column) instead of InvoiceItem instances
+with lazy item/invoice/payment_mode loads, so CSV/XLSX exports never hold
+more than a chunk of rows in memory. Totals are aggregated in the database.
+
+- stream_csv() / write_xlsx() turn the rows into downloads without building
+  the whole report in memory.
+- render_sales_report_pdf() renders the PDF into a per-request artifact in
+  the PDF cache directory; it runs on Celery via render_sales_report_task
+  and the artifact is purged after PDF_REPORT_TTL.
+'''
+import csv
+import tempfile
+import uuid
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from billing.models import InvoiceItem
+from company.models import Company
+from .pdf import get_company_logo_data_uri, render_pdf
+
+
+# (queryset field, template key, export header)
+SALES_COLUMNS = [
+    ('invoice_id', 'invoice_id', 'Invoice ID'),
+    ('invoice__invoice_number', 'invoice_number', 'Invoice Number'),
+    ('item__name', 'item_name', 'Item Name'),
+    ('item_created_at', 'created_at', 'Created At'),
+    ('payment_mode__payment_mode', 'payment_mode', 'Payment Mode'),
+    ('actual_total', 'amount', 'Amount'),
+]
+
+REPORT_TEMPLATES = {
+    'sales_by_date': 'sales_by_date.html',
+    'sales_by_item_id': 'sales_by_item_id.html',
+}
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def get_sales_queryset(item_id=None):
+    queryset = InvoiceItem.objects.all()
+    if item_id:
+        queryset = queryset.filter(item_id=item_id)
+    return queryset
+
+
+def date_partitions(start_date, end_date):
+    '''Aware [start, end) datetime bounds for each day from start_date to end_date inclusive.'''
+    day = start_date
+    while day <= end_date:
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        yield start, start + timedelta(days=1)
+        day += timedelta(days=1)
+
+
+def iter_sales_rows(start_date, end_date, item_id=None):
+    '''Yield one tuple per sold invoice item, in SALES_COLUMNS order, oldest first.'''
+    queryset = get_sales_queryset(item_id)
+    fields = [field for field, _, _ in SALES_COLUMNS]
+    for start, end in date_partitions(start_date, end_date):
+        yield from queryset.filter(
+            item_created_at__gte=start, item_created_at__lt=end
+        ).order_by('item_created_at', 'id').values_list(*fields).iterator(chunk_size=2000)
+
+
+def date_bounds(start_date, end_date):
+    '''Aware [start, end) datetimes covering start_date to end_date inclusive.'''
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
+def get_sales_summary(start_date, end_date, item_id=None):
+    '''Item count, total amount and per payment mode totals for the range.'''
+    start, end = date_bounds(start_date, end_date)
+    queryset = get_sales_queryset(item_id).filter(item_created_at__gte=start, item_created_at__lt=end)
+
+    totals = queryset.aggregate(item_count=Count('id'), total_amount=Sum('actual_total'))
+    totals['by_payment_mode'] = list(
+        queryset.values('payment_mode__payment_mode')
+        .annotate(item_count=Count('id'), total_amount=Sum('actual_total'))
+        .order_by('payment_mode__payment_mode')
+    )
+    return totals
+
+
+def get_payment_mode_items(start_date, end_date, payment_category=None):
+    start, end = date_bounds(start_date, end_date)
+    queryset = InvoiceItem.objects.filter(item_created_at__gte=start, item_created_at__lt=end)
+    if payment_category:
+        queryset = queryset.filter(payment_mode__payment_category=payment_category)
+    return queryset
+
+
+def get_payment_mode_revenue(start_date, end_date, payment_category=None, by_department=False):
+    '''
+    Daily revenue (sum of InvoiceItem.actual_total) per payment mode category,
+    optionally split by source_tag department, in one grouped query.
+    '''
+    group_by = ['day', 'payment_mode__payment_category']
+    if by_department:
+        group_by.append('source_tag__name')
+
+    return list(
+        get_payment_mode_items(start_date, end_date, payment_category)
+        .annotate(day=TruncDate('item_created_at'))
+        .values(*group_by)
+        .annotate(item_count=Count('id'), total_amount=Sum('actual_total'))
+        .order_by(*group_by)
+    )
+
+
+class Echo:
+    '''File-like object whose write() hands back the value, for streaming csv.writer output.'''
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([label for _, _, label in SALES_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(rows):
+    '''
+    Write the rows to a temporary .xlsx file with openpyxl's write-only
+    workbook (rows are flushed as they are appended) and return the open file.
+    '''
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Sales')
+    worksheet.append([label for _, _, label in SALES_COLUMNS])
+    for row in rows:
+        worksheet.append([
+            timezone.localtime(value).replace(tzinfo=None) if isinstance(value, datetime) else value
+            for value in row
+        ])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def new_report_job_id(report):
+    '''Unique per-request artifact id, so concurrent users never share a file.'''
+    return f'{report}-{uuid.uuid4().hex}'
+
+
+def render_sales_report_pdf(job_id, report, start_date, end_date, item_id=None):
+    keys = [key for _, key, _ in SALES_COLUMNS]
+    company = Company.objects.first()
+    context = {
+        'invoice_items': (dict(zip(keys, row)) for row in iter_sales_rows(start_date, end_date, item_id)),
+        'summary': get_sales_summary(start_date, end_date, item_id),
+        'company': company,
+        'company_logo_url': get_company_logo_data_uri(company),
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+    html = render_to_string(REPORT_TEMPLATES[report], context)
+    return render_pdf(job_id, html, replace_stale=False)
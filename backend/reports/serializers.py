@@ -0,0 +1,18 @@
+from rest_framework import serializers
+
+from billing.models import InvoiceItem
+
+
+class PaymentReportItemSerializer(serializers.ModelSerializer):
+    invoice_number = serializers.CharField(source='invoice.invoice_number', read_only=True)
+    item_name = serializers.CharField(source='item.name', read_only=True)
+    payment_mode_name = serializers.CharField(source='payment_mode.payment_mode', read_only=True, default=None)
+    payment_category = serializers.CharField(source='payment_mode.payment_category', read_only=True, default=None)
+    source_tag_name = serializers.CharField(source='source_tag.name', read_only=True, default=None)
+
+    class Meta:
+        model = InvoiceItem
+        fields = [
+            'id', 'invoice', 'invoice_number', 'item', 'item_name', 'payment_mode_name',
+            'payment_category', 'source_tag_name', 'actual_total', 'item_created_at',
+        ]
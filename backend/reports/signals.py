@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from company.models import Company
+from .pdf import clear_company_logo_cache
+
+
+@receiver([post_save, post_delete], sender=Company)
+def invalidate_company_logo(sender, instance, **kwargs):
+    clear_company_logo_cache()
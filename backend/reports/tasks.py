@@ -0,0 +1,24 @@
+from celery import shared_task
+
+from .pdf import purge_expired_pdfs, render_pdf
+
+
+@shared_task
+def render_pdf_task(job_id, html, base_url=None):
+    '''Render a queued PDF into the cache; the client polls /reports/pdf-jobs/<job_id>/.'''
+    render_pdf(job_id, html, base_url=base_url)
+    return job_id
+
+
+@shared_task
+def render_sales_report_task(job_id, report, start_date, end_date, item_id=None):
+    '''Build and render a sales report PDF; dates are ISO strings.'''
+    from .sales import parse_date, render_sales_report_pdf
+
+    render_sales_report_pdf(job_id, report, parse_date(start_date), parse_date(end_date), item_id)
+    return job_id
+
+
+@shared_task
+def purge_expired_pdfs_task():
+    return purge_expired_pdfs()
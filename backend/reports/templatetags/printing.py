@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from reports.pdf import PRINTED_AT_MARKER
+
+register = template.Library()
+
+
+@register.simple_tag
+def printed_at():
+    """
+    When the PDF was printed. Rendered as a marker that write_pdf() fills in,
+    so the HTML - and the cache key derived from it - doesn't change every minute.
+    """
+    return mark_safe(PRINTED_AT_MARKER)
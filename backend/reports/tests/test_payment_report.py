@@ -0,0 +1,41 @@
+import pytest
+from decimal import Decimal
+
+from django.utils import timezone
+
+from billing.models import Invoice, InvoiceItem, PaymentMode
+
+
+@pytest.fixture
+def cash_sales(patient, item, inventory):
+    cash_mode = PaymentMode.objects.create(payment_mode='Cash', payment_category='cash', is_default=True)
+    invoice = Invoice.objects.create(patient=patient)
+    return [
+        InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+        for _ in range(2)
+    ]
+
+
+@pytest.mark.django_db
+def test_payment_report_counts_each_item_once(authenticated_admin_client, cash_sales):
+    today = timezone.localdate().isoformat()
+    response = authenticated_admin_client.get(
+        '/reports/total_payment_mode_amount/', {'payment_mode': 'cash', 'date': today}
+    ).json()
+
+    # The old implementation added the whole invoice amount once per item
+    expected = sum(sale.actual_total for sale in cash_sales)
+    assert Decimal(str(response['total_amount'])) == expected
+    assert response['item_count'] == 2
+    assert len(response['rows']) == 1
+
+
+@pytest.mark.django_db
+def test_payment_report_items_are_paginated(authenticated_admin_client, cash_sales):
+    response = authenticated_admin_client.get(
+        '/reports/total_payment_mode_amount/items/', {'payment_mode': 'cash', 'page_size': 1}
+    ).json()
+
+    assert len(response['results']) == 1
+    assert response['next']
+    assert response['results'][0]['item_name'] == cash_sales[0].item.name
@@ -0,0 +1,82 @@
+import csv
+import io
+import pytest
+from decimal import Decimal
+
+from django.utils import timezone
+
+from billing.models import Invoice, InvoiceItem, PaymentMode
+from reports.sales import iter_sales_rows
+
+
+@pytest.fixture
+def sales(patient, item, inventory):
+    cash_mode = PaymentMode.objects.create(payment_mode='Cash', payment_category='cash', is_default=True)
+    invoice = Invoice.objects.create(patient=patient)
+    return [
+        InvoiceItem.objects.create(invoice=invoice, item=item, payment_mode=cash_mode)
+        for _ in range(3)
+    ]
+
+
+@pytest.mark.django_db
+def test_sales_rows_are_flat_and_cover_end_date(sales, django_assert_num_queries):
+    today = timezone.localdate()
+    with django_assert_num_queries(1):
+        rows = list(iter_sales_rows(today, today))
+
+    assert [row[0] for row in rows] == [sale.invoice_id for sale in sales]
+    assert rows[0][2] == sales[0].item.name
+
+
+@pytest.mark.django_db
+def test_sales_report_summary_and_csv(authenticated_admin_client, sales):
+    today = timezone.localdate().isoformat()
+    params = {'start_date': today, 'end_date': today}
+
+    summary = authenticated_admin_client.get('/reports/sales/', params).json()
+    assert summary['item_count'] == 3
+    assert Decimal(str(summary['total_amount'])) == sum(sale.actual_total for sale in sales)
+
+    response = authenticated_admin_client.get('/reports/sales/', {**params, 'export': 'csv'})
+    rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+    assert rows[0][0] == 'Invoice ID'
+    assert len(rows) == 4
+
+
+@pytest.mark.django_db
+def test_sales_report_rejects_missing_dates(authenticated_admin_client):
+    assert authenticated_admin_client.get('/reports/sales/').status_code == 400
+
+
+@pytest.mark.django_db
+def test_legacy_sales_pdfs_are_per_user(authenticated_client, authenticated_doctor_client, sales):
+    today = timezone.localdate().isoformat()
+    params = {'start_date': today, 'end_date': today}
+    mine = authenticated_client.post('/reports/sale_by_date/', params, content_type='application/json').json()
+    theirs = authenticated_doctor_client.post('/reports/sale_by_date/', params, format='json').json()
+    assert mine['job_id'] != theirs['job_id']
+
+    # Without a job id each user gets their own latest render
+    latest = authenticated_client.get('/sale_by_date/pdf/')
+    assert latest.status_code == 200
+    assert latest['Content-Type'] == 'application/pdf'
+    assert authenticated_client.get('/sale_by_date/pdf/', {'job_id': mine['job_id']}).status_code == 200
+    assert authenticated_doctor_client.get('/sale_by_date/pdf/').status_code == 200
+
+    # Nobody is served another user's report
+    assert authenticated_client.get('/sale_by_date/pdf/', {'job_id': theirs['job_id']}).status_code == 404
+    assert authenticated_doctor_client.get('/sale_by_date/pdf/', {'job_id': mine['job_id']}).status_code == 404
+    assert authenticated_client.get('/sale_by_date/pdf/', {'job_id': '../sales_by_date-x'}).status_code == 404
+    assert authenticated_client.get('/serve_sales_by_item_id_pdf/', {'job_id': mine['job_id']}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_legacy_sales_pdfs_require_authentication(client, sales):
+    today = timezone.localdate().isoformat()
+    response = client.post(
+        '/reports/sale_by_date/', {'start_date': today, 'end_date': today}, content_type='application/json'
+    )
+    assert response.status_code == 401
+    assert client.get('/sale_by_date/pdf/').status_code == 401
+    assert client.get('/serve_sales_by_item_id_pdf/').status_code == 401
@@ -4,6 +4,10 @@ from .views import (
     get_invoice_items_by_item_and_date_range,
     # get_total_by_payment_mode,
     PaymentReportView,
+    PaymentReportItemsView,
+    SalesReportView,
+    PdfJobStatusView,
+    PdfJobDownloadView,
 )
 
 urlpatterns = [
@@ -11,4 +15,8 @@ urlpatterns = [
     path('sale_by_item_and_date/', get_invoice_items_by_item_and_date_range, name='generate_pdf_by_item_and_date'),
     # path('total_payment_mode_amount/', get_total_by_payment_mode, name='total_payment_mode_amount'),
     path('total_payment_mode_amount/', PaymentReportView.as_view()),
+    path('total_payment_mode_amount/items/', PaymentReportItemsView.as_view(), name='payment-report-items'),
+    path('sales/', SalesReportView.as_view(), name='sales-report'),
+    path('pdf-jobs/<slug:job_id>/', PdfJobStatusView.as_view(), name='pdf-job-status'),
+    path('pdf-jobs/<slug:job_id>/download/', PdfJobDownloadView.as_view(), name='pdf-job-download'),
 ]
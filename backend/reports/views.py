@@ -1,27 +1,54 @@
 from django.shortcuts import render
 
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
-from weasyprint import HTML
+from django.urls import reverse
 from io import BytesIO
 from django.utils import timezone
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 import os
+import re
+from functools import wraps
 from django.conf import settings
+from django.core.cache import cache
 from pathlib import Path
+from decimal import Decimal
 from django.db.models import Sum
 from datetime import date, datetime
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework import generics
+from rest_framework.pagination import CursorPagination
 from django.db import models
 from rest_framework import status
 
 from billing.models import InvoiceItem, PaymentMode, Invoice
 from inventory.models import IncomingItem
 from company.models import Company
-from billing.serializers import InvoiceItemSerializer
+from .pdf import (
+    get_cache_path,
+    get_document_name,
+    get_requester,
+    grant_job_access,
+    has_job_access,
+    is_cached,
+    job_response,
+)
+from .sales import (
+    get_payment_mode_items,
+    get_payment_mode_revenue,
+    get_sales_summary,
+    iter_sales_rows,
+    new_report_job_id,
+    parse_date,
+    render_sales_report_pdf,
+    stream_csv,
+    write_xlsx,
+)
+from .serializers import PaymentReportItemSerializer
+from .tasks import render_sales_report_task
 
 
 
@@ -32,7 +59,76 @@ curl -X POST http://localhost:8080/reports/sale_by_date   -H "Content-Type: appl
 '''
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+
+LEGACY_SALES_PDFS = {
+    'sales_by_date': ('serve_generated_pdf', 'generated_pdf.pdf'),
+    'sales_by_item_id': ('serve_sales_by_item_id_pdf', 'sales_by_item_id.pdf'),
+}
+
+
+def _latest_legacy_sales_pdf_key(report, user):
+    return f'reports:legacy-sales-pdf:{report}:{user.pk}'
+
+
+def _legacy_login_required(view):
+    '''
+    The legacy sales endpoints are plain Django views; authenticate the
+    request's JWT and expose the user as request.user.
+    '''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = get_requester(request)
+        if user is None:
+            return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+        request.user = user
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _write_legacy_sales_pdf(request, report, start_date, end_date, item_id=None):
+    '''
+    Render a sales report synchronously for the legacy POST endpoints into
+    its own artifact (returned as job_id/download_url/pdf_url). Nothing is
+    written to a shared file: the fixed GET endpoint the current frontend
+    fetches afterwards serves ?job_id=, else the requester's latest artifact
+    of that report. New clients should use SalesReportView with ?export=pdf.
+    '''
+    job_id = new_report_job_id(report)
+    grant_job_access(request, job_id)
+    render_sales_report_pdf(job_id, report, start_date, end_date, item_id)
+    cache.set(_latest_legacy_sales_pdf_key(report, request.user), job_id, settings.PDF_REPORT_TTL)
+
+    url_name, _ = LEGACY_SALES_PDFS[report]
+    return JsonResponse({
+        'job_id': job_id,
+        'download_url': request.build_absolute_uri(reverse('pdf-job-download', args=[job_id])),
+        'pdf_url': request.build_absolute_uri(f'{reverse(url_name)}?job_id={job_id}'),
+    })
+
+
+def _serve_legacy_sales_pdf(request, report):
+    job_id = request.GET.get('job_id') or cache.get(_latest_legacy_sales_pdf_key(report, request.user))
+    # Only the requester's artifacts of this report, and only from the cache dir
+    if (
+        not job_id
+        or not re.fullmatch(r'[-\w]+', job_id)
+        or get_document_name(job_id) != report
+        or not has_job_access(request.user, job_id)
+    ):
+        return HttpResponse('PDF file not found', status=404)
+
+    pdf_path = get_cache_path(job_id)
+    if not pdf_path.exists():
+        return HttpResponse('PDF file not found', status=404)
+
+    _, filename = LEGACY_SALES_PDFS[report]
+    response = FileResponse(open(pdf_path, 'rb'), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
+
+
 @csrf_exempt
+@_legacy_login_required
 def get_invoice_items_by_date_range(request):
     if request.method == 'POST':
         try:
@@ -41,41 +137,9 @@ def get_invoice_items_by_date_range(request):
             end_date_str = data.get('end_date')
 
             if start_date_str and end_date_str:
-                start_date = timezone.datetime.strptime(start_date_str, '%Y-%m-%d')
-                end_date = timezone.datetime.strptime(end_date_str, '%Y-%m-%d')
-                invoice_items = InvoiceItem.objects.filter(item_created_at__range=(start_date, end_date))
-
-                serialized_invoice_items = [
-                    {
-                        'invoice_id': item.invoice.id,
-                        'item_id': item.item.id,
-                        'item_created_at': item.item_created_at,
-                        'payment_mode_id': item.payment_mode.id if item.payment_mode else None
-                    }
-                    for item in invoice_items
-                ]
-
-                company = Company.objects.first()
-
-                # Prepare the data for the template
-                context = {
-                    'invoice_items': invoice_items,
-                    'company': company,
-                    'start_date': start_date,
-                    'end_date': end_date
-                }
-
-
-                # html_string = render_to_string('sales_by_date.html', {'invoice_items': serialized_invoice_items})
-                html_string = render_to_string('sales_by_date.html', context)
-                pdf_file = HTML(string=html_string).write_pdf()
-                pdf_directory = os.path.join(BASE_DIR, 'easymed/static', 'reports')
-                os.makedirs(pdf_directory, exist_ok=True)
-                pdf_file_name = 'invoice_items.pdf'
-                pdf_file_path = os.path.join(pdf_directory, pdf_file_name)
-                with open(pdf_file_path, 'wb') as f:
-                    f.write(pdf_file)
-                return JsonResponse({'pdf_file_path': pdf_file_path})
+                return _write_legacy_sales_pdf(
+                    request, 'sales_by_date', parse_date(start_date_str), parse_date(end_date_str)
+                )
             else:
                 return JsonResponse({'error': 'Invalid date format or missing date data'}, status=400)
         except Exception as e:
@@ -84,26 +148,13 @@ def get_invoice_items_by_date_range(request):
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
+@_legacy_login_required
 def serve_generated_pdf(request):
-    # Path to the generated PDF file
-    pdf_file_name = 'invoice_items.pdf'
-    pdf_directory = os.path.join(BASE_DIR, 'easymed/static', 'reports')
-    pdf_file_path = os.path.join(pdf_directory, pdf_file_name)
-
-    # Check if the PDF file exists
-    if os.path.exists(pdf_file_path):
-        with open(pdf_file_path, 'rb') as f:
-            pdf_content = f.read()
-
-        # Prepare the response with PDF content
-        response = HttpResponse(pdf_content, content_type='application/pdf')
-        response['Content-Disposition'] = 'inline; filename="generated_pdf.pdf"'
-        return response
-    else:
-        return HttpResponse('PDF file not found', status=404)
-    
+    return _serve_legacy_sales_pdf(request, 'sales_by_date')
+
 
 @csrf_exempt
+@_legacy_login_required
 def get_invoice_items_by_item_and_date_range(request):
     if request.method == 'POST':
         try:
@@ -113,29 +164,9 @@ def get_invoice_items_by_item_and_date_range(request):
             end_date_str = data.get('end_date')
 
             if item_id and start_date_str and end_date_str:
-                start_date = timezone.datetime.strptime(start_date_str, '%Y-%m-%d')
-                end_date = timezone.datetime.strptime(end_date_str, '%Y-%m-%d')
-                invoice_items = InvoiceItem.objects.filter(item_id=item_id, item_created_at__range=(start_date, end_date))
-
-                company = Company.objects.first()
-
-                # Prepare the data for the template
-                context = {
-                    'invoice_items': invoice_items,
-                    'company': company,
-                    'start_date': start_date,
-                    'end_date': end_date
-                }
-
-                html_string = render_to_string('sales_by_item_id.html', context)
-                pdf_file = HTML(string=html_string).write_pdf()
-                pdf_directory = os.path.join(BASE_DIR, 'easymed/static', 'reports')
-                os.makedirs(pdf_directory, exist_ok=True)
-                pdf_file_name = 'sales_by_item_id.pdf'
-                pdf_file_path = os.path.join(pdf_directory, pdf_file_name)
-                with open(pdf_file_path, 'wb') as f:
-                    f.write(pdf_file)
-                return JsonResponse({'pdf_file_path': pdf_file_path})
+                return _write_legacy_sales_pdf(
+                    request, 'sales_by_item_id', parse_date(start_date_str), parse_date(end_date_str), item_id
+                )
             else:
                 return JsonResponse({'error': 'Invalid data or missing data'}, status=400)
         except Exception as e:
@@ -144,39 +175,163 @@ def get_invoice_items_by_item_and_date_range(request):
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
-from django.http import FileResponse
-
+@_legacy_login_required
 def serve_sales_by_item_id_pdf(request):
-    pdf_file_name = 'sales_by_item_id.pdf'
-    pdf_directory = os.path.join(BASE_DIR, 'easymed/static', 'reports')
-    pdf_file_path = os.path.join(pdf_directory, pdf_file_name)
-
-    if os.path.exists(pdf_file_path):
-        response = FileResponse(open(pdf_file_path, 'rb'), content_type='application/pdf')
-        response['Content-Disposition'] = 'inline; filename="sales_by_item_id.pdf"'
-        return response
-    else:
-        return HttpResponse('PDF file not found', status=404)
+    return _serve_legacy_sales_pdf(request, 'sales_by_item_id')
 
 
-''''
-Let's get the total sales per payment mode for that day
+class SalesReportView(APIView):
+    """
+    Sales by date range, optionally for one item.
 
-'''
-class PaymentReportView(APIView):
-  def get(self, request, format=None):
-    payment_mode = request.GET.get('payment_mode')
-    date = request.GET.get('date')
+    GET /reports/sales/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD[&item_id=][&export=]
+    - no export: totals and per payment mode totals, aggregated in the database
+    - export=csv: rows streamed as they are read
+    - export=xlsx: write-only workbook
+    - export=pdf: rendered on Celery into a unique artifact; returns a job id
+      to poll at /reports/pdf-jobs/<job_id>/ (artifacts expire after PDF_REPORT_TTL)
+    """
+    def get(self, request):
+        try:
+            start_date = parse_date(request.query_params.get('start_date'))
+            end_date = parse_date(request.query_params.get('end_date'))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'start_date and end_date are required (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if start_date > end_date:
+            return Response({'error': 'start_date is after end_date'}, status=status.HTTP_400_BAD_REQUEST)
+
+        item_id = request.query_params.get('item_id')
+        export = request.query_params.get('export')
+        report = 'sales_by_item_id' if item_id else 'sales_by_date'
+        filename = f'{report}_{start_date}_{end_date}'
+
+        if export == 'csv':
+            response = StreamingHttpResponse(
+                stream_csv(iter_sales_rows(start_date, end_date, item_id)), content_type='text/csv'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+            return response
+
+        if export == 'xlsx':
+            return FileResponse(
+                write_xlsx(iter_sales_rows(start_date, end_date, item_id)),
+                as_attachment=True,
+                filename=f'{filename}.xlsx',
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
+
+        if export == 'pdf':
+            job_id = new_report_job_id(report)
+            grant_job_access(request, job_id)
+            render_sales_report_task.apply_async(
+                args=[job_id, report, start_date.isoformat(), end_date.isoformat(), item_id], task_id=job_id
+            )
+            return job_response(request, job_id, ready=is_cached(job_id))
+
+        if export:
+            return Response({'error': f'Unknown export "{export}"'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(get_sales_summary(start_date, end_date, item_id))
+
+
+class PdfJobStatusView(APIView):
+    """
+    Poll a PDF queued with ?async=1 on one of the download_*_pdf views or
+    with export=pdf on SalesReportView. Jobs the requester was not handed
+    look like missing ones.
+    """
+    def get(self, request, job_id):
+        from celery.result import AsyncResult
+
+        if not has_job_access(request.user, job_id):
+            return Response({'error': 'PDF job not found'}, status=status.HTTP_404_NOT_FOUND)
+        if is_cached(job_id):
+            return job_response(request, job_id, ready=True)
+        if AsyncResult(job_id).state == 'FAILURE':
+            return JsonResponse({'job_id': job_id, 'status': 'failed'}, status=500)
+        return job_response(request, job_id, ready=False)
+
+
+class PdfJobDownloadView(APIView):
+    def get(self, request, job_id):
+        pdf_path = get_cache_path(job_id)
+        if not has_job_access(request.user, job_id) or not pdf_path.exists():
+            return HttpResponse('PDF file not found', status=404)
+
+        response = FileResponse(open(pdf_path, 'rb'), content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{get_document_name(job_id)}.pdf"'
+        return response
 
-    # Filter InvoiceItems by payment_mode and date
-    filtered_items = InvoiceItem.objects.filter(payment_mode__payment_category=payment_mode, item_created_at__date=date)
 
-    # Calculate total amount
-    total_amount = sum(item.invoice.invoice_amount for item in filtered_items)
+def _payment_report_params(request):
+    '''
+    (start_date, end_date, payment_category) from ?date= or ?start_date=&end_date=
+    (default: today) and ?payment_mode=<payment category>. Raises ValueError.
+    '''
+    date_param = request.query_params.get('date')
+    start_param = request.query_params.get('start_date') or date_param
+    end_param = request.query_params.get('end_date') or date_param
 
-    # Serialize data for response
-    serializer = InvoiceItemSerializer(filtered_items, many=True)
+    today = timezone.localdate()
+    start_date = parse_date(start_param) if start_param else today
+    end_date = parse_date(end_param) if end_param else start_date
+    if start_date > end_date:
+        raise ValueError('start_date is after end_date')
+    return start_date, end_date, request.query_params.get('payment_mode')
 
-    # Return response with total amount and potentially additional data (optional)
-    return Response({'total_amount': total_amount, 'data': serializer.data}, status=status.HTTP_200_OK)
 
+class PaymentReportView(APIView):
+    """
+    Daily revenue per payment mode category.
+
+    GET /reports/total_payment_mode_amount/?payment_mode=cash&date=YYYY-MM-DD
+    or  ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD, plus &group_by=source_tag
+    to split each day by department. Item detail is served, paginated, by
+    PaymentReportItemsView.
+    """
+    def get(self, request, format=None):
+        try:
+            start_date, end_date, payment_category = _payment_report_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = get_payment_mode_revenue(
+            start_date, end_date, payment_category,
+            by_department=request.query_params.get('group_by') == 'source_tag',
+        )
+
+        return Response({
+            'start_date': start_date,
+            'end_date': end_date,
+            'total_amount': sum((row['total_amount'] or 0 for row in rows), Decimal('0')),
+            'item_count': sum(row['item_count'] for row in rows),
+            'rows': rows,
+        }, status=status.HTTP_200_OK)
+
+
+class PaymentReportItemPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-item_created_at', '-id')
+
+
+class PaymentReportItemsView(generics.ListAPIView):
+    """Paginated invoice items behind PaymentReportView, same query params."""
+    serializer_class = PaymentReportItemSerializer
+    pagination_class = PaymentReportItemPagination
+
+    def get_queryset(self):
+        start_date, end_date, payment_category = _payment_report_params(self.request)
+        return get_payment_mode_items(start_date, end_date, payment_category).select_related(
+            'invoice', 'item', 'payment_mode', 'source_tag'
+        )
+
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
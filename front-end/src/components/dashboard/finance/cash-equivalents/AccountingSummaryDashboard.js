@@ -43,7 +43,7 @@ const AccountingSummaryDashboard = () => {
   const loadData = async () => {
     try {
       setLoading(true);
-      const filters = {};
+      const filters = { include_transactions: true };
       if (startDate) filters.start_date = startDate;
       if (endDate) filters.end_date = endDate;
 